@@ -0,0 +1,89 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Run pathlib_tree benchmarks from command line
+
+    python -m benchmarks --output results.json --baseline baseline.json
+"""
+import argparse
+import sys
+import tempfile
+
+from .generators import TREE_GENERATORS
+from .runner import (
+    compare_results,
+    load_results,
+    run_benchmarks,
+    save_results,
+    DEFAULT_REGRESSION_THRESHOLD,
+    DEFAULT_REPEAT,
+    OPERATIONS,
+)
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parse command line arguments
+    """
+    parser = argparse.ArgumentParser(description='Run pathlib_tree benchmarks')
+    parser.add_argument('--output', help='Write results to JSON file')
+    parser.add_argument('--baseline', help='Compare results to baseline JSON file')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help='Allowed increase ratio of time and memory compared to baseline')
+    parser.add_argument('--scale', type=int, default=1, help='Scale factor for generated trees')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='Timed repeats per benchmark')
+    parser.add_argument('--scenario', action='append', choices=list(TREE_GENERATORS),
+                        help='Tree scenario to run, default all')
+    parser.add_argument('--operation', action='append', choices=list(OPERATIONS),
+                        help='Operation to benchmark, default all')
+    return parser.parse_args()
+
+
+def format_metric(metric: str, value: float) -> str:
+    """
+    Format value of a result metric for output
+    """
+    if metric == 'peak_memory':
+        return f'{value / 2**20:.2f} MiB'
+    return f'{value:.4f} s'
+
+
+def main() -> int:
+    """
+    Run benchmarks, returning exit code 1 if regressions were detected
+    """
+    args = parse_args()
+    with tempfile.TemporaryDirectory(prefix='pathlib-tree-benchmark-') as workdir:
+        results = run_benchmarks(
+            workdir,
+            scenarios=args.scenario,
+            operations=args.operation,
+            scale=args.scale,
+            repeat=args.repeat,
+        )
+
+    for key, result in sorted(results['results'].items()):
+        print(f'{key:40s} {result["seconds"]:10.4f} s {result["peak_memory"] / 2**20:10.2f} MiB')
+
+    if args.output:
+        save_results(results, args.output)
+
+    if args.baseline:
+        regressions = compare_results(results, load_results(args.baseline), args.threshold)
+        for regression in regressions:
+            print(
+                f'REGRESSION {regression["benchmark"]} {regression["metric"]}: '
+                f'{format_metric(regression["metric"], regression["baseline"])} -> '
+                f'{format_metric(regression["metric"], regression["current"])} ({regression["ratio"]:.2f}x)',
+                file=sys.stderr
+            )
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Reproducible synthetic tree generators for benchmarks
+"""
+import random
+
+from pathlib import Path
+from typing import Callable, Dict, List
+
+#: Extensions used for generated file names
+FILE_EXTENSIONS = ('.txt', '.log', '.json', '.bin', '.py')
+#: Default random seed for generated trees
+DEFAULT_SEED = 42
+
+
+def write_file(path: Path, size: int, generator: random.Random) -> None:
+    """
+    Write file with reproducible pseudo random contents
+    """
+    path.write_bytes(generator.randbytes(size))
+
+
+def file_name(index: int, generator: random.Random) -> str:
+    """
+    Return generated file name with random extension
+    """
+    return f'file-{index:06d}{generator.choice(FILE_EXTENSIONS)}'
+
+
+def generate_wide_tree(path: Path, scale: int = 1, seed: int = DEFAULT_SEED) -> Path:
+    """
+    Generate tree with few directories containing many files each
+    """
+    generator = random.Random(seed)
+    for directory_index in range(4):
+        directory = path.joinpath(f'dir-{directory_index:03d}')
+        directory.mkdir(parents=True)
+        for index in range(500 * scale):
+            write_file(directory.joinpath(file_name(index, generator)), generator.randint(0, 512), generator)
+    return path
+
+
+def generate_deep_tree(path: Path, scale: int = 1, seed: int = DEFAULT_SEED) -> Path:
+    """
+    Generate tree with deeply nested directories and few files per directory
+    """
+    generator = random.Random(seed)
+    for branch_index in range(4 * scale):
+        directory = path.joinpath(f'branch-{branch_index:03d}')
+        for depth in range(32):
+            directory = directory.joinpath(f'level-{depth:03d}')
+            directory.mkdir(parents=True)
+            for index in range(2):
+                write_file(directory.joinpath(file_name(index, generator)), generator.randint(0, 256), generator)
+    return path
+
+
+def generate_small_files_tree(path: Path, scale: int = 1, seed: int = DEFAULT_SEED) -> Path:
+    """
+    Generate balanced tree with many small files
+    """
+    generator = random.Random(seed)
+    for first in range(8):
+        for second in range(8 * scale):
+            directory = path.joinpath(f'{first:02x}', f'{second:02x}')
+            directory.mkdir(parents=True)
+            for index in range(32):
+                write_file(directory.joinpath(file_name(index, generator)), generator.randint(0, 4096), generator)
+    return path
+
+
+def generate_huge_files_tree(path: Path, scale: int = 1, seed: int = DEFAULT_SEED) -> Path:
+    """
+    Generate tree with few large files
+    """
+    generator = random.Random(seed)
+    path.mkdir(parents=True)
+    for index in range(4):
+        write_file(path.joinpath(f'large-{index:02d}.bin'), 2**22 * scale, generator)
+    return path
+
+
+def generate_exclude_patterns(count: int = 64, seed: int = DEFAULT_SEED) -> List[str]:
+    """
+    Generate heavy list of exclude patterns that mostly do not match generated trees
+    """
+    generator = random.Random(seed)
+    patterns = []
+    for index in range(count):
+        kind = index % 4
+        if kind == 0:
+            patterns.append(f'*.ext{index:03d}')
+        elif kind == 1:
+            patterns.append(f'excluded-{index:03d}/')
+        elif kind == 2:
+            patterns.append(f'dir-{generator.randint(100, 999)}/*/file-{index:06d}*')
+        else:
+            patterns.append(f'cache-{index:03d}')
+    return patterns
+
+
+#: Generators for benchmark scenarios by name
+TREE_GENERATORS: Dict[str, Callable[..., Path]] = {
+    'wide': generate_wide_tree,
+    'deep': generate_deep_tree,
+    'small-files': generate_small_files_tree,
+    'huge-files': generate_huge_files_tree,
+}
@@ -0,0 +1,82 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Import time benchmark for pathlib_tree
+"""
+import json
+import subprocess
+import sys
+
+from typing import Any, Dict, List
+
+#: Module imported by the import time benchmark
+DEFAULT_IMPORT_MODULE = 'pathlib_tree'
+#: Number of fresh interpreters started for import time benchmark
+DEFAULT_IMPORT_REPEAT = 5
+#: Modules that must not be loaded by importing pathlib_tree
+LAZY_MODULES = (
+    'datetime',
+    'filecmp',
+    'hashlib',
+    'pathlib_tree.archive',
+    'pathlib_tree.checkpoint',
+    'pathlib_tree.checksum',
+    'pathlib_tree.chunks',
+    'pathlib_tree.delta',
+    'pathlib_tree.diff',
+    'pathlib_tree.estimate',
+    'pathlib_tree.instrumentation',
+    'pathlib_tree.membership',
+    'pathlib_tree.pathstore',
+    'pathlib_tree.throttle',
+    'zoneinfo',
+)
+
+IMPORT_SCRIPT = """
+import json
+import sys
+import time
+before = set(sys.modules)
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'modules': sorted(set(sys.modules) - before)}}))
+"""
+
+
+def import_module_in_subprocess(module: str = DEFAULT_IMPORT_MODULE) -> Dict[str, Any]:
+    """
+    Import module in a fresh interpreter, returning import time and newly loaded modules
+    """
+    output = subprocess.check_output(
+        [sys.executable, '-c', IMPORT_SCRIPT.format(module=module)],
+        encoding='utf-8',
+    )
+    return json.loads(output.splitlines()[-1])
+
+
+def loaded_lazy_modules(module: str = DEFAULT_IMPORT_MODULE) -> List[str]:
+    """
+    Return modules from LAZY_MODULES that are loaded when module is imported
+    """
+    modules = import_module_in_subprocess(module)['modules']
+    return [name for name in LAZY_MODULES if name in modules]
+
+
+def measure_import_time(module: str = DEFAULT_IMPORT_MODULE,
+                        repeat: int = DEFAULT_IMPORT_REPEAT) -> Dict[str, Any]:
+    """
+    Measure import time of module in fresh interpreters
+
+    Returns result dictionary in the same format as other benchmarks.
+    """
+    timings = [import_module_in_subprocess(module)['seconds'] for _index in range(max(1, repeat))]
+    return {
+        'seconds': min(timings),
+        'median_seconds': sorted(timings)[len(timings) // 2],
+        'repeat': len(timings),
+        'peak_memory': 0,
+    }
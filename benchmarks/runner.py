@@ -0,0 +1,235 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Benchmark runner for pathlib_tree operations
+"""
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pathlib_tree.patterns import match_path_patterns
+from pathlib_tree.tree import Tree, TreeItem
+
+from .generators import generate_exclude_patterns, TREE_GENERATORS
+from .importtime import measure_import_time
+
+#: Version of the benchmark results file format
+RESULTS_FORMAT_VERSION = 1
+#: Default number of timed repeats for each benchmark
+DEFAULT_REPEAT = 3
+#: Default allowed slowdown ratio before a result is reported as regression
+DEFAULT_REGRESSION_THRESHOLD = 0.2
+#: Result metrics compared to baseline
+COMPARED_METRICS = ('seconds', 'peak_memory')
+
+
+# pylint: disable=unused-argument
+def setup_tree(path: Path, other: Path) -> Tuple[Path]:
+    """
+    Return arguments for benchmarks that only need the tree path
+    """
+    return (path,)
+
+
+# pylint: disable=unused-argument
+def setup_paths(path: Path, other: Path) -> Tuple[Path, List[str], List[Path]]:
+    """
+    Return tree path, exclude patterns and all paths in the tree
+    """
+    return path, generate_exclude_patterns(), [Path(item) for item in Tree(path)]
+
+
+def setup_diff(path: Path, other: Path) -> Tuple[Path, Path]:
+    """
+    Return both generated trees for diff
+    """
+    return path, other
+
+
+def run_walk(path: Path) -> None:
+    """
+    Walk all items in tree
+    """
+    for _item in Tree(path):
+        pass
+
+
+def run_scan(path: Path) -> None:
+    """
+    Scan all items in tree without caching
+    """
+    for _item in Tree(path).scan():
+        pass
+
+
+def run_scan_parallel(path: Path) -> None:
+    """
+    Scan all items in tree sharded to a process pool
+    """
+    for _record in Tree(path).scan_parallel():
+        pass
+
+
+def run_filter(path: Path) -> None:
+    """
+    Filter tree items with glob pattern
+    """
+    Tree(path).filter('*.txt')
+
+
+# pylint: disable=unused-argument
+def run_exclude_walk(path: Path, patterns: List[str], paths: List[Path]) -> None:
+    """
+    Walk all items in tree with heavy exclude list
+    """
+    for _item in Tree(path, excluded=list(patterns)):
+        pass
+
+
+def run_match_path_patterns(path: Path, patterns: List[str], paths: List[Path]) -> None:
+    """
+    Match all tree paths against heavy pattern list
+    """
+    for item in paths:
+        match_path_patterns(patterns, path, item)
+
+
+def run_checksum(path: Path) -> None:
+    """
+    Calculate checksums for all files in tree
+    """
+    for item in Tree(path):
+        if isinstance(item, TreeItem):
+            item.checksum()
+
+
+def run_diff(path: Path, other: Path) -> None:
+    """
+    Diff two generated trees
+    """
+    Tree(path).diff(other)
+
+
+#: Benchmarked operations as (setup, run) callbacks by name
+OPERATIONS: Dict[str, Tuple[Callable[..., tuple], Callable[..., Any]]] = {
+    'walk': (setup_tree, run_walk),
+    'scan': (setup_tree, run_scan),
+    'scan-parallel': (setup_tree, run_scan_parallel),
+    'filter': (setup_tree, run_filter),
+    'exclude-walk': (setup_paths, run_exclude_walk),
+    'match-path-patterns': (setup_paths, run_match_path_patterns),
+    'checksum': (setup_tree, run_checksum),
+    'diff': (setup_diff, run_diff),
+}
+
+
+def measure(callback: Callable[..., Any], args: tuple, repeat: int = DEFAULT_REPEAT) -> Dict[str, Any]:
+    """
+    Measure run times and peak traced memory of a callback
+
+    Callback is run repeat times for timing and once more with tracemalloc for memory peak.
+    """
+    timings = []
+    for _index in range(max(1, repeat)):
+        start = time.perf_counter()
+        callback(*args)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        callback(*args)
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'seconds': min(timings),
+        'median_seconds': statistics.median(timings),
+        'repeat': len(timings),
+        'peak_memory': peak,
+    }
+
+
+def run_benchmarks(workdir: Path,
+                   scenarios: Optional[List[str]] = None,
+                   operations: Optional[List[str]] = None,
+                   scale: int = 1,
+                   repeat: int = DEFAULT_REPEAT,
+                   import_time: bool = True) -> Dict[str, Any]:
+    """
+    Generate synthetic trees in workdir and run benchmarks for them
+
+    Returns results dictionary with results by 'scenario/operation' key. If import_time
+    is set, package import time is included with key 'import/pathlib_tree'.
+    """
+    scenarios = scenarios if scenarios else list(TREE_GENERATORS)
+    operations = operations if operations else list(OPERATIONS)
+    results = {}
+    if import_time:
+        results['import/pathlib_tree'] = measure_import_time()
+    for scenario in scenarios:
+        generator = TREE_GENERATORS[scenario]
+        path = generator(Path(workdir, scenario, 'a'), scale=scale)
+        other = generator(Path(workdir, scenario, 'b'), scale=scale)
+        for operation in operations:
+            setup, callback = OPERATIONS[operation]
+            results[f'{scenario}/{operation}'] = measure(callback, setup(path, other), repeat)
+    return {
+        'version': RESULTS_FORMAT_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scale': scale,
+        'results': results,
+    }
+
+
+def save_results(results: Dict[str, Any], path: Path) -> None:
+    """
+    Save benchmark results as JSON
+    """
+    with Path(path).open('w', encoding='utf-8') as filedescriptor:
+        json.dump(results, filedescriptor, indent=2, sort_keys=True)
+        filedescriptor.write('\n')
+
+
+def load_results(path: Path) -> Dict[str, Any]:
+    """
+    Load benchmark results from JSON file
+    """
+    with Path(path).open('r', encoding='utf-8') as filedescriptor:
+        return json.load(filedescriptor)
+
+
+def compare_results(results: Dict[str, Any],
+                    baseline: Dict[str, Any],
+                    threshold: float = DEFAULT_REGRESSION_THRESHOLD,
+                    metrics: Iterable[str] = COMPARED_METRICS) -> List[Dict[str, Any]]:
+    """
+    Compare results to baseline, returning metrics above baseline by more than threshold
+
+    Metrics missing from either result or zero in baseline are not compared.
+    """
+    regressions = []
+    for key, result in results['results'].items():
+        baseline_result = baseline['results'].get(key, {})
+        for metric in metrics:
+            if not baseline_result.get(metric) or result.get(metric) is None:
+                continue
+            ratio = result[metric] / baseline_result[metric]
+            if ratio > 1 + threshold:
+                regressions.append({
+                    'benchmark': key,
+                    'metric': metric,
+                    'baseline': baseline_result[metric],
+                    'current': result[metric],
+                    'ratio': ratio,
+                })
+    return regressions
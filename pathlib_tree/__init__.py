@@ -5,6 +5,55 @@
 #
 """
 Module for filesystem tree and path handling
+
+Only the Tree class is imported with the package. Other classes are loaded from their
+modules on first access, so that short-lived tools listing directories do not pay for
+importing hashing, diff, copy and timezone handling.
 """
 # flake8: noqa: F401
+import importlib
+
+from typing import Any
+
 from .tree import Tree
+
+#: Lazily loaded package attributes mapped to their modules
+LAZY_ATTRIBUTES = {
+    'FilesystemError': '.exceptions',
+    'Checkpoint': '.checkpoint',
+    'ChunkIndex': '.chunks',
+    'DeltaScanner': '.delta',
+    'FileChunker': '.chunks',
+    'IOGovernor': '.throttle',
+    'MembershipFilter': '.membership',
+    'PathStore': '.pathstore',
+    'TreeArchive': '.archive',
+    'TreeArrays': '.arrays',
+    'TreeChunker': '.chunks',
+    'TreeItem': '.tree',
+    'TreeIterator': '.tree',
+    'TreeManifest': '.manifest',
+    'TreeSearch': '.search',
+    'TreeShardScan': '.shard',
+    'TreeDedupe': '.dedupe',
+    'TreeEstimator': '.estimate',
+    'TreeDuplicates': '.duplicates',
+    'TreeSync': '.sync',
+    'TreeUsage': '.usage',
+    'TreeVerify': '.verify',
+    'TreeWalk': '.walk',
+    'WalkInstrumentation': '.instrumentation',
+}
+
+
+def __getattr__(name: str) -> Any:
+    """
+    Import lazily loaded package attributes on first use
+    """
+    try:
+        module = LAZY_ATTRIBUTES[name]
+    except KeyError as error:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}') from error
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,261 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Streaming tar archives of trees with parallel block compression
+"""
+import gzip
+import os
+import stat
+import tarfile
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import BinaryIO, Callable, Deque, Iterable, Optional
+
+from .exceptions import FilesystemError
+from .throttle import IOGovernor
+
+#: Supported archive compression methods
+ARCHIVE_COMPRESSION_GZIP = 'gzip'
+ARCHIVE_COMPRESSION_ZSTD = 'zstd'
+ARCHIVE_COMPRESSIONS = (ARCHIVE_COMPRESSION_GZIP, ARCHIVE_COMPRESSION_ZSTD)
+
+#: Default size of independently compressed blocks of the tar stream
+DEFAULT_ARCHIVE_BLOCK_SIZE = 2**20
+#: Default number of concurrent compression workers
+DEFAULT_ARCHIVE_WORKERS = 4
+#: Default compression levels
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_ZSTD_LEVEL = 3
+
+
+def __gzip_compressor__(level: Optional[int]) -> Callable[[bytes], bytes]:
+    """
+    Return function compressing a block to a complete gzip member
+    """
+    level = level if level is not None else DEFAULT_GZIP_LEVEL
+
+    def compress(data: bytes) -> bytes:
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    return compress
+
+
+def __zstd_compressor__(level: Optional[int]) -> Callable[[bytes], bytes]:
+    """
+    Return function compressing a block to a complete zstd frame
+
+    Raises FilesystemError if the zstandard module is not installed.
+    """
+    try:
+        # pylint: disable=import-outside-toplevel
+        import zstandard
+    except ImportError as error:
+        raise FilesystemError('zstd compression requires the zstandard module') from error
+    level = level if level is not None else DEFAULT_ZSTD_LEVEL
+
+    def compress(data: bytes) -> bytes:
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return compress
+
+
+def get_compressor(compression: str, level: Optional[int] = None) -> Callable[[bytes], bytes]:
+    """
+    Return block compression function for a compression method
+
+    Raises FilesystemError if the compression method is not supported.
+    """
+    if compression == ARCHIVE_COMPRESSION_GZIP:
+        return __gzip_compressor__(level)
+    if compression == ARCHIVE_COMPRESSION_ZSTD:
+        return __zstd_compressor__(level)
+    raise FilesystemError(f'Unexpected archive compression: {compression}')
+
+
+class BlockCompressor:
+    """
+    Binary file object compressing written data in independent blocks on a thread pool
+
+    Written data is split to blocks of block_size bytes, which are compressed concurrently
+    and written to the output file in order. Concatenated gzip members and zstd frames are
+    valid compressed streams for standard tools. At most 2 * workers blocks are pending
+    at a time, so memory use is bounded.
+    """
+    fileobj: BinaryIO
+    block_size: int
+    workers: int
+    bytes_in: int
+    bytes_out: int
+
+    def __init__(self,
+                 fileobj: BinaryIO,
+                 compress: Callable[[bytes], bytes],
+                 block_size: int = DEFAULT_ARCHIVE_BLOCK_SIZE,
+                 workers: int = DEFAULT_ARCHIVE_WORKERS) -> None:
+        self.fileobj = fileobj
+        self.block_size = max(1, block_size)
+        self.workers = max(1, workers)
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.__compress__ = compress
+        self.__buffer__ = bytearray()
+        self.__pending__: Deque[Future] = deque()
+        self.__executor__ = ThreadPoolExecutor(max_workers=self.workers)
+
+    def __write_completed__(self, limit: int) -> None:
+        """
+        Write compressed blocks to output until at most limit blocks are pending
+        """
+        while len(self.__pending__) > limit:
+            data = self.__pending__.popleft().result()
+            self.fileobj.write(data)
+            self.bytes_out += len(data)
+
+    def __submit__(self, data: bytes) -> None:
+        """
+        Submit a block for compression
+        """
+        self.__pending__.append(self.__executor__.submit(self.__compress__, data))
+        self.__write_completed__(2 * self.workers)
+
+    def write(self, data: bytes) -> int:
+        """
+        Write data to the compressed stream
+        """
+        self.__buffer__ += data
+        self.bytes_in += len(data)
+        while len(self.__buffer__) >= self.block_size:
+            self.__submit__(bytes(self.__buffer__[:self.block_size]))
+            del self.__buffer__[:self.block_size]
+        return len(data)
+
+    def close(self) -> None:
+        """
+        Compress remaining data and write all pending blocks to output
+
+        The output file object is not closed.
+        """
+        try:
+            if self.__buffer__:
+                self.__submit__(bytes(self.__buffer__))
+                self.__buffer__.clear()
+            self.__write_completed__(0)
+        finally:
+            self.__executor__.shutdown(wait=True, cancel_futures=True)
+
+
+# pylint: disable=too-few-public-methods
+class GovernedReader:
+    """
+    Binary file object wrapper throttling reads with an I/O governor
+    """
+    fileobj: BinaryIO
+    governor: IOGovernor
+
+    def __init__(self, fileobj: BinaryIO, governor: IOGovernor) -> None:
+        self.fileobj = fileobj
+        self.governor = governor
+
+    def read(self, size: int = -1) -> bytes:
+        """
+        Read data from the wrapped file object and account for it in the governor
+        """
+        data = self.fileobj.read(size)
+        if data:
+            self.governor.consume(len(data))
+        return data
+
+
+# pylint: disable=too-few-public-methods
+class TreeArchive:
+    """
+    Write tree items to a tar stream in tree walk order
+
+    Items are the tree walk by default, honouring exclusions of the tree, or any iterable of
+    tree items such as TreeSearch results. Paths in the archive are relative to the tree.
+    With compression, the tar stream is compressed in parallel blocks with BlockCompressor.
+
+    Symbolic links to directories followed by the tree are archived as directories, so the
+    items under them can be extracted. File reads are throttled by the tree I/O governor.
+    """
+    tree: 'Tree'  # noqa
+    items: Optional[Iterable['TreeItem']]  # noqa
+    compression: Optional[str]
+    level: Optional[int]
+    block_size: int
+    workers: int
+
+    def __init__(self,
+                 tree: 'Tree',  # noqa
+                 items: Optional[Iterable['TreeItem']] = None,  # noqa
+                 compression: Optional[str] = ARCHIVE_COMPRESSION_GZIP,
+                 level: Optional[int] = None,
+                 block_size: int = DEFAULT_ARCHIVE_BLOCK_SIZE,
+                 workers: int = DEFAULT_ARCHIVE_WORKERS) -> None:
+        self.tree = tree
+        self.items = items
+        self.compression = compression
+        self.level = level
+        self.block_size = block_size
+        self.workers = workers
+
+    def __item_tarinfo__(self, archive: tarfile.TarFile, item: 'TreeItem') -> Optional[tarfile.TarInfo]:  # noqa
+        """
+        Return tar header of an item, or None for items that can't be archived
+        """
+        tarinfo = archive.gettarinfo(str(item), arcname=str(item.relative_to(self.tree)))
+        if tarinfo is not None and tarinfo.issym() and self.tree.follow_symlinks and item.is_dir():
+            target = os.stat(item)
+            tarinfo.type = tarfile.DIRTYPE
+            tarinfo.linkname = ''
+            tarinfo.mode = stat.S_IMODE(target.st_mode)
+            tarinfo.mtime = target.st_mtime
+        return tarinfo
+
+    def __add_items__(self, archive: tarfile.TarFile) -> int:
+        """
+        Add items to tar archive, returning number of items added
+        """
+        count = 0
+        items = self.items if self.items is not None else self.tree.walk()
+        for item in items:
+            tarinfo = self.__item_tarinfo__(archive, item)
+            if tarinfo is None:
+                continue
+            if tarinfo.isreg():
+                with open(item, 'rb') as filedescriptor:
+                    if self.tree.governor is not None:
+                        archive.addfile(tarinfo, GovernedReader(filedescriptor, self.tree.governor))
+                    else:
+                        archive.addfile(tarinfo, filedescriptor)
+            else:
+                archive.addfile(tarinfo)
+            count += 1
+        return count
+
+    def write(self, fileobj: BinaryIO) -> int:
+        """
+        Write archive to a binary file object, returning number of items archived
+
+        Raises FilesystemError if items can't be read or archive can't be written.
+        """
+        writer = fileobj
+        if self.compression is not None:
+            writer = BlockCompressor(
+                fileobj,
+                get_compressor(self.compression, self.level),
+                block_size=self.block_size,
+                workers=self.workers,
+            )
+        try:
+            try:
+                with tarfile.open(fileobj=writer, mode='w|', format=tarfile.PAX_FORMAT) as archive:
+                    count = self.__add_items__(archive)
+            finally:
+                if writer is not fileobj:
+                    writer.close()
+        except (OSError, tarfile.TarError) as error:
+            raise FilesystemError(f'Error archiving {self.tree}: {error}') from error
+        return count
@@ -0,0 +1,214 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Columnar export of filesystem tree metadata
+"""
+import array
+import os
+import stat
+
+from typing import Any, Dict, List, Optional
+
+from .exceptions import FilesystemError
+from .listing import scan_directory_entries
+
+#: Item type codes in the type column
+ITEM_TYPE_FILE = 0
+ITEM_TYPE_DIRECTORY = 1
+ITEM_TYPE_SYMLINK = 2
+ITEM_TYPE_OTHER = 3
+
+#: Column names with array.array type codes and matching NumPy dtypes
+COLUMNS = {
+    'path_id': ('q', 'int64'),
+    'parent_id': ('q', 'int64'),
+    'size': ('q', 'int64'),
+    'mtime_ns': ('q', 'int64'),
+    'uid': ('I', 'uint32'),
+    'gid': ('I', 'uint32'),
+    'mode': ('I', 'uint32'),
+    'type': ('B', 'uint8'),
+}
+
+
+def load_numpy(use_numpy: Optional[bool] = None) -> Any:
+    """
+    Return numpy module if it should be used
+
+    NumPy is used when available if use_numpy is None. Raises FilesystemError if use_numpy
+    is set and NumPy is not available.
+    """
+    if use_numpy is False:
+        return None
+    # pylint: disable=import-outside-toplevel
+    try:
+        import numpy
+    except ImportError as error:
+        if use_numpy:
+            raise FilesystemError('Required numpy library not available') from error
+        return None
+    return numpy
+
+
+def new_columns() -> Dict[str, array.array]:
+    """
+    Return empty array.array columns for tree metadata
+    """
+    return {name: array.array(typecode) for name, (typecode, _dtype) in COLUMNS.items()}
+
+
+def item_type(mode: int) -> int:
+    """
+    Return item type code for st_mode
+    """
+    if stat.S_ISREG(mode):
+        return ITEM_TYPE_FILE
+    if stat.S_ISDIR(mode):
+        return ITEM_TYPE_DIRECTORY
+    if stat.S_ISLNK(mode):
+        return ITEM_TYPE_SYMLINK
+    return ITEM_TYPE_OTHER
+
+
+def append_columns(columns: Dict[str, array.array],
+                   path_id: int,
+                   parent_id: int,
+                   mode: int,
+                   size: int,
+                   mtime_ns: int,
+                   uid: int,
+                   gid: int) -> None:
+    """
+    Append metadata of an item to array.array columns
+    """
+    columns['path_id'].append(path_id)
+    columns['parent_id'].append(parent_id)
+    columns['size'].append(size)
+    columns['mtime_ns'].append(mtime_ns)
+    columns['uid'].append(uid)
+    columns['gid'].append(gid)
+    columns['mode'].append(mode)
+    columns['type'].append(item_type(mode))
+
+
+class TreeArrays:
+    """
+    Tree item metadata as columns
+
+    Paths relative to the tree are stored in paths list, indexed by the path_id column.
+    The parent_id column refers to the path_id of the parent directory, or -1 for items in
+    the tree root. Columns are NumPy arrays when NumPy is used, array.array otherwise.
+    Content defined chunks of files are in chunk_index, if the snapshot was created with
+    chunks.
+    """
+    paths: List[str]
+    columns: Dict[str, Any]
+    chunk_index: Optional['ChunkIndex']  # noqa
+
+    def __init__(self, paths: List[str], columns: Dict[str, Any]) -> None:
+        self.paths = paths
+        self.columns = columns
+        self.chunk_index = None
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __getattr__(self, attr: str) -> Any:
+        try:
+            return self.__dict__['columns'][attr]
+        except KeyError as error:
+            raise AttributeError(f'{self.__class__.__name__} has no attribute {attr}') from error
+
+
+def create_tree_arrays(paths: List[str], columns: Dict[str, array.array], numpy: Any = None) -> TreeArrays:
+    """
+    Return TreeArrays for paths and array.array columns, converted to NumPy arrays if numpy is given
+    """
+    if numpy is not None:
+        columns = {
+            name: (
+                numpy.frombuffer(columns[name], dtype=typecode).astype(dtype, copy=False)
+                if paths else numpy.zeros(0, dtype=dtype)
+            )
+            for name, (typecode, dtype) in COLUMNS.items()
+        }
+    return TreeArrays(paths, columns)
+
+
+class TreeArraysLoader:
+    """
+    Fill metadata columns for a tree directly from a scandir walk
+
+    Each entry is stat'ed once without following symbolic links and no Path objects are
+    created for the items. Tree exclusions, sorting and one_file_system are honoured.
+
+    Like tree walks, symbolic links to directories are walked into if follow_symlinks is
+    set on the tree, skipping directories already visited on the path from the root. The
+    links themselves are stored with the metadata of the link.
+    """
+    tree: 'Tree'  # noqa
+    use_numpy: Optional[bool]
+
+    def __init__(self, tree: 'Tree', use_numpy: Optional[bool] = None) -> None:  # noqa
+        self.tree = tree
+        self.use_numpy = use_numpy
+
+    def __walk__(self, paths: List[str], columns: Dict[str, array.array]) -> None:
+        """
+        Walk tree depth first, appending items to paths and columns
+        """
+        root = str(self.tree)
+        prefix_length = len(root.rstrip(os.sep)) + 1
+        root_stat = os.stat(root)
+        stack = [(-1, scan_directory_entries(root, self.tree.sorted), {(root_stat.st_dev, root_stat.st_ino)})]
+        while stack:
+            parent_id, entries, ancestors = stack[-1]
+            entry = next(entries, None)
+            if entry is None:
+                stack.pop()
+                continue
+            if self.tree.is_excluded(entry):
+                continue
+
+            entry_stat = entry.stat(follow_symlinks=False)
+            path_id = len(paths)
+            paths.append(entry.path[prefix_length:])
+            append_columns(
+                columns,
+                path_id,
+                parent_id,
+                entry_stat.st_mode,
+                entry_stat.st_size,
+                entry_stat.st_mtime_ns,
+                entry_stat.st_uid,
+                entry_stat.st_gid,
+            )
+
+            if stat.S_ISLNK(entry_stat.st_mode) and self.tree.follow_symlinks and entry.is_dir():
+                entry_stat = os.stat(entry.path)
+            if stat.S_ISDIR(entry_stat.st_mode):
+                inode = (entry_stat.st_dev, entry_stat.st_ino)
+                if inode in ancestors:
+                    continue
+                if self.tree.one_file_system and entry_stat.st_dev != root_stat.st_dev:
+                    continue
+                stack.append((path_id, scan_directory_entries(entry.path, self.tree.sorted), ancestors | {inode}))
+
+    def load(self) -> TreeArrays:
+        """
+        Load tree metadata as TreeArrays
+
+        Raises FilesystemError if tree can't be read or NumPy was required but is not
+        available.
+        """
+        numpy = load_numpy(self.use_numpy)
+        paths = []
+        columns = new_columns()
+        try:
+            self.__walk__(paths, columns)
+        except OSError as error:
+            raise FilesystemError(f'Error loading metadata for {self.tree}: {error}') from error
+        return create_tree_arrays(paths, columns, numpy)
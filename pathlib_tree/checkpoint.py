@@ -0,0 +1,152 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Periodic checkpoints for resuming long running tree operations
+"""
+import json
+import os
+import time
+
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Union
+
+from .exceptions import FilesystemError
+
+#: Default minimum interval in seconds between checkpoint writes
+DEFAULT_CHECKPOINT_INTERVAL = 60.0
+#: Version of the checkpoint file format
+CHECKPOINT_VERSION = 1
+
+#: Operations using checkpoints
+CHECKPOINT_OPERATION_MANIFEST = 'manifest'
+CHECKPOINT_OPERATION_VERIFY = 'verify'
+CHECKPOINT_OPERATION_SYNC = 'sync'
+
+
+class Checkpoint:
+    """
+    Checkpoint file for a resumable operation on a sorted tree
+
+    Operations process items in the deterministic sorted walk order of the tree. They call
+    due() after each completed item and save() with the last completed path, relative to
+    the tree, and a dictionary of partial results when a checkpoint is due. A restarted
+    operation calls resume() to load the last completed path and continues the walk after
+    it, skipping completed subdirectories without reading them. The checkpoint file is
+    removed when the operation completes.
+
+    Checkpoint files are replaced atomically, so a crash while saving leaves the previous
+    checkpoint in place.
+    """
+    path: Path
+    interval: float
+    operation: Optional[str]
+    root: Optional[str]
+    last_path: Optional[str]
+    state: Dict[str, Any]
+    saved: float
+
+    def __init__(self,
+                 path: Union[str, Path],
+                 interval: float = DEFAULT_CHECKPOINT_INTERVAL,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.path = Path(path)
+        self.interval = interval
+        self.operation = None
+        self.root = None
+        self.last_path = None
+        self.state = {}
+        self.__clock__ = clock
+        self.saved = clock()
+
+    def __repr__(self) -> str:
+        return str(self.path)
+
+    def resume(self, operation: str, root: Union[str, Path]) -> Optional[str]:
+        """
+        Start operation for tree root, loading a previous checkpoint if one exists
+
+        Returns last completed path from the checkpoint, or None if the operation starts
+        from the beginning. Partial results are loaded to self.state. Raises
+        FilesystemError if the checkpoint is for another operation or tree.
+        """
+        self.operation = operation
+        self.root = str(root)
+        self.last_path = None
+        self.state = {}
+        self.saved = self.__clock__()
+        try:
+            with self.path.open('r', encoding='utf-8') as filedescriptor:
+                data = json.load(filedescriptor)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as error:
+            raise FilesystemError(f'Error reading checkpoint {self.path}: {error}') from error
+
+        if data.get('version') != CHECKPOINT_VERSION:
+            raise FilesystemError(f'Unexpected checkpoint version in {self.path}: {data.get("version")}')
+        if data.get('operation') != operation or data.get('root') != self.root:
+            raise FilesystemError(
+                f'Checkpoint {self.path} is for {data.get("operation")} of {data.get("root")}, '
+                f'not {operation} of {self.root}'
+            )
+        self.last_path = data.get('last_path')
+        self.state = data.get('state', {})
+        return self.last_path
+
+    def due(self) -> bool:
+        """
+        Check if checkpoint interval has elapsed since the last save
+        """
+        return self.__clock__() - self.saved >= self.interval
+
+    def save(self, last_path: Optional[str], state: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Save last completed path and partial results to the checkpoint file
+
+        Raises FilesystemError if the checkpoint can't be written.
+        """
+        self.last_path = last_path
+        if state is not None:
+            self.state = state
+        data = {
+            'version': CHECKPOINT_VERSION,
+            'operation': self.operation,
+            'root': self.root,
+            'last_path': self.last_path,
+            'state': self.state,
+        }
+        partial = self.path.with_name(f'.{self.path.name}.partial')
+        try:
+            with partial.open('w', encoding='utf-8') as filedescriptor:
+                json.dump(data, filedescriptor)
+                filedescriptor.flush()
+                os.fsync(filedescriptor.fileno())
+            os.replace(partial, self.path)
+        except OSError as error:
+            raise FilesystemError(f'Error writing checkpoint {self.path}: {error}') from error
+        self.saved = self.__clock__()
+
+    def remove(self) -> None:
+        """
+        Remove checkpoint file after the operation has completed
+
+        Last path and partial results are kept in the object.
+        """
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as error:
+            raise FilesystemError(f'Error removing checkpoint {self.path}: {error}') from error
+
+
+def load_checkpoint(checkpoint: Optional[Union[str, Path, Checkpoint]]) -> Optional[Checkpoint]:
+    """
+    Return Checkpoint for a checkpoint file path or object
+    """
+    if checkpoint is None or isinstance(checkpoint, Checkpoint):
+        return checkpoint
+    return Checkpoint(checkpoint)
@@ -0,0 +1,49 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+File checksums for filesystem trees
+"""
+import hashlib
+import os
+
+from typing import Optional
+
+from .exceptions import FilesystemError
+from .sparse import iter_file_blocks
+from .throttle import IOGovernor
+
+#: Default block size when reading files for checksums
+DEFAULT_FILE_CHECKSUM_BLOCK_SIZE = 2**20
+
+
+def validate_checksum_algorithm(algorithm: str) -> None:
+    """
+    Check algorithm is available in hashlib and has fixed length hex digests
+
+    Raises FilesystemError for unknown algorithms and variable length digests like shake_128.
+    """
+    if algorithm not in hashlib.algorithms_available:
+        raise FilesystemError(f'Unexpected algorithm: {algorithm}')
+    if not hashlib.new(algorithm).digest_size:
+        raise FilesystemError(f'Calculating {algorithm} not supported')
+
+
+def file_checksum(path: str,
+                  algorithm: str,
+                  block_size: int = DEFAULT_FILE_CHECKSUM_BLOCK_SIZE,
+                  governor: Optional[IOGovernor] = None) -> str:
+    """
+    Calculate hex digest of whole file
+
+    Holes in sparse files are hashed as zeros without reading them from disk. Reads are
+    throttled by governor if given.
+    """
+    hash_callback = hashlib.new(algorithm)
+    with open(path, 'rb') as filedescriptor:
+        size = os.fstat(filedescriptor.fileno()).st_size
+        for chunk in iter_file_blocks(filedescriptor.fileno(), size, block_size, governor):
+            hash_callback.update(chunk)
+    return hash_callback.hexdigest()
@@ -0,0 +1,381 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Content defined chunking of files for sub-file deduplication and change detection
+"""
+import hashlib
+import json
+import os
+import stat
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from .arrays import load_numpy
+from .checksum import validate_checksum_algorithm
+from .exceptions import FilesystemError
+from .sparse import iter_file_blocks
+from .throttle import IOGovernor
+
+#: Default average chunk size in bytes
+DEFAULT_CHUNK_AVERAGE_SIZE = 2**16
+#: Default checksum algorithm for chunk digests
+DEFAULT_CHUNK_CHECKSUM = 'sha256'
+#: Default number of concurrent chunking workers
+DEFAULT_CHUNK_WORKERS = 4
+#: Number of pending files per worker when chunking trees
+CHUNK_QUEUE_DEPTH = 4
+#: Block size when reading files for chunking
+DEFAULT_CHUNK_BLOCK_SIZE = 2**22
+
+#: Number of bytes affecting the rolling gear hash
+GEAR_WINDOW = 64
+#: Mask for 64 bit gear hash values
+GEAR_HASH_MASK = 2**64 - 1
+#: Gear hash value for each byte value, fixed so chunk boundaries are reproducible
+GEAR_TABLE = tuple(
+    int.from_bytes(hashlib.sha256(bytes([value])).digest()[:8], 'little')
+    for value in range(256)
+)
+
+#: Chunk as (offset, length, hex digest)
+Chunk = Tuple[int, int, str]
+
+
+def __python_candidates__(data: bytes, value: int, mask: int) -> Tuple[List[int], int]:
+    """
+    Find chunk boundary candidates in data with a byte by byte gear hash
+
+    Returns positions of bytes after which the hash matches the mask, and the hash value
+    after the last byte.
+    """
+    positions = []
+    gear = GEAR_TABLE
+    for index, byte in enumerate(data):
+        value = ((value << 1) + gear[byte]) & GEAR_HASH_MASK
+        if not value & mask:
+            positions.append(index)
+    return positions, value
+
+
+def __numpy_candidates__(numpy: Any, data: bytes, tail: bytes, mask: int) -> List[int]:
+    """
+    Find chunk boundary candidates in data with a vectorized gear hash
+
+    The gear hash of each byte is the sum of gear values of the last GEAR_WINDOW bytes,
+    each shifted left by its distance from the byte. Sums over windows of doubling length
+    are combined in log2(GEAR_WINDOW) steps. Tail contains the bytes preceding data.
+    """
+    table = numpy.array(GEAR_TABLE, dtype=numpy.uint64)
+    values = table[numpy.frombuffer(tail + data, dtype=numpy.uint8)]
+    width = 1
+    while width < GEAR_WINDOW:
+        shifted = values[:-width] << numpy.uint64(width)
+        values[width:] += shifted
+        width *= 2
+    matches = (values[len(tail):] & numpy.uint64(mask)) == 0
+    return numpy.flatnonzero(matches).tolist()
+
+
+class FileChunker:
+    """
+    Split file contents to chunks with content defined boundaries
+
+    Boundaries are placed where a rolling gear hash of the last GEAR_WINDOW bytes has its
+    highest bits clear, so inserting or appending data only changes chunks near the edit.
+    Chunks are at least min_size and at most max_size bytes long. NumPy is used to find
+    boundaries when available and use_numpy is not False; both implementations return
+    identical chunks.
+    """
+    average_size: int
+    min_size: int
+    max_size: int
+    algorithm: str
+    block_size: int
+    use_numpy: Optional[bool]
+
+    def __init__(self,
+                 average_size: int = DEFAULT_CHUNK_AVERAGE_SIZE,
+                 min_size: Optional[int] = None,
+                 max_size: Optional[int] = None,
+                 algorithm: str = DEFAULT_CHUNK_CHECKSUM,
+                 block_size: int = DEFAULT_CHUNK_BLOCK_SIZE,
+                 use_numpy: Optional[bool] = None) -> None:
+        validate_checksum_algorithm(algorithm)
+        self.average_size = max(2, average_size)
+        self.min_size = min_size if min_size is not None else self.average_size // 4
+        self.max_size = max_size if max_size is not None else self.average_size * 8
+        if not 0 < self.min_size <= self.max_size:
+            raise FilesystemError(f'Invalid chunk sizes: min {self.min_size} max {self.max_size}')
+        self.algorithm = algorithm
+        self.block_size = block_size
+        self.use_numpy = use_numpy
+        self.__numpy__ = load_numpy(use_numpy)
+        bits = (self.average_size - 1).bit_length()
+        self.__mask__ = ((1 << bits) - 1) << (64 - bits)
+
+    @property
+    def settings(self) -> Dict[str, Any]:
+        """
+        Return settings that must match for chunks to be comparable
+        """
+        return {
+            'average_size': self.average_size,
+            'min_size': self.min_size,
+            'max_size': self.max_size,
+            'algorithm': self.algorithm,
+        }
+
+    def __iter_candidates__(self, blocks: Iterator[bytes]) -> Iterator[Tuple[bytes, List[int]]]:
+        """
+        Iterate data blocks with positions of boundary candidates in each block
+        """
+        value = 0
+        tail = b''
+        for data in blocks:
+            data = bytes(data)
+            if self.__numpy__ is not None:
+                positions = __numpy_candidates__(self.__numpy__, data, tail, self.__mask__)
+                tail = (tail + data)[-(GEAR_WINDOW - 1):]
+            else:
+                positions, value = __python_candidates__(data, value, self.__mask__)
+            yield data, positions
+
+    def iter_chunks(self,
+                    filedescriptor: int,
+                    size: int,
+                    governor: Optional[IOGovernor] = None) -> Iterator[Chunk]:
+        """
+        Iterate (offset, length, hex digest) chunks of an open file
+
+        Holes in sparse files are chunked as zeros without reading them from disk. Reads
+        are throttled by governor if given.
+        """
+        blocks = iter_file_blocks(filedescriptor, size, self.block_size, governor)
+        checksum = hashlib.new(self.algorithm)
+        start = 0
+        offset = 0
+        for data, positions in self.__iter_candidates__(blocks):
+            candidates = iter(positions)
+            while True:
+                end = next((offset + position + 1 for position in candidates
+                            if offset + position + 1 - start >= self.min_size), None)
+                if end is None or end - start > self.max_size:
+                    if start + self.max_size > offset + len(data):
+                        break
+                    end = start + self.max_size
+                    candidates = iter([position for position in positions if offset + position + 1 > end])
+                checksum.update(data[max(start, offset) - offset:end - offset])
+                yield start, end - start, checksum.hexdigest()
+                checksum = hashlib.new(self.algorithm)
+                start = end
+            checksum.update(data[max(start, offset) - offset:])
+            offset += len(data)
+        if start < offset:
+            yield start, offset - start, checksum.hexdigest()
+
+    def file_chunks(self, path: str, governor: Optional[IOGovernor] = None) -> List[Chunk]:
+        """
+        Return chunks of a file
+
+        Raises OSError if file can't be read.
+        """
+        with open(path, 'rb') as filedescriptor:
+            size = os.fstat(filedescriptor.fileno()).st_size
+            return list(self.iter_chunks(filedescriptor.fileno(), size, governor))
+
+
+class ChunkIndex:
+    """
+    Index of content defined chunks of files in a tree
+
+    Files are stored by path relative to the tree, with lists of (offset, length, digest)
+    chunks. Indexes can be written to and read from newline delimited JSON files, and
+    compared with indexes of other versions of the tree created with the same settings.
+    """
+    settings: Dict[str, Any]
+    files: Dict[str, List[Chunk]]
+
+    def __init__(self, settings: Dict[str, Any], files: Optional[Dict[str, List[Chunk]]] = None) -> None:
+        self.settings = settings
+        self.files = files if files is not None else {}
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__} {len(self.files)} files'
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def __iter_chunks__(self) -> Iterator[Chunk]:
+        """
+        Iterate all chunks in the index
+        """
+        for chunks in self.files.values():
+            yield from chunks
+
+    @property
+    def total_bytes(self) -> int:
+        """
+        Return total size of all files in the index
+        """
+        return sum(length for _offset, length, _digest in self.__iter_chunks__())
+
+    @property
+    def unique_bytes(self) -> int:
+        """
+        Return total size of unique chunks in the index
+        """
+        unique = {}
+        for _offset, length, digest in self.__iter_chunks__():
+            unique[digest] = length
+        return sum(unique.values())
+
+    @property
+    def dedup_ratio(self) -> float:
+        """
+        Return ratio of total bytes to bytes in unique chunks
+        """
+        unique_bytes = self.unique_bytes
+        return self.total_bytes / unique_bytes if unique_bytes else 1.0
+
+    def __check_comparable__(self, other: 'ChunkIndex') -> None:
+        """
+        Check other index was created with the same chunking settings
+        """
+        if self.settings != other.settings:
+            raise FilesystemError(f'Chunk index settings differ: {self.settings} {other.settings}')
+
+    def new_chunks(self, other: 'ChunkIndex') -> Iterator[Tuple[str, int, int, str]]:
+        """
+        Iterate (path, offset, length, digest) for chunks not found anywhere in other index
+
+        Each new chunk is returned once, for the first file it is found in.
+        """
+        self.__check_comparable__(other)
+        known = set(digest for _offset, _length, digest in other.__iter_chunks__())
+        for path, chunks in self.files.items():
+            for offset, length, digest in chunks:
+                if digest not in known:
+                    known.add(digest)
+                    yield path, offset, length, digest
+
+    def changed_ranges(self, other: 'ChunkIndex', path: str) -> List[Tuple[int, int]]:
+        """
+        Return (offset, length) ranges of file path that differ from the file in other index
+
+        Chunks that are found anywhere in the other version of the file are not changed.
+        Adjacent changed chunks are merged to one range.
+        """
+        self.__check_comparable__(other)
+        known = set(digest for _offset, _length, digest in other.files.get(path, []))
+        ranges = []
+        for offset, length, digest in self.files.get(path, []):
+            if digest in known:
+                continue
+            if ranges and sum(ranges[-1]) == offset:
+                ranges[-1] = (ranges[-1][0], ranges[-1][1] + length)
+            else:
+                ranges.append((offset, length))
+        return ranges
+
+    def diff(self, other: 'ChunkIndex') -> Dict[str, List[Tuple[int, int]]]:
+        """
+        Return changed ranges by path for files that differ from other index
+
+        Files not in other index are returned with all chunks changed. Files only in other
+        index are not returned.
+        """
+        changes = {}
+        for path, chunks in self.files.items():
+            if other.files.get(path) == chunks:
+                continue
+            changes[path] = self.changed_ranges(other, path)
+        return changes
+
+    def write(self, filedescriptor: TextIO) -> None:
+        """
+        Write index to a text file object as newline delimited JSON
+        """
+        filedescriptor.write(json.dumps({'settings': self.settings}, separators=(',', ':')) + '\n')
+        for path, chunks in self.files.items():
+            filedescriptor.write(json.dumps({'path': path, 'chunks': chunks}, separators=(',', ':')) + '\n')
+
+    @classmethod
+    def read(cls, filedescriptor: TextIO) -> 'ChunkIndex':
+        """
+        Read index written with write() from a text file object
+        """
+        try:
+            index = cls(json.loads(filedescriptor.readline())['settings'])
+            for line in filedescriptor:
+                if line.strip():
+                    record = json.loads(line)
+                    index.files[record['path']] = [tuple(chunk) for chunk in record['chunks']]
+        except (KeyError, TypeError, ValueError) as error:
+            raise FilesystemError(f'Invalid chunk index: {error}') from error
+        return index
+
+
+# pylint: disable=too-few-public-methods
+class TreeChunker:
+    """
+    Build a ChunkIndex for regular files in a tree
+
+    Files are chunked in parallel on a thread pool and added to the index in tree walk
+    order. Tree items are not cached and at most CHUNK_QUEUE_DEPTH files per worker are
+    pending at a time. Reads are throttled by the I/O governor of the tree, if set. Extra keyword
+    arguments are passed to FileChunker.
+    """
+    tree: 'Tree'  # noqa
+    workers: int
+    chunker: FileChunker
+
+    def __init__(self, tree: 'Tree', workers: int = DEFAULT_CHUNK_WORKERS, **kwargs) -> None:  # noqa
+        self.tree = tree
+        self.workers = max(1, workers)
+        self.chunker = FileChunker(**kwargs)
+
+    def __iter_files__(self) -> Iterator[str]:
+        """
+        Iterate paths of regular files in the tree
+        """
+        for item in self.tree.walk():
+            if stat.S_ISREG(os.lstat(item).st_mode):
+                yield str(item)
+
+    def __file_chunks__(self, path: str) -> List[Chunk]:
+        """
+        Return chunks of a file in the tree
+        """
+        return self.chunker.file_chunks(path, self.tree.governor)
+
+    def load(self) -> ChunkIndex:
+        """
+        Chunk all files in the tree, returning ChunkIndex
+
+        Raises FilesystemError if files can't be read.
+        """
+        index = ChunkIndex(self.chunker.settings)
+        prefix_length = len(str(self.tree).rstrip(os.sep)) + 1
+        pending = deque()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                try:
+                    for path in self.__iter_files__():
+                        pending.append((path, executor.submit(self.__file_chunks__, path)))
+                        if len(pending) >= self.workers * CHUNK_QUEUE_DEPTH:
+                            path, future = pending.popleft()
+                            index.files[path[prefix_length:]] = future.result()
+                    while pending:
+                        path, future = pending.popleft()
+                        index.files[path[prefix_length:]] = future.result()
+                finally:
+                    for _path, future in pending:
+                        future.cancel()
+        except OSError as error:
+            raise FilesystemError(f'Error chunking files in {self.tree}: {error}') from error
+        return index
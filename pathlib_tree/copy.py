@@ -0,0 +1,420 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+File copy utilities for filesystem trees
+"""
+import errno
+import os
+import stat
+import sys
+import tempfile
+
+from pathlib import Path
+from typing import Optional, Set, Tuple, Union
+
+from .exceptions import FilesystemError
+from .sparse import is_sparse, iter_data_extents
+from .throttle import IOGovernor
+from .utils import current_umask
+
+#: Block size for kernel assisted and buffered file copies
+DEFAULT_COPY_BLOCK_SIZE = 2**23
+
+#: Copy methods reported by copy_file()
+COPY_METHOD_REFLINK = 'reflink'
+COPY_METHOD_HARDLINK = 'hardlink'
+COPY_METHOD_COPY_FILE_RANGE = 'copy_file_range'
+COPY_METHOD_SENDFILE = 'sendfile'
+COPY_METHOD_BUFFERED = 'buffered'
+COPY_METHOD_SPARSE = 'sparse'
+COPY_METHOD_SYMLINK = 'symlink'
+
+#: Permissions of new files before the umask is applied
+NEW_FILE_MODE = 0o666
+
+#: Errors from copy_file_range and sendfile that mean the call is not usable for the file pair
+UNSUPPORTED_COPY_ERRORS = (
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.EBADF,
+    errno.ETXTBSY,
+)
+
+#: Linux ioctl request to clone file extents from another file descriptor
+FICLONE = 0x40049409
+#: Errors from FICLONE and link calls that mean cloning or linking is not possible for the file pair
+UNSUPPORTED_LINK_ERRORS = UNSUPPORTED_COPY_ERRORS + (
+    errno.ENOTTY,
+    errno.EPERM,
+    errno.EMLINK,
+)
+#: Errors from FICLONE that mean the filesystems do not support reflinks at all
+UNSUPPORTED_REFLINK_ERRORS = (
+    errno.ENOTTY,
+    errno.EOPNOTSUPP,
+    errno.EXDEV,
+)
+#: Pairs of source and target devices where reflinks were found to be unsupported
+UNSUPPORTED_REFLINK_DEVICES: Set[Tuple[int, int]] = set()
+
+
+def clone_file(source: Union[str, Path], target: Union[str, Path]) -> None:
+    """
+    Create target file as a reflink clone of source file with the FICLONE ioctl
+
+    The clone is created as a partial file that replaces the target, so an existing target
+    is not modified if cloning fails. When the filesystem does not support reflinks, the
+    pair of source and target devices is recorded and later clones between the same
+    devices fail without touching any files.
+
+    Raises OSError if the filesystem or platform does not support reflinks.
+    """
+    if not sys.platform.startswith('linux'):
+        raise OSError(errno.EOPNOTSUPP, 'Reflinks are not supported on this platform')
+    # pylint: disable=import-outside-toplevel
+    import fcntl
+
+    target = Path(target)
+    devices = (os.stat(source).st_dev, os.stat(target.parent).st_dev)
+    if devices in UNSUPPORTED_REFLINK_DEVICES:
+        raise OSError(errno.EOPNOTSUPP, 'Reflinks are not supported by the filesystem')
+    source_fd = os.open(source, os.O_RDONLY)
+    try:
+        target_fd, partial = create_partial_file(target)
+        try:
+            try:
+                fcntl.ioctl(target_fd, FICLONE, source_fd)
+            finally:
+                os.close(target_fd)
+            os.replace(partial, target)
+        except BaseException as error:
+            if os.path.lexists(partial):
+                os.unlink(partial)
+            if getattr(error, 'errno', None) in UNSUPPORTED_REFLINK_ERRORS:
+                UNSUPPORTED_REFLINK_DEVICES.add(devices)
+            raise
+    finally:
+        os.close(source_fd)
+
+
+def is_same_file(source_stat: os.stat_result, target_stat: os.stat_result) -> bool:
+    """
+    Check if two stat results refer to the same inode
+    """
+    return source_stat.st_dev == target_stat.st_dev and source_stat.st_ino == target_stat.st_ino
+
+
+def __throttle__(governor: Optional[IOGovernor], size: int) -> None:
+    """
+    Wait for governor before copying size bytes
+    """
+    if governor is not None:
+        governor.consume(size)
+
+
+def __copy_file_range__(source_fd: int,
+                        target_fd: int,
+                        size: int,
+                        block_size: int,
+                        governor: Optional[IOGovernor] = None) -> int:
+    """
+    Copy file contents with os.copy_file_range
+    """
+    copied = 0
+    while copied < size:
+        count = min(block_size, size - copied)
+        __throttle__(governor, count)
+        count = os.copy_file_range(source_fd, target_fd, count)
+        if count == 0:
+            break
+        copied += count
+    return copied
+
+
+def __sendfile__(source_fd: int,
+                 target_fd: int,
+                 size: int,
+                 block_size: int,
+                 governor: Optional[IOGovernor] = None) -> int:
+    """
+    Copy file contents with os.sendfile
+    """
+    copied = 0
+    while copied < size:
+        count = min(block_size, size - copied)
+        __throttle__(governor, count)
+        count = os.sendfile(target_fd, source_fd, copied, count)
+        if count == 0:
+            break
+        copied += count
+    return copied
+
+
+def __buffered_copy__(source_fd: int,
+                      target_fd: int,
+                      block_size: int,
+                      governor: Optional[IOGovernor] = None) -> int:
+    """
+    Copy file contents with buffered reads and writes
+    """
+    copied = 0
+    while True:
+        chunk = os.read(source_fd, block_size)
+        if not chunk:
+            break
+        __throttle__(governor, len(chunk))
+        view = memoryview(chunk)
+        while view:
+            count = os.write(target_fd, view)
+            view = view[count:]
+        copied += len(chunk)
+    return copied
+
+
+def __copy_extent__(source_fd: int,
+                    target_fd: int,
+                    offset: int,
+                    length: int,
+                    block_size: int,
+                    governor: Optional[IOGovernor] = None) -> None:
+    """
+    Copy a range of file data at the same offset with os.copy_file_range or pread and pwrite
+    """
+    end = offset + length
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while offset < end:
+                count = min(block_size, end - offset)
+                __throttle__(governor, count)
+                count = os.copy_file_range(source_fd, target_fd, count, offset, offset)
+                if count == 0:
+                    return
+                offset += count
+            return
+        except OSError as error:
+            if error.errno not in UNSUPPORTED_COPY_ERRORS:
+                raise
+    while offset < end:
+        count = min(block_size, end - offset)
+        __throttle__(governor, count)
+        chunk = os.pread(source_fd, count, offset)
+        if not chunk:
+            return
+        view = memoryview(chunk)
+        while view:
+            count = os.pwrite(target_fd, view, offset)
+            view = view[count:]
+            offset += count
+
+
+def copy_sparse_data(source_fd: int, target_fd: int, size: int,
+                     block_size: int = DEFAULT_COPY_BLOCK_SIZE,
+                     governor: Optional[IOGovernor] = None) -> None:
+    """
+    Copy only data extents of a sparse file, leaving holes unallocated in target
+
+    Target file is truncated to the source size, so trailing holes are preserved as well.
+    """
+    os.ftruncate(target_fd, 0)
+    for offset, length in iter_data_extents(source_fd, size):
+        __copy_extent__(source_fd, target_fd, offset, length, block_size, governor)
+    os.ftruncate(target_fd, size)
+
+
+def copy_file_data(source_fd: int, target_fd: int, size: int,
+                   block_size: int = DEFAULT_COPY_BLOCK_SIZE,
+                   governor: Optional[IOGovernor] = None) -> str:
+    """
+    Copy file data between open file descriptors
+
+    Sparse files are copied extent by extent to preserve holes. Other files are copied
+    with os.copy_file_range first, then os.sendfile and finally with buffered copy.
+    Each copied block is throttled by governor if given.
+    Returns name of the copy method that was used.
+    """
+    if hasattr(os, 'pread') and is_sparse(os.fstat(source_fd)):
+        copy_sparse_data(source_fd, target_fd, size, block_size, governor)
+        return COPY_METHOD_SPARSE
+
+    if hasattr(os, 'copy_file_range'):
+        try:
+            __copy_file_range__(source_fd, target_fd, size, block_size, governor)
+            return COPY_METHOD_COPY_FILE_RANGE
+        except OSError as error:
+            if error.errno not in UNSUPPORTED_COPY_ERRORS:
+                raise
+            os.lseek(source_fd, 0, os.SEEK_SET)
+            os.lseek(target_fd, 0, os.SEEK_SET)
+            os.ftruncate(target_fd, 0)
+
+    if hasattr(os, 'sendfile'):
+        try:
+            __sendfile__(source_fd, target_fd, size, block_size, governor)
+            return COPY_METHOD_SENDFILE
+        except OSError as error:
+            if error.errno not in UNSUPPORTED_COPY_ERRORS:
+                raise
+            os.lseek(source_fd, 0, os.SEEK_SET)
+            os.lseek(target_fd, 0, os.SEEK_SET)
+            os.ftruncate(target_fd, 0)
+
+    __buffered_copy__(source_fd, target_fd, block_size, governor)
+    return COPY_METHOD_BUFFERED
+
+
+def copy_metadata(target: Union[str, Path], source_stat: os.stat_result) -> None:
+    """
+    Copy mode, ownership and timestamps from source stat result to target path
+
+    Ownership is only changed when the process has permissions to do so. Symbolic links
+    are never followed.
+    """
+    follow_symlinks = not stat.S_ISLNK(source_stat.st_mode)
+    if hasattr(os, 'chown'):
+        try:
+            os.chown(target, source_stat.st_uid, source_stat.st_gid, follow_symlinks=follow_symlinks)
+        except PermissionError:
+            pass
+    if follow_symlinks or os.chmod in os.supports_follow_symlinks:
+        try:
+            os.chmod(target, stat.S_IMODE(source_stat.st_mode), follow_symlinks=follow_symlinks)
+        except NotImplementedError:
+            pass
+    if follow_symlinks or os.utime in os.supports_follow_symlinks:
+        os.utime(
+            target,
+            ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns),
+            follow_symlinks=follow_symlinks
+        )
+
+
+def __link_file__(source: Union[str, Path],
+                  target: Union[str, Path],
+                  reflink: bool,
+                  hardlink: bool) -> Optional[str]:
+    """
+    Try to create target as reflink or hard link to source
+
+    Returns name of the method used or None if neither was possible.
+    """
+    if reflink:
+        try:
+            clone_file(source, target)
+            return COPY_METHOD_REFLINK
+        except OSError as error:
+            if error.errno not in UNSUPPORTED_LINK_ERRORS:
+                raise
+    if hardlink:
+        try:
+            if os.path.lexists(target):
+                os.unlink(target)
+            os.link(source, target)
+            return COPY_METHOD_HARDLINK
+        except OSError as error:
+            if error.errno not in UNSUPPORTED_LINK_ERRORS:
+                raise
+    return None
+
+
+def create_partial_file(target: Union[str, Path]) -> Tuple[int, str]:
+    """
+    Create a uniquely named partial file next to target, returning file descriptor and path
+
+    The partial file gets the permissions of an existing target file, so replacing the target
+    with it keeps the mode even when metadata is not preserved. Otherwise it gets the default
+    permissions of new files with the current umask, instead of the private mkstemp mode.
+    """
+    target = Path(target)
+    filedescriptor, partial = tempfile.mkstemp(prefix=f'.{target.name}.', suffix='.partial', dir=target.parent)
+    try:
+        try:
+            target_mode = os.lstat(target).st_mode
+        except FileNotFoundError:
+            target_mode = None
+        if target_mode is not None and stat.S_ISREG(target_mode):
+            os.fchmod(filedescriptor, stat.S_IMODE(target_mode))
+        else:
+            os.fchmod(filedescriptor, NEW_FILE_MODE & ~current_umask())
+    except BaseException:
+        os.close(filedescriptor)
+        os.unlink(partial)
+        raise
+    return filedescriptor, partial
+
+
+def __copy_file_contents__(source: Union[str, Path],
+                           target: Union[str, Path],
+                           size: int,
+                           block_size: int,
+                           governor: Optional[IOGovernor] = None) -> str:
+    """
+    Copy file contents to target file, returning name of the copy method used
+
+    Contents are written to a partial file that atomically replaces the target, so an
+    interrupted copy never leaves a partially written target and other hard links to an
+    existing target are not modified.
+    """
+    source_fd = os.open(source, os.O_RDONLY)
+    try:
+        target_fd, partial = create_partial_file(target)
+        try:
+            try:
+                method = copy_file_data(source_fd, target_fd, size, block_size, governor)
+            finally:
+                os.close(target_fd)
+            os.replace(partial, target)
+        except BaseException:
+            if os.path.lexists(partial):
+                os.unlink(partial)
+            raise
+    finally:
+        os.close(source_fd)
+    return method
+
+
+def copy_file(source: Union[str, Path],
+              target: Union[str, Path],
+              preserve: bool = True,
+              block_size: int = DEFAULT_COPY_BLOCK_SIZE,
+              source_stat: Optional[os.stat_result] = None,
+              reflink: bool = True,
+              hardlink: bool = False,
+              governor: Optional[IOGovernor] = None) -> str:
+    """
+    Copy a single file or symbolic link to target path
+
+    Regular files are cloned with reflinks first if reflink is set, then hard linked if
+    hardlink is set and finally copied byte by byte. Unsupported reflinks and hard links
+    fall back silently to the next method. Copied data is throttled by governor if given.
+
+    Existing target file is replaced. Returns name of the copy method that was used.
+    Raises FilesystemError if copying fails.
+    """
+    try:
+        if source_stat is None:
+            source_stat = os.lstat(source)
+
+        if stat.S_ISLNK(source_stat.st_mode):
+            if os.path.lexists(target):
+                os.unlink(target)
+            os.symlink(os.readlink(source), target)
+            method = COPY_METHOD_SYMLINK
+        else:
+            if os.path.islink(target):
+                os.unlink(target)
+            method = __link_file__(source, target, reflink, hardlink)
+            if method == COPY_METHOD_HARDLINK:
+                return method
+            if method is None:
+                method = __copy_file_contents__(source, target, source_stat.st_size, block_size, governor)
+
+        if preserve:
+            copy_metadata(target, source_stat)
+    except OSError as error:
+        raise FilesystemError(f'Error copying {source} to {target}: {error}') from error
+    return method
@@ -0,0 +1,128 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Deduplication of identical files in filesystem trees
+"""
+import os
+import tempfile
+
+from collections import defaultdict
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+from .copy import (
+    clone_file,
+    copy_metadata,
+    COPY_METHOD_HARDLINK,
+    COPY_METHOD_REFLINK,
+    UNSUPPORTED_LINK_ERRORS,
+)
+from .duplicates import TreeDuplicates, DEFAULT_DUPLICATE_CHECKSUM
+from .exceptions import FilesystemError
+
+
+# pylint: disable=too-few-public-methods
+class DedupeResult:
+    """
+    Results of tree deduplication
+    """
+    linked: List[Tuple[Path, Path, str]]
+    skipped: List[Path]
+    bytes_saved: int
+
+    def __init__(self) -> None:
+        self.linked = []
+        self.skipped = []
+        self.bytes_saved = 0
+
+
+class TreeDedupe:
+    """
+    Replace identical files in a tree with reflinks or hard links
+
+    Identical files are detected with TreeDuplicates. Files that already share the same
+    inode are counted once, and files are only linked within the same filesystem.
+    """
+    tree: 'Tree'  # noqa
+    hardlink: bool
+    algorithm: str
+    dry_run: bool
+
+    def __init__(self,
+                 tree: 'Tree',  # noqa
+                 hardlink: bool = False,
+                 algorithm: str = DEFAULT_DUPLICATE_CHECKSUM,
+                 dry_run: bool = False) -> None:
+        self.tree = tree
+        self.hardlink = hardlink
+        self.algorithm = algorithm
+        self.dry_run = dry_run
+
+    def __iter_groups__(self) -> Iterator[List[Tuple['TreeItem', os.stat_result]]]:  # noqa
+        """
+        Iterate groups of identical files that are on the same filesystem
+        """
+        for group in TreeDuplicates(self.tree, algorithm=self.algorithm):
+            devices = defaultdict(list)
+            for item in group:
+                item_stat = os.lstat(item)
+                devices[item_stat.st_dev].append((item, item_stat))
+            for items in devices.values():
+                if len(items) > 1:
+                    yield items
+
+    def __link__(self, original: Path, duplicate: Path, duplicate_stat: os.stat_result) -> str:
+        """
+        Replace duplicate file with a reflink or hard link to original file
+
+        Returns the link method used. Raises OSError if linking is not possible.
+        """
+        filedescriptor, temporary = tempfile.mkstemp(
+            prefix=f'.{duplicate.name}.', suffix='.dedupe', dir=duplicate.parent
+        )
+        os.close(filedescriptor)
+        try:
+            try:
+                clone_file(original, temporary)
+                copy_metadata(temporary, duplicate_stat)
+                method = COPY_METHOD_REFLINK
+            except OSError as error:
+                if not self.hardlink or error.errno not in UNSUPPORTED_LINK_ERRORS:
+                    raise
+                os.unlink(temporary)
+                os.link(original, temporary)
+                method = COPY_METHOD_HARDLINK
+            os.replace(temporary, duplicate)
+        finally:
+            if os.path.lexists(temporary):
+                os.unlink(temporary)
+        return method
+
+    def run(self) -> DedupeResult:
+        """
+        Run deduplication, returning DedupeResult
+
+        Raises FilesystemError if processing fails for other reasons than filesystem not
+        supporting reflinks or hard links.
+        """
+        result = DedupeResult()
+        for group in self.__iter_groups__():
+            original = group[0][0]
+            for duplicate, duplicate_stat in group[1:]:
+                if self.dry_run:
+                    result.linked.append((original, duplicate, None))
+                    result.bytes_saved += duplicate_stat.st_size
+                    continue
+                try:
+                    method = self.__link__(original, duplicate, duplicate_stat)
+                except OSError as error:
+                    if error.errno not in UNSUPPORTED_LINK_ERRORS:
+                        raise FilesystemError(f'Error deduplicating {duplicate}: {error}') from error
+                    result.skipped.append(duplicate)
+                    continue
+                result.linked.append((original, duplicate, method))
+                result.bytes_saved += duplicate_stat.st_size
+        return result
@@ -0,0 +1,374 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Rolling checksum delta transfer of changed files
+"""
+import hashlib
+import mmap
+import os
+import stat
+import zlib
+
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from .arrays import load_numpy
+from .copy import copy_metadata, create_partial_file
+from .exceptions import FilesystemError
+from .throttle import IOGovernor
+
+#: Default block size for delta signatures
+DEFAULT_DELTA_BLOCK_SIZE = 2**16
+#: Number of positions scanned with the rolling checksum at a time
+DEFAULT_DELTA_SEARCH_WINDOW = 2**20
+#: Digest size of strong block checksums
+DELTA_STRONG_DIGEST_SIZE = 16
+#: Modulus of the Adler-32 weak checksum
+ADLER32_MODULUS = 65521
+
+#: Copy method reported for files updated with delta transfer
+COPY_METHOD_DELTA = 'delta'
+
+#: Delta modes: rewrite changed blocks of the target file, or build a new file and replace target
+DELTA_MODE_INPLACE = 'inplace'
+DELTA_MODE_TEMPFILE = 'tempfile'
+DELTA_MODES = (DELTA_MODE_INPLACE, DELTA_MODE_TEMPFILE)
+
+#: Weak checksums of target blocks mapped to (strong checksum, target offset) pairs
+DeltaSignatures = Dict[int, List[Tuple[bytes, int]]]
+#: Delta operation: source offset, length and target offset of matching data or None for literal data
+DeltaOperation = Tuple[int, int, Optional[int]]
+
+
+def strong_checksum(data: bytes) -> bytes:
+    """
+    Return strong checksum of a block
+    """
+    return hashlib.blake2b(data, digest_size=DELTA_STRONG_DIGEST_SIZE).digest()
+
+
+def block_signatures(filedescriptor: int,
+                     size: int,
+                     block_size: int = DEFAULT_DELTA_BLOCK_SIZE,
+                     governor: Optional[IOGovernor] = None) -> DeltaSignatures:
+    """
+    Return weak and strong checksums of full blocks of an open file
+
+    A trailing partial block is not included, since it can only match at the end of the
+    source file.
+    """
+    signatures = {}
+    for offset in range(0, size - block_size + 1, block_size):
+        if governor is not None:
+            governor.consume(block_size)
+        data = os.pread(filedescriptor, block_size, offset)
+        if len(data) < block_size:
+            break
+        signatures.setdefault(zlib.adler32(data), []).append((strong_checksum(data), offset))
+    return signatures
+
+
+def __python_weak_matches__(data: Any,
+                            start: int,
+                            end: int,
+                            block_size: int,
+                            signatures: DeltaSignatures) -> Iterator[Tuple[int, int]]:
+    """
+    Iterate (position, weak checksum) for positions start to end with known weak checksums
+
+    The Adler-32 checksum is rolled one byte at a time.
+    """
+    value = zlib.adler32(data[start:start + block_size])
+    low = value & 0xffff
+    high = value >> 16
+    for position in range(start, end + 1):
+        if position > start:
+            removed = data[position - 1]
+            low = (low - removed + data[position + block_size - 1]) % ADLER32_MODULUS
+            high = (high - block_size * removed + low - 1) % ADLER32_MODULUS
+        value = (high << 16) | low
+        if value in signatures:
+            yield position, value
+
+
+def __adler32_windows__(numpy: Any, values: Any, block_size: int) -> Any:
+    """
+    Return Adler-32 checksums of all block_size windows of an int64 array of bytes
+
+    Checksums are calculated from prefix sums of the bytes and of the bytes weighted by
+    their position.
+    """
+    sums = numpy.concatenate(([0], numpy.cumsum(values)))
+    weighted = numpy.concatenate(([0], numpy.cumsum(values * numpy.arange(len(values), dtype=numpy.int64))))
+    positions = numpy.arange(len(values) - block_size + 1, dtype=numpy.int64)
+    window_sums = sums[positions + block_size] - sums[positions]
+    window_weighted = weighted[positions + block_size] - weighted[positions]
+    low = (1 + window_sums) % ADLER32_MODULUS
+    high = (block_size + (block_size + positions) * window_sums - window_weighted) % ADLER32_MODULUS
+    return (high << 16) | low
+
+
+def __numpy_weak_matches__(numpy: Any,
+                           data: Any,
+                           start: int,
+                           end: int,
+                           block_size: int,
+                           known: Any) -> Iterator[Tuple[int, int]]:
+    """
+    Iterate (position, weak checksum) for positions start to end with known weak checksums
+
+    Checksums of all positions are calculated at once with NumPy. Candidates are filtered
+    by the low 16 bits of known checksums, and then looked up from the sorted array of
+    known checksums with a binary search.
+    """
+    values = numpy.frombuffer(data, dtype=numpy.uint8, count=end + block_size - start, offset=start)
+    checksums = __adler32_windows__(numpy, values.astype(numpy.int64), block_size)
+    known_low = numpy.zeros(2**16, dtype=bool)
+    known_low[known & 0xffff] = True
+    candidates = numpy.flatnonzero(known_low[checksums & 0xffff])
+    indexes = numpy.minimum(numpy.searchsorted(known, checksums[candidates]), len(known) - 1)
+    for index in candidates[known[indexes] == checksums[candidates]].tolist():
+        yield start + index, int(checksums[index])
+
+
+class DeltaScanner:
+    """
+    Find blocks of a target file in a source file with a rolling weak checksum
+
+    Source data is compared with block signatures of the target. Blocks at the same offset
+    are checked first, so files with small in place edits are scanned one block at a time.
+    Elsewhere candidates are found with a rolling Adler-32 checksum, calculated with NumPy
+    when available, and confirmed with a strong checksum.
+
+    With inplace set, only target blocks at or after the source offset are matched, so the
+    delta can be applied to the target file in ascending order without overwriting blocks
+    that are still needed.
+    """
+    signatures: DeltaSignatures
+    block_size: int
+    inplace: bool
+    search_window: int
+
+    def __init__(self,
+                 signatures: DeltaSignatures,
+                 block_size: int = DEFAULT_DELTA_BLOCK_SIZE,
+                 inplace: bool = False,
+                 search_window: int = DEFAULT_DELTA_SEARCH_WINDOW,
+                 use_numpy: Optional[bool] = None) -> None:
+        self.signatures = signatures
+        self.block_size = block_size
+        self.inplace = inplace
+        self.search_window = max(1, search_window)
+        self.__numpy__ = load_numpy(use_numpy)
+        self.__known__ = None
+        if self.__numpy__ is not None and signatures:
+            self.__known__ = self.__numpy__.sort(
+                self.__numpy__.fromiter(signatures.keys(), dtype=self.__numpy__.int64, count=len(signatures))
+            )
+
+    def __match__(self, data: Any, position: int, weak: int) -> Optional[int]:
+        """
+        Return target offset of block matching data at position, preferring the same offset
+        """
+        candidates = self.signatures.get(weak)
+        if not candidates:
+            return None
+        strong = strong_checksum(data[position:position + self.block_size])
+        offsets = [offset for checksum, offset in candidates if checksum == strong]
+        if self.inplace:
+            offsets = [offset for offset in offsets if offset >= position]
+        if not offsets:
+            return None
+        return position if position in offsets else offsets[0]
+
+    def __weak_matches__(self, data: Any, start: int, end: int) -> Iterator[Tuple[int, int]]:
+        """
+        Iterate positions from start to end with weak checksums found in signatures
+        """
+        if not self.signatures:
+            return iter(())
+        if self.__known__ is not None:
+            return __numpy_weak_matches__(self.__numpy__, data, start, end, self.block_size, self.__known__)
+        return __python_weak_matches__(data, start, end, self.block_size, self.signatures)
+
+    def __search__(self, data: Any, start: int, end: int) -> Optional[int]:
+        """
+        Return first position from start to end where a target block matches
+        """
+        for position, weak in self.__weak_matches__(data, start, end):
+            if self.__match__(data, position, weak) is not None:
+                return position
+        return None
+
+    def scan(self, data: Any, governor: Optional[IOGovernor] = None) -> List[DeltaOperation]:
+        """
+        Return delta operations to build source data from the target file
+
+        Operations cover the source data in order. Data is any buffer supporting slicing,
+        such as bytes or a memory map of the source file.
+        """
+        size = len(data)
+        operations = []
+        literal = 0
+        position = 0
+        while position + self.block_size <= size:
+            if governor is not None:
+                governor.consume(self.block_size)
+            offset = self.__match__(data, position, zlib.adler32(data[position:position + self.block_size]))
+            if offset is not None:
+                if literal < position:
+                    operations.append((literal, position - literal, None))
+                operations.append((position, self.block_size, offset))
+                position += self.block_size
+                literal = position
+                continue
+            end = min(size - self.block_size, position + self.search_window)
+            if governor is not None:
+                governor.consume(end - position, operations=0)
+            match = self.__search__(data, position + 1, end) if position < end else None
+            position = match if match is not None else end + 1
+        if literal < size:
+            operations.append((literal, size - literal, None))
+        return operations
+
+
+def __write_all__(filedescriptor: int, data: bytes, offset: int) -> None:
+    """
+    Write all data to an open file at offset
+    """
+    view = memoryview(data)
+    while view:
+        count = os.pwrite(filedescriptor, view, offset)
+        view = view[count:]
+        offset += count
+
+
+def apply_delta(operations: List[DeltaOperation],
+                source_fd: int,
+                target_fd: int,
+                output_fd: int,
+                block_size: int = DEFAULT_DELTA_BLOCK_SIZE,
+                governor: Optional[IOGovernor] = None) -> int:
+    """
+    Write delta operations to output file, returning number of literal bytes from source
+
+    Literal data is read from source file and matching blocks from target file. When
+    output is the target file itself, blocks already at the right offset are not written.
+    """
+    transferred = 0
+    for offset, length, target_offset in operations:
+        if target_offset is not None:
+            if target_offset == offset and output_fd == target_fd:
+                continue
+            read_fd, read_offset = target_fd, target_offset
+        else:
+            read_fd, read_offset = source_fd, offset
+        end = offset + length
+        while offset < end:
+            count = min(block_size, end - offset)
+            if governor is not None:
+                governor.consume(count)
+            data = os.pread(read_fd, count, read_offset)
+            if not data:
+                raise FilesystemError(f'Unexpected end of file reading delta data at offset {read_offset}')
+            __write_all__(output_fd, data, offset)
+            offset += len(data)
+            read_offset += len(data)
+            if target_offset is None:
+                transferred += len(data)
+    return transferred
+
+
+def __delta_tempfile__(operations: List[DeltaOperation],
+                       source_fd: int,
+                       target_fd: int,
+                       target: Path,
+                       block_size: int,
+                       governor: Optional[IOGovernor]) -> int:
+    """
+    Build new file from delta next to target and replace target with it
+    """
+    output_fd, partial = create_partial_file(target)
+    try:
+        try:
+            transferred = apply_delta(operations, source_fd, target_fd, output_fd, block_size, governor)
+        finally:
+            os.close(output_fd)
+        os.replace(partial, target)
+    except BaseException:
+        if os.path.lexists(partial):
+            os.unlink(partial)
+        raise
+    return transferred
+
+
+def __delta_update__(source_fd: int,
+                     target_fd: int,
+                     target: Path,
+                     size: int,
+                     mode: str,
+                     block_size: int,
+                     governor: Optional[IOGovernor],
+                     use_numpy: Optional[bool]) -> int:
+    """
+    Update open target file from open source file of size bytes with delta transfer
+    """
+    signatures = block_signatures(target_fd, os.fstat(target_fd).st_size, block_size, governor)
+    scanner = DeltaScanner(signatures, block_size, mode == DELTA_MODE_INPLACE, use_numpy=use_numpy)
+    operations = []
+    if size:
+        with mmap.mmap(source_fd, 0, access=mmap.ACCESS_READ) as data:
+            operations = scanner.scan(data, governor)
+    if mode == DELTA_MODE_INPLACE:
+        transferred = apply_delta(operations, source_fd, target_fd, target_fd, block_size, governor)
+        os.ftruncate(target_fd, size)
+        return transferred
+    return __delta_tempfile__(operations, source_fd, target_fd, target, block_size, governor)
+
+
+def delta_copy_file(source: Union[str, Path],
+                    target: Union[str, Path],
+                    mode: str = DELTA_MODE_TEMPFILE,
+                    block_size: int = DEFAULT_DELTA_BLOCK_SIZE,
+                    preserve: bool = True,
+                    source_stat: Optional[os.stat_result] = None,
+                    governor: Optional[IOGovernor] = None,
+                    use_numpy: Optional[bool] = None) -> int:
+    """
+    Update existing target file to match source file by transferring only changed blocks
+
+    Block signatures of the target are matched against the source with a rolling checksum.
+    In 'tempfile' mode, a new file is built from matching target blocks and literal source
+    data and renamed over target. In 'inplace' mode, only changed blocks of the target are
+    rewritten. In place updates are not atomic and change all hard links of the target.
+
+    Returns number of literal bytes transferred from source. Raises FilesystemError if
+    updating fails.
+    """
+    if mode not in DELTA_MODES:
+        raise FilesystemError(f'Unexpected delta mode: {mode}')
+    target = Path(target)
+    try:
+        if source_stat is None:
+            source_stat = os.lstat(source)
+        if not stat.S_ISREG(source_stat.st_mode):
+            raise FilesystemError(f'Delta source is not a regular file: {source}')
+        source_fd = os.open(source, os.O_RDONLY)
+        try:
+            target_fd = os.open(target, os.O_RDWR if mode == DELTA_MODE_INPLACE else os.O_RDONLY)
+            try:
+                transferred = __delta_update__(
+                    source_fd, target_fd, target, source_stat.st_size, mode, block_size, governor, use_numpy
+                )
+            finally:
+                os.close(target_fd)
+        finally:
+            os.close(source_fd)
+        if preserve:
+            copy_metadata(target, source_stat)
+    except OSError as error:
+        raise FilesystemError(f'Error updating {target} from {source} with delta: {error}') from error
+    return transferred
@@ -0,0 +1,47 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Comparison of file contents in two trees
+"""
+from typing import List, Tuple
+
+from .sparse import files_equal
+
+
+def diff_trees(tree: 'Tree', other: 'Tree') -> Tuple[List['TreeItem'], List['TreeItem'], List['TreeItem']]:  # noqa
+    """
+    Compare contents of files in two trees
+
+    Returns lists of files with differing contents, files missing from tree and files
+    missing from other tree. Reads are throttled by the I/O governor of tree, if set.
+    """
+    missing_self = []
+    missing_other = []
+    different = []
+    for item in tree:
+        path = other.joinpath(item.relative_to(tree))
+        if item.is_dir() or path.is_dir():
+            if item.is_dir() and path.is_file():
+                missing_self.append(path)
+            if item.is_file() and path.is_dir():
+                missing_other.append(path)
+        elif path.exists():
+            if not files_equal(item, path, governor=tree.governor):
+                different.append(path)
+        else:
+            missing_other.append(path)
+
+    for item in other:
+        path = tree.joinpath(item.relative_to(other))
+        if item.is_dir() or path.is_dir():
+            if item.is_dir() and path.is_file():
+                missing_other.append(path)
+            if item.is_file() and path.is_dir():
+                missing_self.append(path)
+        elif not path.exists():
+            missing_self.append(path)
+
+    return different, missing_self, missing_other
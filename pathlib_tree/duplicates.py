@@ -0,0 +1,183 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Duplicate file detection for filesystem trees
+"""
+import hashlib
+import itertools
+import os
+import stat
+
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+from .checksum import file_checksum, validate_checksum_algorithm
+from .exceptions import FilesystemError
+from .throttle import IOGovernor
+
+#: Default number of concurrent hashing workers
+DEFAULT_DUPLICATE_WORKERS = 4
+#: Number of bytes hashed from start and end of each file before full checksums
+DEFAULT_PARTIAL_HASH_SIZE = 2**16
+#: Checksum algorithm used for duplicate detection
+DEFAULT_DUPLICATE_CHECKSUM = 'sha256'
+#: Block size when reading files for duplicate detection
+DEFAULT_DUPLICATE_BLOCK_SIZE = 2**20
+
+
+def partial_checksum(path: str,
+                     size: int,
+                     partial_size: int,
+                     algorithm: str,
+                     governor: Optional[IOGovernor] = None) -> str:
+    """
+    Calculate hex digest of the first and last partial_size bytes of a file
+
+    If file is not larger than two times partial_size, digest of whole file is returned.
+    Reads are throttled by governor if given.
+    """
+    hash_callback = hashlib.new(algorithm)
+    with open(path, 'rb') as filedescriptor:
+        if size <= 2 * partial_size:
+            if governor is not None:
+                governor.consume(size)
+            hash_callback.update(filedescriptor.read())
+        else:
+            if governor is not None:
+                governor.consume(2 * partial_size, operations=2)
+            hash_callback.update(filedescriptor.read(partial_size))
+            filedescriptor.seek(size - partial_size)
+            hash_callback.update(filedescriptor.read(partial_size))
+    return hash_callback.hexdigest()
+
+
+class DuplicateGroup:
+    """
+    Group of files with identical contents
+    """
+    size: int
+    checksum: str
+    items: List['TreeItem']  # noqa
+
+    def __init__(self, size: int, checksum: str, items: List['TreeItem']) -> None:  # noqa
+        self.size = size
+        self.checksum = checksum
+        self.items = items
+
+    def __repr__(self) -> str:
+        return f'{self.checksum} {self.size} bytes {len(self.items)} files'
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __iter__(self) -> Iterator['TreeItem']:  # noqa
+        return iter(self.items)
+
+    @property
+    def wasted_bytes(self) -> int:
+        """
+        Return number of bytes used by the duplicate copies
+        """
+        return self.size * (len(self.items) - 1)
+
+
+class TreeDuplicates:
+    """
+    Find files with identical contents in a tree
+
+    Files are grouped by size first, then by checksum of first and last partial_size bytes,
+    and full checksums are only calculated for files that still collide. Hashing runs on a
+    thread pool. Hard links to the same inode are counted once, using the first path seen.
+    """
+    tree: 'Tree'  # noqa
+    workers: int
+    partial_size: int
+    algorithm: str
+    block_size: int
+
+    def __init__(self,
+                 tree: 'Tree',  # noqa
+                 workers: int = DEFAULT_DUPLICATE_WORKERS,
+                 partial_size: int = DEFAULT_PARTIAL_HASH_SIZE,
+                 algorithm: str = DEFAULT_DUPLICATE_CHECKSUM,
+                 block_size: int = DEFAULT_DUPLICATE_BLOCK_SIZE) -> None:
+        validate_checksum_algorithm(algorithm)
+        self.tree = tree
+        self.workers = max(1, workers)
+        self.partial_size = partial_size
+        self.algorithm = algorithm
+        self.block_size = block_size
+
+    def __candidates__(self) -> List[Tuple[int, 'TreeItem']]:  # noqa
+        """
+        Return files in tree with non-unique sizes sorted by size
+        """
+        inodes = set()
+        sizes = defaultdict(list)
+        for item in self.tree.walk():
+            item_stat = os.lstat(item)
+            if not stat.S_ISREG(item_stat.st_mode) or item_stat.st_size == 0:
+                continue
+            inode = (item_stat.st_dev, item_stat.st_ino)
+            if inode in inodes:
+                continue
+            inodes.add(inode)
+            sizes[item_stat.st_size].append(item)
+        return [
+            (size, item)
+            for size in sorted(sizes)
+            if len(sizes[size]) > 1
+            for item in sizes[size]
+        ]
+
+    def __partial_checksum__(self, candidate: Tuple[int, 'TreeItem']) -> str:  # noqa
+        """
+        Calculate partial checksum for a candidate
+        """
+        size, item = candidate
+        return partial_checksum(str(item), size, self.partial_size, self.algorithm, self.tree.governor)
+
+    def __file_checksum__(self, item: 'TreeItem') -> str:  # noqa
+        """
+        Calculate full checksum for a candidate
+        """
+        return file_checksum(str(item), self.algorithm, self.block_size, self.tree.governor)
+
+    def __iter_groups__(self, executor: ThreadPoolExecutor) -> Iterator[DuplicateGroup]:
+        """
+        Iterate duplicate groups with the hashing pipeline running on executor
+        """
+        candidates = self.__candidates__()
+        partial_checksums = executor.map(self.__partial_checksum__, candidates)
+        candidate_checksums = zip(candidates, partial_checksums)
+        for size, group in itertools.groupby(candidate_checksums, key=lambda value: value[0][0]):
+            partial_groups = defaultdict(list)
+            for (_size, item), checksum in group:
+                partial_groups[checksum].append(item)
+
+            for checksum, items in partial_groups.items():
+                if len(items) < 2:
+                    continue
+                if size <= 2 * self.partial_size:
+                    yield DuplicateGroup(size, checksum, items)
+                    continue
+                full_groups = defaultdict(list)
+                for item, full_checksum in zip(items, executor.map(self.__file_checksum__, items)):
+                    full_groups[full_checksum].append(item)
+                for full_checksum, full_items in full_groups.items():
+                    if len(full_items) > 1:
+                        yield DuplicateGroup(size, full_checksum, full_items)
+
+    def __iter__(self) -> Iterator[DuplicateGroup]:
+        """
+        Iterate groups of duplicate files as they are detected
+        """
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                yield from self.__iter_groups__(executor)
+        except OSError as error:
+            raise FilesystemError(f'Error detecting duplicates in {self.tree}: {error}') from error
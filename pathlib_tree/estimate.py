@@ -0,0 +1,211 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Sampling estimates of tree size with random probes
+"""
+import math
+import os
+import random
+import stat
+import statistics
+
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from .exceptions import FilesystemError
+
+#: Default maximum number of directories read for an estimate
+DEFAULT_ESTIMATE_BUDGET = 1000
+#: Default confidence level of estimate intervals
+DEFAULT_ESTIMATE_CONFIDENCE = 0.95
+#: Maximum number of probes per directory in the budget, limits probing of small trees
+ESTIMATE_PROBES_PER_DIRECTORY = 10
+
+#: Counter keys for totals, extension counts use keys prefixed with ESTIMATE_EXTENSION_PREFIX
+ESTIMATE_FILES = 'files'
+ESTIMATE_BYTES = 'bytes'
+ESTIMATE_DIRECTORIES = 'directories'
+ESTIMATE_EXTENSION_PREFIX = 'extension:'
+
+
+class Estimate:
+    """
+    Estimated value with a confidence interval
+    """
+    value: float
+    low: float
+    high: float
+    stderr: float
+
+    def __init__(self, value: float, low: float, high: float, stderr: float) -> None:
+        self.value = value
+        self.low = low
+        self.high = high
+        self.stderr = stderr
+
+    def __repr__(self) -> str:
+        return f'{self.value:.0f} ({self.low:.0f} - {self.high:.0f})'
+
+    @classmethod
+    def from_samples(cls, samples: List[float], confidence: float) -> 'Estimate':
+        """
+        Return estimate for the mean of samples with a normal approximation interval
+        """
+        value = statistics.fmean(samples)
+        stderr = statistics.stdev(samples) / math.sqrt(len(samples)) if len(samples) > 1 else math.inf
+        margin = statistics.NormalDist().inv_cdf((1 + confidence) / 2) * stderr
+        return cls(value, max(0.0, value - margin), value + margin, stderr)
+
+
+# pylint: disable=too-few-public-methods
+class TreeEstimate:
+    """
+    Estimated totals for a tree from random probes
+
+    Totals count items a full walk of the tree would return: files and other non-directory
+    items, their apparent size in bytes, and directories. File counts by extension are in extensions.
+    """
+    files: Estimate
+    bytes: Estimate
+    directories: Estimate
+    extensions: Dict[str, Estimate]
+    probes: int
+    directories_read: int
+
+    def __init__(self,
+                 totals: Dict[str, Estimate],
+                 extensions: Dict[str, Estimate],
+                 probes: int,
+                 directories_read: int) -> None:
+        self.files = totals[ESTIMATE_FILES]
+        self.bytes = totals[ESTIMATE_BYTES]
+        self.directories = totals[ESTIMATE_DIRECTORIES]
+        self.extensions = extensions
+        self.probes = probes
+        self.directories_read = directories_read
+
+    def __repr__(self) -> str:
+        return f'{self.files} files {self.bytes} bytes {self.directories} directories'
+
+
+class TreeEstimator:
+    """
+    Estimate totals of a tree with Knuth style random probes
+
+    Each probe walks from the tree root down to a leaf directory, choosing a random
+    subdirectory at each level. Counts of each directory on the path are weighted by the
+    product of the number of subdirectories on the levels above it, which gives an
+    unbiased estimate of the tree totals. Estimates of many probes are averaged.
+
+    Directories are listed with the tree loader, so exclusions, one_file_system and
+    symbolic link settings apply as in Tree.walk(). Listings are cached between probes,
+    and probing stops when budget directories have been read. A probe that would exceed
+    the budget is discarded unless no probe has completed yet. If all directories of the
+    tree are read within the budget, exact totals are returned.
+    """
+    tree: 'Tree'  # noqa
+    budget: int
+    confidence: float
+
+    def __init__(self,
+                 tree: 'Tree',  # noqa
+                 budget: int = DEFAULT_ESTIMATE_BUDGET,
+                 confidence: float = DEFAULT_ESTIMATE_CONFIDENCE,
+                 seed: Optional[int] = None) -> None:
+        if not 0 < confidence < 1:
+            raise FilesystemError(f'Invalid estimate confidence: {confidence}')
+        self.tree = tree
+        self.budget = max(1, budget)
+        self.confidence = confidence
+        self.__random__ = random.Random(seed)
+        self.__listings__: Dict[str, Tuple[Counter, List['Tree']]] = {}  # noqa
+        self.__unread__ = 1
+
+    def __read_directory__(self, directory: 'Tree', depth: int) -> Tuple[Counter, List['Tree']]:  # noqa
+        """
+        Return counts of items in a directory and subdirectories a walk would read
+        """
+        counts = Counter()
+        subdirectories = []
+        for item in directory.__scan_directory__():
+            if directory.__can_walk_into__(item, depth, None, None):
+                subdirectories.append(item)
+            item_stat = os.lstat(item)
+            if stat.S_ISDIR(item_stat.st_mode):
+                counts[ESTIMATE_DIRECTORIES] += 1
+            else:
+                counts[ESTIMATE_FILES] += 1
+                counts[ESTIMATE_BYTES] += item_stat.st_size
+                counts[f'{ESTIMATE_EXTENSION_PREFIX}{item.suffix}'] += 1
+        return counts, subdirectories
+
+    def __listing__(self, directory: 'Tree', depth: int) -> Optional[Tuple[Counter, List['Tree']]]:  # noqa
+        """
+        Return cached directory listing, or None if reading it would exceed the budget
+        """
+        key = str(directory)
+        if key not in self.__listings__:
+            if len(self.__listings__) >= self.budget:
+                return None
+            self.__listings__[key] = self.__read_directory__(directory, depth)
+            self.__unread__ += len(self.__listings__[key][1]) - 1
+        return self.__listings__[key]
+
+    def __probe__(self) -> Tuple[Counter, bool]:
+        """
+        Run a probe from tree root, returning weighted counts and True if probe completed
+        """
+        estimate = Counter()
+        directory = self.tree
+        weight = 1
+        depth = 1
+        while True:
+            listing = self.__listing__(directory, depth)
+            if listing is None:
+                return estimate, False
+            counts, subdirectories = listing
+            for key, value in counts.items():
+                estimate[key] += weight * value
+            if not subdirectories:
+                return estimate, True
+            weight *= len(subdirectories)
+            directory = self.__random__.choice(subdirectories)
+            depth += 1
+
+    def run(self) -> TreeEstimate:
+        """
+        Probe the tree, returning TreeEstimate
+
+        Raises FilesystemError if the tree is not a directory or can't be read.
+        """
+        if not self.tree.is_dir():
+            raise FilesystemError(f'Not a directory: {self.tree}')
+        samples = []
+        try:
+            for _probe in range(self.budget * ESTIMATE_PROBES_PER_DIRECTORY):
+                estimate, completed = self.__probe__()
+                if completed or not samples:
+                    samples.append(estimate)
+                if not completed or not self.__unread__:
+                    break
+        except OSError as error:
+            raise FilesystemError(f'Error estimating {self.tree}: {error}') from error
+        if not self.__unread__:
+            totals = sum((counts for counts, _subdirectories in self.__listings__.values()), Counter())
+            estimates = {key: Estimate(value, value, value, 0.0) for key, value in totals.items()}
+        else:
+            estimates = {
+                key: Estimate.from_samples([sample[key] for sample in samples], self.confidence)
+                for key in set().union(*samples)
+            }
+        for key in (ESTIMATE_FILES, ESTIMATE_BYTES, ESTIMATE_DIRECTORIES):
+            estimates.setdefault(key, Estimate(0.0, 0.0, 0.0, 0.0))
+        extensions = {
+            key[len(ESTIMATE_EXTENSION_PREFIX):]: value
+            for key, value in sorted(estimates.items())
+            if key.startswith(ESTIMATE_EXTENSION_PREFIX)
+        }
+        return TreeEstimate(estimates, extensions, len(samples), len(self.__listings__))
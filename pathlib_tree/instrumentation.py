@@ -0,0 +1,181 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Opt-in instrumentation of filesystem tree walks
+"""
+import bisect
+import heapq
+import itertools
+import threading
+import time
+
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+#: Upper bounds in seconds for directory listing latency histogram buckets
+LATENCY_BUCKETS = (0.0001, 0.001, 0.01, 0.1, 1.0, 10.0)
+#: Number of slowest directories kept in instrumentation summary
+DEFAULT_SLOWEST_DIRECTORIES = 10
+
+
+class WalkInstrumentation:
+    """
+    Counters, timings and callback hooks for tree walks
+
+    Attach to a tree with Tree.instrument(). Counters are kept per operation type, named by
+    the OPERATION_* constants in pathlib_tree.tree. Directory listing latencies are collected
+    to a histogram and the slowest directories are kept in a bounded heap. Callbacks are
+    called with the directory or item being processed:
+
+    - on_dir_enter(directory) when directory listing starts
+    - on_dir_exit(directory, elapsed) when all items in directory have been walked
+    - on_item(item) for each item loaded in the walk
+    """
+    on_dir_enter: Optional[Callable[[Path], Any]]
+    on_dir_exit: Optional[Callable[[Path, float], Any]]
+    on_item: Optional[Callable[[Path], Any]]
+    counters: Counter
+    histogram: List[int]
+    slowest: List[Tuple[float, int, str]]
+    directories: int
+    entries: int
+    bytes: int
+    started: float
+    finished: Optional[float]
+
+    def __init__(self,
+                 on_dir_enter: Optional[Callable[[Path], Any]] = None,
+                 on_dir_exit: Optional[Callable[[Path, float], Any]] = None,
+                 on_item: Optional[Callable[[Path], Any]] = None,
+                 slowest_directories: int = DEFAULT_SLOWEST_DIRECTORIES) -> None:
+        self.on_dir_enter = on_dir_enter
+        self.on_dir_exit = on_dir_exit
+        self.on_item = on_item
+        self.slowest_directories = slowest_directories
+        self.__lock__ = threading.Lock()
+        self.__counter__ = itertools.count()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Reset all counters and timings
+        """
+        self.counters = Counter()
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.slowest = []
+        self.directories = 0
+        self.entries = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+        self.finished = None
+        self.__entered__ = {}
+
+    def count(self, operation: str, value: int = 1) -> None:
+        """
+        Increment counter for an operation
+        """
+        with self.__lock__:
+            self.counters[operation] += value
+
+    def add_bytes(self, value: int) -> None:
+        """
+        Add number of bytes processed
+        """
+        with self.__lock__:
+            self.bytes += value
+
+    def directory_enter(self, directory: Path) -> None:
+        """
+        Record start of directory processing
+        """
+        with self.__lock__:
+            self.__entered__[str(directory)] = time.monotonic()
+        if self.on_dir_enter is not None:
+            self.on_dir_enter(directory)
+
+    def directory_listed(self, directory: Path, elapsed: float) -> None:
+        """
+        Record latency of listing a directory
+        """
+        with self.__lock__:
+            self.directories += 1
+            self.histogram[bisect.bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+            value = (elapsed, next(self.__counter__), str(directory))
+            if len(self.slowest) < self.slowest_directories:
+                heapq.heappush(self.slowest, value)
+            elif elapsed > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, value)
+
+    def directory_exit(self, directory: Path) -> None:
+        """
+        Record end of directory processing
+        """
+        with self.__lock__:
+            started = self.__entered__.pop(str(directory), None)
+            self.finished = time.monotonic()
+        if self.on_dir_exit is not None and started is not None:
+            self.on_dir_exit(directory, self.finished - started)
+
+    def item(self, item: Path) -> None:
+        """
+        Record an item loaded in the walk
+        """
+        with self.__lock__:
+            self.entries += 1
+        if self.on_item is not None:
+            self.on_item(item)
+
+    @property
+    def elapsed(self) -> float:
+        """
+        Return elapsed time from reset to last completed directory or current time
+        """
+        finished = self.finished if self.finished is not None else time.monotonic()
+        return finished - self.started
+
+    @property
+    def entries_per_second(self) -> float:
+        """
+        Return walked entries per second
+        """
+        elapsed = self.elapsed
+        return self.entries / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        """
+        Return processed bytes per second
+        """
+        elapsed = self.elapsed
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def slowest_listings(self) -> List[Tuple[str, float]]:
+        """
+        Return slowest directory listings as (path, seconds) in descending order
+        """
+        return [(path, elapsed) for elapsed, _count, path in sorted(self.slowest, reverse=True)]
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Return summary of the instrumentation data as JSON serializable dictionary
+        """
+        buckets = [str(bucket) for bucket in LATENCY_BUCKETS] + ['inf']
+        return {
+            'elapsed': self.elapsed,
+            'directories': self.directories,
+            'entries': self.entries,
+            'bytes': self.bytes,
+            'entries_per_second': self.entries_per_second,
+            'bytes_per_second': self.bytes_per_second,
+            'operations': dict(self.counters),
+            'directory_latency': dict(zip(buckets, self.histogram)),
+            'slowest_directories': [
+                {'path': path, 'elapsed': elapsed}
+                for path, elapsed in self.slowest_listings
+            ],
+        }
@@ -0,0 +1,184 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Memory bounded listing of directory entry names
+"""
+import heapq
+import os
+import sys
+import tempfile
+
+from typing import BinaryIO, Iterator, List
+
+#: Default memory limit in bytes for directory entry names kept in memory
+DEFAULT_LISTING_MEMORY_LIMIT = 2**26
+#: Estimated memory used by a name in addition to the string object
+LISTING_ENTRY_OVERHEAD = 8
+#: Separator for names in spilled sort chunk files
+LISTING_CHUNK_SEPARATOR = b'\0'
+#: Read size for spilled sort chunk files
+LISTING_CHUNK_READ_SIZE = 2**16
+
+
+def scan_directory_entries(path: str, sort: bool = False) -> Iterator[os.DirEntry]:
+    """
+    Iterate scandir entries of a directory, sorted by name if sort is set
+
+    Sorted entries are read to memory before iterating them, which closes the directory.
+    """
+    with os.scandir(path) as entries:
+        if not sort:
+            yield from entries
+            return
+        entries = sorted(entries, key=lambda entry: entry.name)
+    yield from entries
+
+
+def read_chunk_names(filedescriptor: BinaryIO) -> Iterator[str]:
+    """
+    Iterate names from a spilled sort chunk file
+    """
+    filedescriptor.seek(0)
+    remainder = b''
+    while True:
+        data = filedescriptor.read(LISTING_CHUNK_READ_SIZE)
+        if not data:
+            break
+        names = (remainder + data).split(LISTING_CHUNK_SEPARATOR)
+        remainder = names.pop()
+        for name in names:
+            yield os.fsdecode(name)
+
+
+class DirectoryListing:
+    """
+    List names of entries in a single directory within a memory limit
+
+    Names are read with os.scandir. If names fit in memory_limit bytes, they are returned as
+    a list, sorted if requested. Larger directories are marked as large and streamed: unsorted
+    listings pass names through directly from scandir, and sorted listings are sorted with an
+    external merge sort, spilling sorted chunks of names to temporary files.
+    """
+    path: str
+    sorted: bool
+    memory_limit: int
+    is_large: bool
+
+    # pylint: disable=redefined-builtin
+    def __init__(self,
+                 path: str,
+                 sorted: bool = True,
+                 memory_limit: int = DEFAULT_LISTING_MEMORY_LIMIT) -> None:
+        self.path = str(path)
+        self.sorted = sorted
+        self.memory_limit = memory_limit
+        self.is_large = False
+        self.__names__ = None
+        self.__entries__ = None
+        self.__chunks__ = []
+
+    def __enter__(self) -> 'DirectoryListing':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __read_names__(self) -> List[str]:
+        """
+        Read names from scandir until memory limit is reached
+
+        Returns list of names read. Sets is_large if there are more entries available.
+        """
+        names = []
+        used = 0
+        for entry in self.__entries__:
+            names.append(entry.name)
+            used += sys.getsizeof(entry.name) + LISTING_ENTRY_OVERHEAD
+            if used >= self.memory_limit:
+                self.is_large = True
+                break
+        return names
+
+    def __spill__(self, names: List[str]) -> None:
+        """
+        Write sorted names to a temporary chunk file
+        """
+        names.sort()
+        chunk = tempfile.TemporaryFile()  # pylint: disable=consider-using-with
+        self.__chunks__.append(chunk)
+        for name in names:
+            chunk.write(os.fsencode(name) + LISTING_CHUNK_SEPARATOR)
+        chunk.flush()
+
+    def __iter_sorted__(self) -> Iterator[str]:
+        """
+        Iterate names of a large directory in sorted order with external merge sort
+        """
+        names = self.__names__
+        self.__names__ = None
+        while names:
+            self.__spill__(names)
+            names = self.__read_names__()
+        yield from heapq.merge(*[read_chunk_names(chunk) for chunk in self.__chunks__])
+
+    def __iter_unsorted__(self) -> Iterator[str]:
+        """
+        Iterate names of a large directory without sorting or keeping them
+        """
+        names = self.__names__
+        self.__names__ = None
+        yield from names
+        del names
+        for entry in self.__entries__:
+            yield entry.name
+
+    def load(self) -> 'DirectoryListing':
+        """
+        Start listing the directory, reading names up to the memory limit
+
+        Raises OSError if directory can't be listed.
+        """
+        self.close()
+        self.is_large = False
+        self.__entries__ = os.scandir(self.path)
+        self.__names__ = self.__read_names__()
+        if not self.is_large:
+            self.__entries__.close()
+            self.__entries__ = None
+            if self.sorted:
+                self.__names__.sort()
+        return self
+
+    def close(self) -> None:
+        """
+        Close scandir iterator and remove temporary chunk files
+        """
+        if self.__entries__ is not None:
+            self.__entries__.close()
+            self.__entries__ = None
+        for chunk in self.__chunks__:
+            chunk.close()
+        self.__chunks__ = []
+
+    def __iter__(self) -> Iterator[str]:
+        """
+        Iterate entry names in the directory
+
+        Directory is listed on first iteration if load() has not been called.
+        """
+        if self.__names__ is None and self.__entries__ is None:
+            self.load()
+        try:
+            if not self.is_large:
+                names = self.__names__
+                self.__names__ = None
+                yield from names
+            elif self.sorted:
+                yield from self.__iter_sorted__()
+            else:
+                yield from self.__iter_unsorted__()
+        finally:
+            self.close()
@@ -0,0 +1,377 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Streaming file manifests for filesystem trees
+"""
+import csv
+import json
+import os
+import re
+import stat
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple, Union
+
+from .checkpoint import load_checkpoint, Checkpoint, CHECKPOINT_OPERATION_MANIFEST
+from .checksum import file_checksum, validate_checksum_algorithm, DEFAULT_FILE_CHECKSUM_BLOCK_SIZE
+from .exceptions import FilesystemError
+
+#: Supported manifest formats
+MANIFEST_FORMAT_NDJSON = 'ndjson'
+MANIFEST_FORMAT_CSV = 'csv'
+MANIFEST_FORMAT_CHECKSUM = 'sha256sum'
+MANIFEST_FORMATS = (
+    MANIFEST_FORMAT_NDJSON,
+    MANIFEST_FORMAT_CSV,
+    MANIFEST_FORMAT_CHECKSUM,
+)
+
+#: Manifest fields and functions to parse field values from text
+MANIFEST_FIELDS = {
+    'path': str,
+    'size': int,
+    'mtime': float,
+    'mtime_ns': int,
+    'mode': int,
+    'checksum': str,
+}
+#: Fields written to manifests by default
+DEFAULT_MANIFEST_FIELDS = ('path', 'size', 'mtime', 'checksum')
+#: Default checksum algorithm for manifests
+DEFAULT_MANIFEST_CHECKSUM = 'sha256'
+#: Default number of concurrent checksum workers
+DEFAULT_MANIFEST_WORKERS = 4
+#: Number of pending checksums per worker when writing manifests
+MANIFEST_QUEUE_DEPTH = 8
+
+#: BSD style tagged checksum line, as written by sha256sum --tag and shasum
+BSD_CHECKSUM_LINE = re.compile(r'^(?P<algorithm>[A-Za-z0-9-]+) \((?P<path>.*)\) = (?P<checksum>[0-9a-fA-F]+)$')
+
+
+def escape_checksum_path(path: str) -> Tuple[str, str]:
+    """
+    Escape path for a checksum file line like GNU coreutils
+
+    Returns prefix for the line and escaped path. Prefix is a backslash if the path
+    contained characters that needed escaping.
+    """
+    if '\\' not in path and '\n' not in path and '\r' not in path:
+        return '', path
+    path = path.replace('\\', '\\\\').replace('\n', '\\n').replace('\r', '\\r')
+    return '\\', path
+
+
+def unescape_checksum_path(path: str) -> str:
+    """
+    Unescape path escaped with escape_checksum_path()
+    """
+    value = []
+    characters = iter(path)
+    for character in characters:
+        if character == '\\':
+            character = next(characters, '')
+            character = {'n': '\n', 'r': '\r'}.get(character, character)
+        value.append(character)
+    return ''.join(value)
+
+
+def parse_checksum_line(line: str) -> Optional[Dict[str, str]]:
+    """
+    Parse a sha256sum style checksum file line to a record with path and checksum
+
+    Both text and binary mode ('*' prefixed path) lines are accepted. BSD style tagged
+    lines also contain the algorithm in the record. Returns None for empty lines.
+    """
+    line = line.rstrip('\n')
+    if not line.strip():
+        return None
+    escaped = line.startswith('\\')
+    if escaped:
+        line = line[1:]
+    match = BSD_CHECKSUM_LINE.match(line)
+    if match:
+        path = match.group('path')
+        return {
+            'path': unescape_checksum_path(path) if escaped else path,
+            'checksum': match.group('checksum').lower(),
+            'algorithm': match.group('algorithm').lower().replace('-', '_'),
+        }
+    try:
+        checksum, path = line.split(' ', 1)
+    except ValueError as error:
+        raise FilesystemError(f'Invalid checksum line: {line}') from error
+    if not path or path[0] not in (' ', '*'):
+        raise FilesystemError(f'Invalid checksum line: {line}')
+    path = path[1:]
+    if escaped:
+        path = unescape_checksum_path(path)
+    return {'path': path, 'checksum': checksum.lower()}
+
+
+def parse_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert manifest record field values to expected types
+    """
+    return {
+        field: MANIFEST_FIELDS[field](value) if field in MANIFEST_FIELDS and value is not None else value
+        for field, value in record.items()
+    }
+
+
+def read_manifest(filedescriptor: TextIO, format: str = MANIFEST_FORMAT_NDJSON) -> Iterator[Dict[str, Any]]:  # noqa
+    """
+    Iterate records from a manifest file as dictionaries
+
+    Records are read one line at a time, so memory use does not depend on the manifest
+    size. Paths in records are relative to the tree the manifest was written for.
+    """
+    # pylint: disable=redefined-builtin
+    if format not in MANIFEST_FORMATS:
+        raise FilesystemError(f'Unexpected manifest format: {format}')
+    if format == MANIFEST_FORMAT_CSV:
+        for record in csv.DictReader(filedescriptor):
+            yield parse_record(record)
+        return
+    for line in filedescriptor:
+        if format == MANIFEST_FORMAT_CHECKSUM:
+            record = parse_checksum_line(line)
+        elif line.strip():
+            try:
+                record = parse_record(json.loads(line))
+            except ValueError as error:
+                raise FilesystemError(f'Invalid manifest line: {line}') from error
+        else:
+            record = None
+        if record is not None:
+            yield record
+
+
+class TreeManifest:
+    """
+    Write manifests of files in a tree as a stream
+
+    Records are written for regular files in tree walk order. Checksums are calculated on a
+    thread pool with a bounded queue of pending files, so memory use stays constant and
+    records are written in the same order as files are walked.
+
+    If checkpoint is set, the last written path and output file offset are saved to the
+    checkpoint periodically while writing. A manifest write interrupted by a crash is
+    resumed by writing again with the same checkpoint to the same output file, opened
+    for update: the output is truncated to the checkpointed offset and the tree walk
+    continues after the last written path.
+    """
+    tree: 'Tree'  # noqa
+    fields: List[str]
+    algorithm: str
+    workers: int
+    block_size: int
+    checkpoint: Optional[Checkpoint]
+
+    def __init__(self,
+                 tree: 'Tree',  # noqa
+                 fields: Optional[List[str]] = None,
+                 algorithm: str = DEFAULT_MANIFEST_CHECKSUM,
+                 workers: int = DEFAULT_MANIFEST_WORKERS,
+                 block_size: int = DEFAULT_FILE_CHECKSUM_BLOCK_SIZE,
+                 checkpoint: Optional[Union[str, Path, Checkpoint]] = None) -> None:
+        fields = list(fields) if fields is not None else list(DEFAULT_MANIFEST_FIELDS)
+        for field in fields:
+            if field not in MANIFEST_FIELDS:
+                raise FilesystemError(f'Unexpected manifest field: {field}')
+        validate_checksum_algorithm(algorithm)
+        self.tree = tree
+        self.fields = fields
+        self.algorithm = algorithm
+        self.workers = max(1, workers)
+        self.block_size = block_size
+        self.checkpoint = load_checkpoint(checkpoint)
+
+    def __iter_files__(self, start_after: Optional[str] = None) -> Iterator[Tuple[str, os.stat_result]]:
+        """
+        Iterate paths relative to tree and stat results for regular files in the tree
+
+        If start_after is set, the tree is walked starting after that relative path.
+        """
+        prefix_length = len(str(self.tree).rstrip(os.sep)) + 1
+        for item in self.tree.walk(start_after=start_after):
+            item_stat = os.lstat(item)
+            if stat.S_ISREG(item_stat.st_mode):
+                yield str(item)[prefix_length:], item_stat
+
+    @staticmethod
+    def __record__(fields: List[str],
+                   path: str,
+                   item_stat: os.stat_result,
+                   checksum: Optional[Future]) -> Dict[str, Any]:
+        """
+        Return manifest record with requested fields for a file
+        """
+        values = {
+            'path': path,
+            'size': item_stat.st_size,
+            'mtime': item_stat.st_mtime,
+            'mtime_ns': item_stat.st_mtime_ns,
+            'mode': item_stat.st_mode,
+            'checksum': checksum.result() if checksum is not None else None,
+        }
+        return {field: values[field] for field in fields}
+
+    def __iter_path_records__(self,
+                              fields: List[str],
+                              start_after: Optional[str] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Iterate relative paths and manifest records, calculating checksums in parallel if requested
+        """
+        if 'checksum' not in fields:
+            for path, item_stat in self.__iter_files__(start_after):
+                yield path, self.__record__(fields, path, item_stat, None)
+            return
+
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            try:
+                for path, item_stat in self.__iter_files__(start_after):
+                    future = executor.submit(
+                        file_checksum,
+                        os.path.join(self.tree, path),
+                        self.algorithm,
+                        self.block_size,
+                        self.tree.governor,
+                    )
+                    pending.append((path, item_stat, future))
+                    if len(pending) >= self.workers * MANIFEST_QUEUE_DEPTH:
+                        path, item_stat, future = pending.popleft()
+                        yield path, self.__record__(fields, path, item_stat, future)
+                while pending:
+                    path, item_stat, future = pending.popleft()
+                    yield path, self.__record__(fields, path, item_stat, future)
+            finally:
+                for _path, _item_stat, future in pending:
+                    future.cancel()
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate manifest records as dictionaries
+        """
+        return (record for _path, record in self.__iter_path_records__(self.fields))
+
+    def __iter_checkpoint_records__(self,
+                                    filedescriptor: TextIO,
+                                    fields: List[str],
+                                    start_after: Optional[str],
+                                    count: int) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate manifest records, saving a checkpoint after written records when it is due
+
+        Code after yield runs when the writer requests the next record, after the previous
+        record has been written.
+        """
+        for path, record in self.__iter_path_records__(fields, start_after):
+            yield record
+            count += 1
+            if self.checkpoint.due():
+                filedescriptor.flush()
+                self.checkpoint.save(path, {'offset': filedescriptor.tell(), 'records': count})
+
+    def __resume__(self, filedescriptor: TextIO) -> Tuple[Optional[str], int]:
+        """
+        Load checkpoint and truncate output to the checkpointed offset
+
+        Returns last written path and number of records written before the checkpoint.
+        """
+        start_after = self.checkpoint.resume(CHECKPOINT_OPERATION_MANIFEST, self.tree)
+        if start_after is None:
+            return None, 0
+        try:
+            offset = self.checkpoint.state['offset']
+            count = self.checkpoint.state['records']
+        except KeyError as error:
+            raise FilesystemError(f'Invalid manifest checkpoint {self.checkpoint}: missing {error}') from error
+        filedescriptor.seek(offset)
+        filedescriptor.truncate()
+        return start_after, count
+
+    @staticmethod
+    # pylint: disable=unused-argument
+    def __write_ndjson__(filedescriptor: TextIO,
+                         fields: List[str],
+                         records: Iterator[Dict[str, Any]],
+                         header: bool = True) -> int:
+        """
+        Write records as newline delimited JSON
+        """
+        count = 0
+        for record in records:
+            filedescriptor.write(json.dumps(record, separators=(',', ':')) + '\n')
+            count += 1
+        return count
+
+    @staticmethod
+    def __write_csv__(filedescriptor: TextIO,
+                      fields: List[str],
+                      records: Iterator[Dict[str, Any]],
+                      header: bool = True) -> int:
+        """
+        Write records as CSV, starting with a header line if header is set
+        """
+        writer = csv.writer(filedescriptor, lineterminator='\n')
+        if header:
+            writer.writerow(fields)
+        count = 0
+        for record in records:
+            writer.writerow(record.values())
+            count += 1
+        return count
+
+    @staticmethod
+    # pylint: disable=unused-argument
+    def __write_checksums__(filedescriptor: TextIO,
+                            fields: List[str],
+                            records: Iterator[Dict[str, Any]],
+                            header: bool = True) -> int:
+        """
+        Write records as sha256sum compatible checksum lines
+        """
+        count = 0
+        for record in records:
+            prefix, path = escape_checksum_path(record['path'])
+            filedescriptor.write(f'{prefix}{record["checksum"]}  {path}\n')
+            count += 1
+        return count
+
+    def write(self, filedescriptor: TextIO, format: str = MANIFEST_FORMAT_NDJSON) -> int:  # noqa
+        """
+        Write manifest to a text file object, returning number of records written
+
+        The sha256sum format always contains path and checksum fields, calculated with the
+        configured algorithm, and is compatible with sha256sum -c and similar tools. With a
+        checkpoint, the number includes records written before the checkpoint, and the
+        checkpoint is removed after the manifest is complete.
+        """
+        # pylint: disable=redefined-builtin
+        writers = {
+            MANIFEST_FORMAT_NDJSON: self.__write_ndjson__,
+            MANIFEST_FORMAT_CSV: self.__write_csv__,
+            MANIFEST_FORMAT_CHECKSUM: self.__write_checksums__,
+        }
+        try:
+            writer = writers[format]
+        except KeyError as error:
+            raise FilesystemError(f'Unexpected manifest format: {format}') from error
+        fields = ['path', 'checksum'] if format == MANIFEST_FORMAT_CHECKSUM else self.fields
+        try:
+            if self.checkpoint is None:
+                records = (record for _path, record in self.__iter_path_records__(fields))
+                return writer(filedescriptor, fields, records)
+            start_after, count = self.__resume__(filedescriptor)
+            records = self.__iter_checkpoint_records__(filedescriptor, fields, start_after, count)
+            count += writer(filedescriptor, fields, records, header=start_after is None)
+            self.checkpoint.remove()
+            return count
+        except OSError as error:
+            raise FilesystemError(f'Error writing manifest for {self.tree}: {error}') from error
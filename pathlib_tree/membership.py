@@ -0,0 +1,254 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Probabilistic membership filters of relative paths in trees
+"""
+import hashlib
+import math
+import os
+import stat
+import struct
+
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Iterable, List, Optional, Union
+
+from .exceptions import FilesystemError
+from .pathstore import KEY_SEPARATOR, path_key
+
+#: Default false positive rate of membership filters
+DEFAULT_FILTER_ERROR_RATE = 0.01
+
+#: Magic bytes and version of the membership filter format
+MEMBERSHIP_FILTER_MAGIC = b'PTMF'
+MEMBERSHIP_FILTER_VERSION = 1
+#: Membership filter header: magic, version, hash count, algorithm name length, bit count and item count
+MEMBERSHIP_FILTER_HEADER = struct.Struct('<4sHBBQQ')
+#: Maximum number of hashes per key, stored in one byte of the header
+MEMBERSHIP_FILTER_MAX_HASHES = 255
+
+
+# pylint: disable=too-few-public-methods
+class MembershipDiff:
+    """
+    Items of a tree compared to a membership filter of another tree
+
+    Items in missing are not in the filtered tree. Items in present matched the filter and
+    were confirmed, if a confirmation callback was used. Candidates is the number of items
+    matching the filter, which needed confirmation.
+    """
+    missing: List['TreeItem']  # noqa
+    present: List['TreeItem']  # noqa
+    candidates: int
+
+    def __init__(self) -> None:
+        self.missing = []
+        self.present = []
+        self.candidates = 0
+
+    def __repr__(self) -> str:
+        return f'{len(self.missing)} missing {len(self.present)} present'
+
+
+class MembershipFilter:
+    """
+    Bloom filter of relative paths in a tree, optionally with file checksums
+
+    A filter answers if a path might be in the filtered tree with no false negatives and
+    a false positive rate of about error_rate, using about 10 bits per path at 1%. With
+    algorithm set, file checksums are added to the keys of files, so a file matches only
+    if its contents are also equal. Directories and other items that are not regular files,
+    like symbolic links, are keyed by path only.
+
+    Filters are serialized with to_bytes() and compared to other trees with diff(), which
+    confirms only items matching the filter, as other items are certainly missing.
+    """
+    bits: int
+    hashes: int
+    count: int
+    algorithm: Optional[str]
+
+    def __init__(self,
+                 bits: int,
+                 hashes: int,
+                 algorithm: Optional[str] = None,
+                 data: Optional[bytes] = None,
+                 count: int = 0) -> None:
+        if bits < 1 or not 1 <= hashes <= MEMBERSHIP_FILTER_MAX_HASHES:
+            raise FilesystemError(f'Invalid membership filter size: {bits} bits {hashes} hashes')
+        self.bits = bits
+        self.hashes = hashes
+        self.algorithm = algorithm
+        self.count = count
+        self.__data__ = bytearray(data) if data is not None else bytearray((bits + 7) // 8)
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__} {self.count} items {len(self.__data__)} bytes'
+
+    def __contains__(self, path: str) -> bool:
+        return self.might_contain(path)
+
+    @classmethod
+    def for_capacity(cls,
+                     capacity: int,
+                     error_rate: float = DEFAULT_FILTER_ERROR_RATE,
+                     algorithm: Optional[str] = None) -> 'MembershipFilter':
+        """
+        Return empty filter sized for capacity items with false positive rate error_rate
+
+        The number of hashes is limited to MEMBERSHIP_FILTER_MAX_HASHES for very small rates.
+        """
+        if not 0 < error_rate < 1:
+            raise FilesystemError(f'Invalid membership filter error rate: {error_rate}')
+        capacity = max(1, capacity)
+        bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        hashes = min(MEMBERSHIP_FILTER_MAX_HASHES, max(1, round(bits / capacity * math.log(2))))
+        return cls(bits, hashes, algorithm=algorithm)
+
+    @classmethod
+    def from_tree(cls,
+                  tree: 'Tree',  # noqa
+                  error_rate: float = DEFAULT_FILTER_ERROR_RATE,
+                  algorithm: Optional[str] = None,
+                  capacity: Optional[int] = None) -> 'MembershipFilter':
+        """
+        Return filter of relative paths of items in a tree walk
+
+        Items are walked without caching them. If capacity is not given, items are counted
+        with a separate walk before adding them to the filter.
+
+        Raises FilesystemError if checksums of files can't be calculated.
+        """
+        if capacity is None:
+            capacity = sum(1 for _item in tree.walk())
+        membership = cls.for_capacity(capacity, error_rate=error_rate, algorithm=algorithm)
+        for item in tree.walk():
+            membership.add(str(item.relative_to(tree)), membership.__item_checksum__(item))
+        return membership
+
+    def __item_checksum__(self, item: 'TreeItem') -> Optional[str]:  # noqa
+        """
+        Return checksum of a tree item for filter keys, or None for items that are not files
+
+        Raises FilesystemError if the item can't be checked.
+        """
+        if self.algorithm is None:
+            return None
+        try:
+            if not stat.S_ISREG(os.lstat(item).st_mode):
+                return None
+        except OSError as error:
+            raise FilesystemError(f'Error checking {item}: {error}') from error
+        return item.checksum(self.algorithm)
+
+    def __positions__(self, path: str, checksum: Optional[str]) -> Iterable[int]:
+        """
+        Return bit positions of a key with double hashing
+        """
+        key = path_key(path)
+        if checksum is not None:
+            key += KEY_SEPARATOR + checksum.encode()
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + index * second) % self.bits for index in range(self.hashes))
+
+    def add(self, path: str, checksum: Optional[str] = None) -> None:
+        """
+        Add relative path, with file checksum if the filter has a checksum algorithm
+        """
+        for position in self.__positions__(path, checksum):
+            self.__data__[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def might_contain(self, path: str, checksum: Optional[str] = None) -> bool:
+        """
+        Return False if path is certainly not in the filter and True if it might be
+        """
+        return all(
+            self.__data__[position >> 3] & (1 << (position & 7))
+            for position in self.__positions__(path, checksum)
+        )
+
+    def diff(self,
+             tree: 'Tree',  # noqa
+             confirm: Optional[Callable[[List[str]], Iterable[str]]] = None) -> MembershipDiff:
+        """
+        Compare items in tree to the filter, returning MembershipDiff
+
+        Items not matching the filter are missing from the filtered tree without further
+        checks. If confirm is set, it's called once with relative paths of the items matching
+        the filter and returns the paths that really exist, for example by asking the other
+        site. Items not confirmed are false positives and are missing.
+        """
+        result = MembershipDiff()
+        candidates = []
+        for item in tree.walk():
+            path = str(item.relative_to(tree))
+            if self.might_contain(path, self.__item_checksum__(item)):
+                candidates.append((path, item))
+            else:
+                result.missing.append(item)
+        result.candidates = len(candidates)
+        confirmed = None
+        if confirm is not None and candidates:
+            confirmed = set(confirm([path for path, _item in candidates]))
+        for path, item in candidates:
+            if confirmed is None or path in confirmed:
+                result.present.append(item)
+            else:
+                result.missing.append(item)
+        return result
+
+    def to_bytes(self) -> bytes:
+        """
+        Return filter serialized as bytes
+        """
+        algorithm = (self.algorithm or '').encode()
+        header = MEMBERSHIP_FILTER_HEADER.pack(
+            MEMBERSHIP_FILTER_MAGIC, MEMBERSHIP_FILTER_VERSION, self.hashes, len(algorithm), self.bits, self.count
+        )
+        return b''.join((header, algorithm, bytes(self.__data__)))
+
+    def write(self, fileobj: BinaryIO) -> None:
+        """
+        Write serialized filter to a binary file object
+        """
+        fileobj.write(self.to_bytes())
+
+    @classmethod
+    def from_bytes(cls, data: Any) -> 'MembershipFilter':
+        """
+        Load filter from serialized bytes
+
+        Raises FilesystemError if data does not contain a valid membership filter.
+        """
+        try:
+            magic, version, hashes, length, bits, count = MEMBERSHIP_FILTER_HEADER.unpack_from(data)
+        except struct.error as error:
+            raise FilesystemError(f'Invalid membership filter: {error}') from error
+        if magic != MEMBERSHIP_FILTER_MAGIC or version != MEMBERSHIP_FILTER_VERSION:
+            raise FilesystemError(f'Invalid membership filter header: {magic} version {version}')
+        start = MEMBERSHIP_FILTER_HEADER.size + length
+        if len(data) != start + (bits + 7) // 8:
+            raise FilesystemError('Invalid membership filter: unexpected data size')
+        try:
+            algorithm = bytes(data[MEMBERSHIP_FILTER_HEADER.size:start]).decode() or None
+        except UnicodeDecodeError as error:
+            raise FilesystemError(f'Invalid membership filter algorithm: {error}') from error
+        return cls(bits, hashes, algorithm=algorithm, data=bytes(data[start:]), count=count)
+
+    @classmethod
+    def open(cls, path: Union[str, Path]) -> 'MembershipFilter':
+        """
+        Load filter from a file
+
+        Raises FilesystemError if the file can't be read or is not a valid membership filter.
+        """
+        try:
+            data = Path(path).read_bytes()
+        except OSError as error:
+            raise FilesystemError(f'Error reading membership filter {path}: {error}') from error
+        return cls.from_bytes(data)
@@ -0,0 +1,327 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Front coded compact storage of sorted relative paths
+"""
+import array
+import mmap
+import os
+import struct
+import sys
+
+from pathlib import Path
+from typing import Any, BinaryIO, Iterable, Iterator, List, Tuple, Union
+
+from .exceptions import FilesystemError
+
+#: Default number of paths in a front coded block
+DEFAULT_PATH_STORE_BLOCK_SIZE = 16
+
+#: Magic bytes and version of the path store format
+PATH_STORE_MAGIC = b'PTPS'
+PATH_STORE_VERSION = 1
+#: Path store header: magic, version, block size, path count and data size, padded to 32 bytes
+PATH_STORE_HEADER = struct.Struct('<4sHxxIQQ')
+PATH_STORE_HEADER_SIZE = 32
+
+#: Path separator byte, replaced with NUL in stored keys so keys sort in tree walk order
+PATH_SEPARATOR = os.sep.encode()
+KEY_SEPARATOR = b'\x00'
+
+
+def path_key(path: str) -> bytes:
+    """
+    Return sort key bytes for a relative path
+
+    Path components are separated with NUL bytes, so keys sort like sorted depth first
+    walks, with each directory followed by its contents.
+    """
+    return path.encode('utf-8', 'surrogateescape').replace(PATH_SEPARATOR, KEY_SEPARATOR)
+
+
+def key_path(key: bytes) -> str:
+    """
+    Return relative path for a sort key
+    """
+    return bytes(key).replace(KEY_SEPARATOR, PATH_SEPARATOR).decode('utf-8', 'surrogateescape')
+
+
+def __encode_varint__(value: int) -> bytes:
+    """
+    Encode an unsigned integer as LEB128 bytes
+    """
+    encoded = bytearray()
+    while value >= 0x80:
+        encoded.append((value & 0x7f) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def __decode_varint__(data: Any, offset: int) -> Tuple[int, int]:
+    """
+    Decode LEB128 integer at offset, returning the value and offset after it
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def __shared_prefix__(first: bytes, second: bytes) -> int:
+    """
+    Return length of the shared prefix of two keys
+    """
+    length = min(len(first), len(second))
+    index = 0
+    while index < length and first[index] == second[index]:
+        index += 1
+    return index
+
+
+class PathStore:
+    """
+    Sorted relative paths stored with front coding in blocks with a restart index
+
+    Each path is stored as the length of the prefix shared with the previous path and the
+    remaining suffix. The first path of each block of block_size paths is stored in full,
+    and the restart index holds the offset of each block, so a path is decoded by reading
+    at most one block. Lookups binary search the first paths of the blocks.
+
+    Paths are sorted in sorted tree walk order. Stores are serialized with to_bytes() and
+    can be used directly from a memory mapped file with open().
+    """
+    block_size: int
+    count: int
+
+    def __init__(self, data: Any, offsets: Any, count: int, block_size: int = DEFAULT_PATH_STORE_BLOCK_SIZE) -> None:
+        self.__data__ = data
+        self.__offsets__ = offsets
+        self.__mmap__ = None
+        self.count = count
+        self.block_size = block_size
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__} {self.count} paths {self.nbytes} bytes'
+
+    def __len__(self) -> int:
+        return self.count
+
+    @classmethod
+    def from_paths(cls,
+                   paths: Iterable[str],
+                   block_size: int = DEFAULT_PATH_STORE_BLOCK_SIZE,
+                   sort: bool = True) -> 'PathStore':
+        """
+        Build store from relative paths
+
+        Paths are sorted unless sort is False, in which case they must already be in sorted
+        tree walk order. Raises FilesystemError if block size is invalid or paths are not
+        sorted.
+        """
+        if block_size < 1:
+            raise FilesystemError(f'Invalid path store block size: {block_size}')
+        keys = (path_key(path) for path in paths)
+        if sort:
+            keys = sorted(keys)
+        data = bytearray()
+        offsets = array.array('Q')
+        previous = b''
+        count = 0
+        for key in keys:
+            if count and key < previous:
+                raise FilesystemError(f'Paths are not sorted: {key_path(key)} after {key_path(previous)}')
+            if count % block_size == 0:
+                offsets.append(len(data))
+                shared = 0
+            else:
+                shared = __shared_prefix__(previous, key)
+            data += __encode_varint__(shared)
+            data += __encode_varint__(len(key) - shared)
+            data += key[shared:]
+            previous = key
+            count += 1
+        return cls(bytes(data), offsets, count, block_size)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Return size of the encoded paths and restart index in bytes
+        """
+        return len(self.__data__) + len(self.__offsets__) * 8
+
+    def __decode_block__(self, block: int) -> List[bytes]:
+        """
+        Decode keys of a block
+        """
+        data = self.__data__
+        offset = self.__offsets__[block]
+        keys = []
+        previous = b''
+        for _index in range(min(self.block_size, self.count - block * self.block_size)):
+            shared, offset = __decode_varint__(data, offset)
+            length, offset = __decode_varint__(data, offset)
+            previous = previous[:shared] + bytes(data[offset:offset + length])
+            offset += length
+            keys.append(previous)
+        return keys
+
+    def __first_key__(self, block: int) -> bytes:
+        """
+        Decode the first key of a block, which is stored in full
+        """
+        data = self.__data__
+        _shared, offset = __decode_varint__(data, self.__offsets__[block])
+        length, offset = __decode_varint__(data, offset)
+        return bytes(data[offset:offset + length])
+
+    def __lower_bound__(self, key: bytes) -> Tuple[int, int, List[bytes]]:
+        """
+        Return block and position of the first key not less than key, and keys of the block
+
+        Position is the length of the block if all keys in the block are less than key.
+        """
+        low = 0
+        high = len(self.__offsets__)
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self.__first_key__(middle) <= key:
+                low = middle
+            else:
+                high = middle
+        if not self.count:
+            return 0, 0, []
+        keys = self.__decode_block__(low)
+        position = 0
+        while position < len(keys) and keys[position] < key:
+            position += 1
+        return low, position, keys
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(f'{self.__class__.__name__} index out of range')
+        block, position = divmod(index, self.block_size)
+        return key_path(self.__decode_block__(block)[position])
+
+    def __iter__(self) -> Iterator[str]:
+        for block in range(len(self.__offsets__)):
+            for key in self.__decode_block__(block):
+                yield key_path(key)
+
+    def __contains__(self, path: str) -> bool:
+        try:
+            self.index(path)
+            return True
+        except ValueError:
+            return False
+
+    def index(self, path: str) -> int:
+        """
+        Return index of path in the store
+
+        Raises ValueError if path is not in the store.
+        """
+        key = path_key(path)
+        block, position, keys = self.__lower_bound__(key)
+        if position < len(keys) and keys[position] == key:
+            return block * self.block_size + position
+        raise ValueError(f'{path} is not in {self.__class__.__name__}')
+
+    def iter_prefix(self, path: str) -> Iterator[str]:
+        """
+        Iterate path and all paths below it in sorted tree walk order
+        """
+        key = path_key(path)
+        block, position, keys = self.__lower_bound__(key)
+        while keys:
+            for candidate in keys[position:]:
+                if candidate != key and not candidate.startswith(key + KEY_SEPARATOR):
+                    return
+                yield key_path(candidate)
+            block += 1
+            position = 0
+            keys = self.__decode_block__(block) if block < len(self.__offsets__) else []
+
+    def to_bytes(self) -> bytes:
+        """
+        Return store serialized as bytes
+        """
+        offsets = array.array('Q', self.__offsets__)
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+        header = PATH_STORE_HEADER.pack(
+            PATH_STORE_MAGIC, PATH_STORE_VERSION, self.block_size, self.count, len(self.__data__)
+        )
+        return b''.join((
+            header.ljust(PATH_STORE_HEADER_SIZE, b'\x00'),
+            offsets.tobytes(),
+            bytes(self.__data__),
+        ))
+
+    def write(self, fileobj: BinaryIO) -> None:
+        """
+        Write serialized store to a binary file object
+        """
+        fileobj.write(self.to_bytes())
+
+    @classmethod
+    def from_buffer(cls, buffer: Any) -> 'PathStore':
+        """
+        Load store from serialized bytes or another buffer without copying path data
+
+        Raises FilesystemError if buffer does not contain a valid path store.
+        """
+        view = memoryview(buffer)
+        try:
+            magic, version, block_size, count, size = PATH_STORE_HEADER.unpack_from(view)
+        except struct.error as error:
+            raise FilesystemError(f'Invalid path store: {error}') from error
+        if magic != PATH_STORE_MAGIC or version != PATH_STORE_VERSION or block_size < 1:
+            raise FilesystemError(f'Invalid path store header: {magic} version {version}')
+        blocks = (count + block_size - 1) // block_size
+        start = PATH_STORE_HEADER_SIZE + blocks * 8
+        if len(view) < start + size:
+            raise FilesystemError('Invalid path store: truncated data')
+        if sys.byteorder == 'little':
+            offsets = view[PATH_STORE_HEADER_SIZE:start].cast('Q')
+        else:
+            offsets = array.array('Q', view[PATH_STORE_HEADER_SIZE:start].tobytes())
+            offsets.byteswap()
+        return cls(view[start:start + size], offsets, count, block_size)
+
+    @classmethod
+    def open(cls, path: Union[str, Path]) -> 'PathStore':
+        """
+        Open a path store file as a read only memory map
+
+        Raises FilesystemError if the file can't be read or is not a valid path store.
+        """
+        try:
+            with open(path, 'rb') as fileobj:
+                data = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as error:
+            raise FilesystemError(f'Error opening path store {path}: {error}') from error
+        store = cls.from_buffer(data)
+        store.__mmap__ = data
+        return store
+
+    def close(self) -> None:
+        """
+        Release memory mapped file of a store opened with open()
+        """
+        if self.__mmap__ is not None:
+            self.__data__.release()
+            if isinstance(self.__offsets__, memoryview):
+                self.__offsets__.release()
+            self.__mmap__.close()
+            self.__mmap__ = None
@@ -0,0 +1,64 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Chainable search results for filesystem trees
+"""
+from typing import BinaryIO, List, Optional, Union
+
+from .patterns import match_path_patterns
+
+
+class TreeSearch(list):
+    """
+    Chainable tree search results
+    """
+    tree: 'Tree'  # noqa
+
+    def __init__(self, tree: 'Tree', items: List['TreeItem']) -> None:  # noqa
+        self.tree = tree
+        super().__init__(items)
+
+    def filter(self,
+               patterns: Union[str, List[str]] = None,
+               extensions: Optional[List[str]] = None) -> 'TreeSearch':  # noqa
+        """
+        Match specified patterns from matched items
+        """
+        if isinstance(extensions, str):
+            extensions = extensions.split(',')
+        if isinstance(patterns, str):
+            patterns = [patterns]
+
+        matches = []
+        for item in self:
+            if extensions and item.suffix in extensions:
+                matches.append(item)
+            if patterns and match_path_patterns(patterns, self.tree, item):
+                matches.append(item)
+        return self.__class__(self.tree, matches)
+
+    def exclude(self, patterns: Union[str, List[str]] = None) -> 'TreeSearch':
+        """
+        Exclude specified patterns from matched items
+        """
+        if isinstance(patterns, str):
+            patterns = [patterns]
+
+        matches = []
+        for item in self:
+            if not match_path_patterns(patterns, self.tree, item):
+                matches.append(item)
+        return self.__class__(self.tree, matches)
+
+    def write_archive(self, fileobj: BinaryIO, compression: Optional[str] = 'gzip', **kwargs) -> int:
+        """
+        Write matched items to a binary file object as a tar stream
+
+        Arguments are the same as in Tree.write_archive().
+        """
+        # pylint: disable=import-outside-toplevel
+        from .archive import TreeArchive
+        return TreeArchive(self.tree, items=self, compression=compression, **kwargs).write(fileobj)
@@ -0,0 +1,204 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Process pool sharded scanning of filesystem trees
+"""
+import os
+import stat
+
+from concurrent.futures import wait, Future, ProcessPoolExecutor, FIRST_COMPLETED
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Set, Tuple, Type
+
+from .arrays import append_columns, create_tree_arrays, load_numpy, new_columns, TreeArrays
+from .exceptions import FilesystemError
+
+#: Default number of entries a worker scans before splitting remaining subdirectories to new shards
+DEFAULT_SHARD_SPLIT_ENTRIES = 10000
+
+#: Fields in scan records returned by sharded scans
+SHARD_RECORD_FIELDS = ('path', 'mode', 'size', 'mtime_ns', 'uid', 'gid')
+
+#: Scan record with path relative to the tree and lstat fields in SHARD_RECORD_FIELDS order
+ScanRecord = Tuple[str, int, int, int, int, int]
+#: Shard task: loader class, tree root, tree options, root device, relative path, ancestor inodes, split limit
+ShardTask = Tuple[Type, str, Dict[str, Any], int, str, Optional[FrozenSet[Tuple[int, int]]], int]
+#: Shard result: scan records and split shard tasks by index of the directory record
+ShardResult = Tuple[List[ScanRecord], List[Tuple[int, ShardTask]]]
+
+
+def __scan_record__(item: 'Tree', prefix_length: int) -> ScanRecord:  # noqa
+    """
+    Return scan record for an item with path prefix_length characters from start removed
+    """
+    item_stat = os.lstat(item)
+    return (
+        str(item)[prefix_length:],
+        item_stat.st_mode,
+        item_stat.st_size,
+        item_stat.st_mtime_ns,
+        item_stat.st_uid,
+        item_stat.st_gid,
+    )
+
+
+def __load_shard_tree__(task: ShardTask) -> 'Tree':  # noqa
+    """
+    Load tree for the root directory of a shard task
+    """
+    loader, root, options, device, relative_path, ancestors, _split_entries = task
+    tree = loader(os.path.join(root, relative_path), **options)
+    tree.__device__ = device
+    tree.__ancestors__ = ancestors
+    return tree
+
+
+def scan_shard(task: ShardTask) -> ShardResult:
+    """
+    Scan a subtree in a worker process, returning compact scan records
+
+    Subtree is walked depth first with the tree loader class, so exclusions, sorting and
+    subclass loaders behave as in Tree.walk(). After split_entries records, subdirectories
+    are not walked but returned as new shard tasks, placed after their directory record.
+    """
+    tree = __load_shard_tree__(task)
+    root = task[1]
+    split_entries = task[-1]
+    prefix_length = len(root.rstrip(os.sep)) + 1
+
+    records = []
+    splits = []
+    stack = [(tree, tree.__scan_directory__())]
+    while stack:
+        parent, items = stack[-1]
+        item = next(items, None)
+        if item is None:
+            stack.pop()
+            continue
+        record = __scan_record__(item, prefix_length)
+        records.append(record)
+        if not parent.__can_walk_into__(item, len(stack), None, None):
+            continue
+        if len(records) >= split_entries:
+            split = (type(item), root, task[2], task[3], record[0], item.__ancestors__, split_entries)
+            splits.append((len(records) - 1, split))
+        else:
+            stack.append((item, item.__scan_directory__()))
+    return records, splits
+
+
+class TreeShardScan:
+    """
+    Scan a tree in parallel on a process pool, sharded by subtree
+
+    Each worker process walks a subtree with the tree loader class and returns compact
+    scan record tuples with fields in SHARD_RECORD_FIELDS instead of Path objects. Large
+    subtrees are split dynamically: after split_entries records, a worker returns its
+    remaining subdirectories as new shards, which are scheduled as soon as the result
+    arrives. Shards are merged back in the same depth first order as Tree.walk().
+
+    The tree loader class must be importable by worker processes. Instrumentation and
+    I/O governors of the tree are not used in worker processes.
+    """
+    tree: 'Tree'  # noqa
+    workers: Optional[int]
+    split_entries: int
+
+    def __init__(self,
+                 tree: 'Tree',  # noqa
+                 workers: Optional[int] = None,
+                 split_entries: int = DEFAULT_SHARD_SPLIT_ENTRIES) -> None:
+        self.tree = tree
+        self.workers = workers
+        self.split_entries = max(1, split_entries)
+
+    def __root_task__(self) -> ShardTask:
+        """
+        Return shard task for the tree root
+        """
+        options = {
+            'sorted': self.tree.sorted,
+            'excluded': list(self.tree.excluded),
+            'follow_symlinks': self.tree.follow_symlinks,
+            'one_file_system': self.tree.one_file_system,
+            'memory_limit': self.tree.memory_limit,
+        }
+        return (self.tree.__class__, str(self.tree), options, self.tree.stat().st_dev, '', None, self.split_entries)
+
+    @staticmethod
+    def __expand__(executor: ProcessPoolExecutor,
+                   future: Future,
+                   pending: Set[Future],
+                   results: Dict[Future, Tuple[List[ScanRecord], Dict[int, Future]]]) -> None:
+        """
+        Store result of a completed shard and submit its split shards
+        """
+        records, splits = future.result()
+        children = {}
+        for index, task in splits:
+            child = executor.submit(scan_shard, task)
+            children[index] = child
+            pending.add(child)
+        results[future] = (records, children)
+
+    def __merge__(self,
+                  executor: ProcessPoolExecutor,
+                  future: Future,
+                  pending: Set[Future],
+                  results: Dict[Future, Tuple[List[ScanRecord], Dict[int, Future]]]) -> Iterator[ScanRecord]:
+        """
+        Iterate records of a shard and its split shards in depth first order
+
+        While waiting for the shard, all completed shards are expanded so split shards are
+        submitted to workers as early as possible.
+        """
+        while future not in results:
+            done, _running = wait(pending, return_when=FIRST_COMPLETED)
+            for item in done:
+                pending.discard(item)
+                self.__expand__(executor, item, pending, results)
+        records, children = results.pop(future)
+        for index, record in enumerate(records):
+            yield record
+            child = children.get(index)
+            if child is not None:
+                yield from self.__merge__(executor, child, pending, results)
+
+    def __iter__(self) -> Iterator[ScanRecord]:
+        """
+        Iterate scan records for all items in the tree in depth first order
+
+        Raises FilesystemError if the tree can't be scanned.
+        """
+        if not self.tree.is_dir():
+            raise FilesystemError(f'Not a directory: {self.tree}')
+        executor = ProcessPoolExecutor(max_workers=self.workers)  # pylint: disable=consider-using-with
+        try:
+            root = executor.submit(scan_shard, self.__root_task__())
+            yield from self.__merge__(executor, root, {root}, {})
+        except OSError as error:
+            raise FilesystemError(f'Error scanning {self.tree}: {error}') from error
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def to_arrays(self, use_numpy: Optional[bool] = None) -> TreeArrays:
+        """
+        Merge all shards to a TreeArrays snapshot of the tree
+
+        Columns are the same as in Tree.to_arrays(). Items in directories reached through
+        followed symbolic links refer to the symbolic link as their parent.
+        """
+        numpy = load_numpy(use_numpy)
+        paths = []
+        columns = new_columns()
+        directories = {}
+        for record in self:
+            path_id = len(paths)
+            parent_id = directories.get(os.path.dirname(record[0]), -1)
+            paths.append(record[0])
+            append_columns(columns, path_id, parent_id, *record[1:])
+            if stat.S_ISDIR(record[1]) or stat.S_ISLNK(record[1]):
+                directories[record[0]] = path_id
+        return create_tree_arrays(paths, columns, numpy)
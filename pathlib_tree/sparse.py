@@ -0,0 +1,166 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Sparse file aware reading and comparison of file data
+"""
+import errno
+import os
+
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+
+from .throttle import IOGovernor
+
+#: Size of st_blocks units in bytes
+STAT_BLOCK_SIZE = 512
+#: Default block size for reading data extents
+DEFAULT_SPARSE_BLOCK_SIZE = 2**20
+
+#: Errors from SEEK_DATA and SEEK_HOLE that mean the filesystem does not support them
+UNSUPPORTED_SEEK_ERRORS = (
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+)
+
+
+def is_sparse(item_stat: os.stat_result) -> bool:
+    """
+    Check if stat result is for a file with less allocated blocks than its size
+    """
+    blocks = getattr(item_stat, 'st_blocks', None)
+    if blocks is None:
+        return False
+    return blocks * STAT_BLOCK_SIZE < item_stat.st_size
+
+
+def iter_data_extents(filedescriptor: int, size: int) -> Iterator[Tuple[int, int]]:
+    """
+    Iterate (offset, length) of data extents in an open file with SEEK_DATA and SEEK_HOLE
+
+    Ranges between the extents are holes that read as zeros. If the platform or
+    filesystem does not support SEEK_DATA, the whole file is returned as one extent.
+    """
+    if not hasattr(os, 'SEEK_DATA'):
+        if size:
+            yield 0, size
+        return
+    offset = 0
+    while offset < size:
+        try:
+            start = os.lseek(filedescriptor, offset, os.SEEK_DATA)
+        except OSError as error:
+            if error.errno == errno.ENXIO:
+                return
+            if offset == 0 and error.errno in UNSUPPORTED_SEEK_ERRORS:
+                yield 0, size
+                return
+            raise
+        if start >= size:
+            return
+        end = min(os.lseek(filedescriptor, start, os.SEEK_HOLE), size)
+        yield start, end - start
+        offset = end
+
+
+def __zero_blocks__(zeros: memoryview, length: int) -> Iterator[memoryview]:
+    """
+    Iterate blocks of zero bytes with total of length bytes
+    """
+    while length > 0:
+        count = min(length, len(zeros))
+        yield zeros[:count]
+        length -= count
+
+
+def __read_blocks__(filedescriptor: int,
+                    start: int,
+                    end: int,
+                    block_size: int,
+                    governor: Optional[IOGovernor]) -> Iterator[bytes]:
+    """
+    Iterate blocks of file data between start and end offsets, stopping at end of file
+    """
+    while start < end:
+        count = min(block_size, end - start)
+        if governor is not None:
+            governor.consume(count)
+        chunk = os.pread(filedescriptor, count, start)
+        if not chunk:
+            return
+        yield chunk
+        start += len(chunk)
+
+
+def iter_file_blocks(filedescriptor: int,
+                     size: int,
+                     block_size: int = DEFAULT_SPARSE_BLOCK_SIZE,
+                     governor: Optional[IOGovernor] = None) -> Iterator[bytes]:
+    """
+    Iterate contents of an open file in blocks, synthesizing zero blocks for holes
+
+    Only data extents are read from disk, throttled by governor if given. Blocks for holes
+    are slices of a shared buffer of zeros, so the data must be consumed before reading
+    the next block. Files that are not sparse are read without looking up data extents.
+    """
+    if not is_sparse(os.fstat(filedescriptor)):
+        yield from __read_blocks__(filedescriptor, 0, size, block_size, governor)
+        return
+    zeros = memoryview(bytes(min(block_size, size)))
+    offset = 0
+    for start, length in iter_data_extents(filedescriptor, size):
+        yield from __zero_blocks__(zeros, start - offset)
+        yield from __read_blocks__(filedescriptor, start, start + length, block_size, governor)
+        offset = start + length
+    yield from __zero_blocks__(zeros, size - offset)
+
+
+def __merge_extents__(extents: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """
+    Merge overlapping (offset, length) extents to (start, end) ranges
+    """
+    ranges = []
+    for start, length in sorted(extents):
+        end = start + length
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
+def files_equal(first: Union[str, Path],
+                second: Union[str, Path],
+                block_size: int = DEFAULT_SPARSE_BLOCK_SIZE,
+                governor: Optional[IOGovernor] = None) -> bool:
+    """
+    Compare contents of two files, skipping ranges that are holes in both files
+
+    Reads are throttled by governor if given.
+
+    Raises OSError if either file can't be read.
+    """
+    first_fd = os.open(first, os.O_RDONLY)
+    try:
+        second_fd = os.open(second, os.O_RDONLY)
+        try:
+            size = os.fstat(first_fd).st_size
+            if os.fstat(second_fd).st_size != size:
+                return False
+            extents = list(iter_data_extents(first_fd, size)) + list(iter_data_extents(second_fd, size))
+            for start, end in __merge_extents__(extents):
+                while start < end:
+                    count = min(block_size, end - start)
+                    if governor is not None:
+                        governor.consume(2 * count, operations=2)
+                    if os.pread(first_fd, count, start) != os.pread(second_fd, count, start):
+                        return False
+                    start += count
+            return True
+        finally:
+            os.close(second_fd)
+    finally:
+        os.close(first_fd)
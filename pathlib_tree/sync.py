@@ -0,0 +1,446 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Synchronization of filesystem trees
+"""
+import os
+import shutil
+import stat
+import time
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePath
+from typing import Deque, List, Optional, Tuple, Union
+
+from .checkpoint import load_checkpoint, Checkpoint, CHECKPOINT_OPERATION_SYNC
+from .copy import copy_file, copy_metadata, is_same_file, DEFAULT_COPY_BLOCK_SIZE
+from .delta import delta_copy_file, COPY_METHOD_DELTA, DEFAULT_DELTA_BLOCK_SIZE, DELTA_MODES
+from .exceptions import FilesystemError
+from .sparse import files_equal
+
+#: Default number of concurrent copy workers
+DEFAULT_SYNC_WORKERS = 4
+#: Files up to this size are copied in batches
+DEFAULT_SMALL_FILE_SIZE = 2**16
+#: Maximum number of small files copied in one batch
+DEFAULT_SMALL_FILE_BATCH_SIZE = 64
+
+
+class FileCopyStats:
+    """
+    Statistics for a single copied file
+
+    Transferred is the number of bytes copied from the source file, which is less than
+    size for files updated with delta transfer.
+    """
+    path: Path
+    size: int
+    elapsed: float
+    method: str
+    transferred: int
+
+    def __init__(self,
+                 path: Path,
+                 size: int,
+                 elapsed: float,
+                 method: str,
+                 transferred: Optional[int] = None) -> None:
+        self.path = path
+        self.size = size
+        self.elapsed = elapsed
+        self.method = method
+        self.transferred = transferred if transferred is not None else size
+
+    def __repr__(self) -> str:
+        return f'{self.path} {self.size} bytes {self.method}'
+
+    @property
+    def bytes_per_second(self) -> float:
+        """
+        Return copy throughput for the file
+        """
+        return self.size / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class SyncResult:
+    """
+    Results of a tree synchronization
+    """
+    copied: List[FileCopyStats]
+    created: List[Path]
+    deleted: List[Path]
+    unchanged: int
+    started: float
+    finished: Optional[float]
+
+    def __init__(self) -> None:
+        self.copied = []
+        self.created = []
+        self.deleted = []
+        self.unchanged = 0
+        self.started = time.monotonic()
+        self.finished = None
+
+    @property
+    def bytes_copied(self) -> int:
+        """
+        Return total number of bytes copied
+        """
+        return sum(item.size for item in self.copied)
+
+    @property
+    def bytes_transferred(self) -> int:
+        """
+        Return total number of bytes copied from source files
+        """
+        return sum(item.transferred for item in self.copied)
+
+    @property
+    def elapsed(self) -> float:
+        """
+        Return elapsed time of the synchronization in seconds
+        """
+        finished = self.finished if self.finished is not None else time.monotonic()
+        return finished - self.started
+
+    @property
+    def bytes_per_second(self) -> float:
+        """
+        Return aggregate copy throughput in bytes per second
+        """
+        elapsed = self.elapsed
+        return self.bytes_copied / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def files_per_second(self) -> float:
+        """
+        Return aggregate copy throughput in files per second
+        """
+        elapsed = self.elapsed
+        return len(self.copied) / elapsed if elapsed > 0 else 0.0
+
+
+class TreeSync:
+    """
+    Copy changed files from a source tree to target directory
+
+    Files are compared with size and modification time, or contents when checksum is set,
+    and only changed files are copied. Copies run concurrently in a bounded thread pool,
+    with small files grouped to batches to reduce per task overhead.
+
+    Files are cloned with reflinks when the filesystem supports it and hard linked when
+    hardlink is set, before falling back to copying file contents.
+
+    If delta is 'tempfile' or 'inplace', changed files that already exist in target and are
+    at least delta_block_size bytes are updated with a rolling checksum delta transfer
+    instead, transferring only blocks that are not found in the target file. See
+    delta_copy_file() for the modes.
+
+    If checkpoint is set, copy batches are kept in tree walk order and the last copied path
+    is saved periodically with counts of files and bytes copied. Synchronizing again with
+    the same checkpoint resumes the tree walk after that path. Metadata of directories
+    finished before a saved path is copied before saving the checkpoint, because resumed
+    walks do not return these directories again. The checkpoint is removed when
+    synchronization completes.
+    """
+    source: 'Tree'  # noqa
+    target: Path
+    delete: bool
+    workers: int
+    preserve: bool
+    checksum: bool
+    small_file_size: int
+    batch_size: int
+    block_size: int
+    reflink: bool
+    hardlink: bool
+    checkpoint: Optional[Checkpoint]
+    delta: Optional[str]
+    delta_block_size: int
+
+    # pylint: disable=too-many-arguments
+    def __init__(self,
+                 source: 'Tree',  # noqa
+                 target: Union[str, Path],
+                 delete: bool = False,
+                 workers: int = DEFAULT_SYNC_WORKERS,
+                 preserve: bool = True,
+                 checksum: bool = False,
+                 small_file_size: int = DEFAULT_SMALL_FILE_SIZE,
+                 batch_size: int = DEFAULT_SMALL_FILE_BATCH_SIZE,
+                 block_size: int = DEFAULT_COPY_BLOCK_SIZE,
+                 reflink: bool = True,
+                 hardlink: bool = False,
+                 checkpoint: Optional[Union[str, Path, Checkpoint]] = None,
+                 delta: Optional[str] = None,
+                 delta_block_size: int = DEFAULT_DELTA_BLOCK_SIZE) -> None:
+        if delta is not None and delta not in DELTA_MODES:
+            raise FilesystemError(f'Unexpected delta mode: {delta}')
+        self.source = source
+        self.target = Path(target)
+        self.delete = delete
+        self.workers = max(1, workers)
+        self.preserve = preserve
+        self.checksum = checksum
+        self.small_file_size = small_file_size
+        self.batch_size = max(1, batch_size)
+        self.block_size = block_size
+        self.reflink = reflink
+        self.hardlink = hardlink
+        self.checkpoint = load_checkpoint(checkpoint)
+        self.delta = delta
+        self.delta_block_size = delta_block_size
+
+    # pylint: disable=too-many-return-statements
+    def is_changed(self, source: Path, source_stat: os.stat_result, target: Path) -> bool:
+        """
+        Check if source file differs from target path
+        """
+        try:
+            target_stat = os.lstat(target)
+        except FileNotFoundError:
+            return True
+        if is_same_file(source_stat, target_stat):
+            return False
+        if stat.S_IFMT(source_stat.st_mode) != stat.S_IFMT(target_stat.st_mode):
+            return True
+        if stat.S_ISLNK(source_stat.st_mode):
+            return os.readlink(source) != os.readlink(target)
+        if source_stat.st_size != target_stat.st_size:
+            return True
+        if self.checksum:
+            return not files_equal(source, target, self.block_size, self.source.governor)
+        return source_stat.st_mtime_ns != target_stat.st_mtime_ns
+
+    def __prepare_target__(self, path: Path, directory: bool) -> None:
+        """
+        Remove target path if it has a different type than source
+        """
+        if directory:
+            if os.path.lexists(path) and (os.path.islink(path) or not path.is_dir()):
+                path.unlink()
+        elif path.is_dir() and not path.is_symlink():
+            shutil.rmtree(path)
+
+    def __use_delta__(self, target: Path, source_stat: os.stat_result) -> bool:
+        """
+        Check if target file should be updated with delta transfer
+        """
+        if self.delta is None or not stat.S_ISREG(source_stat.st_mode):
+            return False
+        if source_stat.st_size < self.delta_block_size:
+            return False
+        try:
+            target_stat = os.lstat(target)
+        except FileNotFoundError:
+            return False
+        return stat.S_ISREG(target_stat.st_mode) and target_stat.st_size >= self.delta_block_size
+
+    def __copy_batch__(self, batch: List[Tuple[Path, Path, os.stat_result]]) -> List[FileCopyStats]:
+        """
+        Copy a batch of files, returning statistics for each copied file
+        """
+        stats = []
+        for source, target, source_stat in batch:
+            start = time.monotonic()
+            if self.__use_delta__(target, source_stat):
+                transferred = delta_copy_file(
+                    source,
+                    target,
+                    mode=self.delta,
+                    block_size=self.delta_block_size,
+                    preserve=self.preserve,
+                    source_stat=source_stat,
+                    governor=self.source.governor,
+                )
+                stats.append(FileCopyStats(
+                    target, source_stat.st_size, time.monotonic() - start, COPY_METHOD_DELTA, transferred
+                ))
+                continue
+            method = copy_file(
+                source,
+                target,
+                preserve=self.preserve,
+                block_size=self.block_size,
+                source_stat=source_stat,
+                reflink=self.reflink,
+                hardlink=self.hardlink,
+                governor=self.source.governor,
+            )
+            stats.append(FileCopyStats(target, source_stat.st_size, time.monotonic() - start, method))
+        return stats
+
+    def __resumed_directories__(self, start_after: Optional[str]) -> List[Tuple[Path, os.stat_result]]:
+        """
+        Return target directories and source stat results for parents of resumed path
+        """
+        directories = []
+        if start_after is not None:
+            for parent in reversed(PurePath(start_after).parents[:-1]):
+                source_stat = os.lstat(self.source.joinpath(parent))
+                if stat.S_ISDIR(source_stat.st_mode):
+                    directories.append((self.target.joinpath(parent), source_stat))
+        return directories
+
+    def __plan__(self,
+                 result: SyncResult,
+                 start_after: Optional[str] = None) -> Tuple[List[list], List[Tuple[Path, os.stat_result]]]:
+        """
+        Walk the source tree, create missing directories and collect copy batches
+
+        If start_after is set, the walk starts after that path relative to the source tree.
+        """
+        batches = []
+        small_files = []
+        directories = self.__resumed_directories__(start_after)
+        symlinked_directories = set()
+
+        for item in self.source.walk(start_after=start_after):
+            relative_path = item.relative_to(self.source)
+            if any(parent in symlinked_directories for parent in relative_path.parents):
+                continue
+            target = self.target.joinpath(relative_path)
+            source_stat = os.lstat(item)
+
+            if stat.S_ISDIR(source_stat.st_mode):
+                self.__prepare_target__(target, directory=True)
+                if not target.is_dir():
+                    target.mkdir()
+                    result.created.append(target)
+                directories.append((target, source_stat))
+                continue
+
+            if stat.S_ISLNK(source_stat.st_mode) and item.is_dir():
+                symlinked_directories.add(relative_path)
+
+            if not self.is_changed(item, source_stat, target):
+                result.unchanged += 1
+                continue
+            self.__prepare_target__(target, directory=False)
+
+            if source_stat.st_size <= self.small_file_size:
+                small_files.append((item, target, source_stat))
+                if len(small_files) >= self.batch_size:
+                    batches.append(small_files)
+                    small_files = []
+            else:
+                if small_files and self.checkpoint is not None:
+                    batches.append(small_files)
+                    small_files = []
+                batches.append([(item, target, source_stat)])
+
+        if small_files:
+            batches.append(small_files)
+        return batches, directories
+
+    def __finish_directories__(self, directories: Deque[Tuple[Path, os.stat_result]], path: Path) -> None:
+        """
+        Copy metadata to target directories finished before source path in sorted walk order
+
+        Directories are in walk order. Directories before path that do not contain it have
+        all their files copied, so they are removed from directories after copying metadata.
+        """
+        target = self.target.joinpath(path.relative_to(self.source))
+        parents = []
+        while directories and directories[0][0] < target:
+            directory = directories.popleft()
+            if directory[0] in target.parents:
+                parents.append(directory)
+            else:
+                copy_metadata(*directory)
+        directories.extendleft(reversed(parents))
+
+    def __delete_extraneous__(self, result: SyncResult) -> None:
+        """
+        Delete items from target that do not exist in source tree
+
+        The target tree is walked without caching items, and deleted directories are not
+        walked into.
+        """
+        target_tree = self.source.__class__(
+            self.target,
+            sorted=True,
+            excluded=list(self.source.excluded),
+            follow_symlinks=False,
+        )
+        deleted = set()
+        for item in target_tree.walk(prune=lambda directory: directory.relative_to(self.target) in deleted):
+            relative_path = item.relative_to(self.target)
+            if os.path.lexists(self.source.joinpath(relative_path)):
+                continue
+            if item.is_dir() and not item.is_symlink():
+                shutil.rmtree(item)
+            else:
+                item.unlink()
+            deleted.add(relative_path)
+            result.deleted.append(item)
+
+    def __deleted_parents__(self, result: SyncResult) -> List[Tuple[Path, os.stat_result]]:
+        """
+        Return target directories and source stat results for parents of deleted items
+
+        With checkpoints, these directories may have been finished before deleting items.
+        """
+        parents = sorted({item.parent for item in result.deleted} - {self.target})
+        return [(parent, os.lstat(self.source.joinpath(parent.relative_to(self.target)))) for parent in parents]
+
+    def __save_checkpoint__(self, path: Path, result: SyncResult, resumed: dict) -> None:
+        """
+        Save checkpoint after path has been copied, adding counts from the resumed checkpoint
+        """
+        self.checkpoint.save(
+            str(path.relative_to(self.source)),
+            {
+                'files': resumed.get('files', 0) + len(result.copied),
+                'bytes': resumed.get('bytes', 0) + result.bytes_copied,
+            },
+        )
+
+    def run(self) -> SyncResult:
+        """
+        Run synchronization, returning SyncResult with copy statistics
+
+        Raises FilesystemError if source is not a directory or copying fails.
+        """
+        if not self.source.is_dir():
+            raise FilesystemError(f'Source is not a directory: {self.source}')
+        result = SyncResult()
+        try:
+            if not self.target.is_dir():
+                self.target.mkdir(parents=True)
+                result.created.append(self.target)
+
+            start_after = None
+            resumed = {}
+            if self.checkpoint is not None:
+                start_after = self.checkpoint.resume(CHECKPOINT_OPERATION_SYNC, self.source)
+                resumed = dict(self.checkpoint.state)
+            batches, directories = self.__plan__(result, start_after)
+            directories = deque(directories)
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for batch, stats in zip(batches, executor.map(self.__copy_batch__, batches)):
+                    result.copied.extend(stats)
+                    if self.checkpoint is not None and self.checkpoint.due():
+                        if self.preserve and self.source.sorted:
+                            self.__finish_directories__(directories, batch[-1][0])
+                        self.__save_checkpoint__(batch[-1][0], result, resumed)
+
+            if self.delete:
+                self.__delete_extraneous__(result)
+                if self.checkpoint is not None:
+                    directories.extend(self.__deleted_parents__(result))
+
+            if self.preserve:
+                for target, source_stat in reversed(directories):
+                    copy_metadata(target, source_stat)
+                copy_metadata(self.target, os.stat(self.source))
+            if self.checkpoint is not None:
+                self.checkpoint.remove()
+        except OSError as error:
+            raise FilesystemError(f'Error synchronizing {self.source} to {self.target}: {error}') from error
+        result.finished = time.monotonic()
+        return result
@@ -0,0 +1,156 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Token bucket throttling of bulk file I/O
+"""
+import threading
+import time
+
+from typing import Any, Callable, Optional
+
+from .exceptions import FilesystemError
+
+#: Default burst size as seconds of I/O at the configured rate
+DEFAULT_THROTTLE_BURST = 1.0
+#: Default value for IOGovernor.set_limits() arguments to keep the current limit
+LIMIT_UNCHANGED = object()
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at a constant rate up to capacity
+
+    Tokens can be reserved beyond available tokens. The bucket then goes to debt, and the
+    caller is expected to wait until the debt has been refilled. Rate None means no limit.
+    """
+    rate: Optional[float]
+    capacity: float
+    tokens: float
+    updated: float
+
+    def __init__(self, rate: Optional[float], burst: float, now: float) -> None:
+        self.rate = None
+        self.capacity = 0.0
+        self.tokens = 0.0
+        self.updated = now
+        self.configure(rate, burst, now)
+        self.tokens = self.capacity
+
+    def refill(self, now: float) -> None:
+        """
+        Add tokens for time elapsed since last update
+        """
+        if self.rate is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def configure(self, rate: Optional[float], burst: float, now: float) -> None:
+        """
+        Change bucket rate, keeping tokens collected at the previous rate
+        """
+        if rate is not None and rate <= 0:
+            raise FilesystemError(f'Invalid throttle rate: {rate}')
+        self.refill(now)
+        self.rate = float(rate) if rate is not None else None
+        self.capacity = self.rate * burst if self.rate is not None else 0.0
+        self.tokens = min(self.tokens, self.capacity)
+
+    def reserve(self, amount: float, now: float) -> float:
+        """
+        Take amount tokens from the bucket, returning seconds to wait before using them
+        """
+        if self.rate is None or amount <= 0:
+            return 0.0
+        self.refill(now)
+        self.tokens -= amount
+        return max(0.0, -self.tokens / self.rate)
+
+
+class IOGovernor:
+    """
+    Shared I/O rate limiter with bytes per second and operations per second limits
+
+    Bulk operations call consume() before each read, write or copy call, and are paused
+    until the token buckets allow the I/O. Limits are shared by all threads and trees using
+    the same governor, and can be changed at runtime with set_limits(). A limit of None
+    means no limit. Burst is the number of seconds of I/O allowed without waiting after
+    the governor has been idle.
+    """
+    bytes_per_second: Optional[float]
+    ops_per_second: Optional[float]
+    burst: float
+    bytes: int
+    operations: int
+    waited: float
+
+    def __init__(self,
+                 bytes_per_second: Optional[float] = None,
+                 ops_per_second: Optional[float] = None,
+                 burst: float = DEFAULT_THROTTLE_BURST,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep) -> None:
+        self.burst = burst
+        self.bytes = 0
+        self.operations = 0
+        self.waited = 0.0
+        self.__clock__ = clock
+        self.__sleep__ = sleep
+        self.__lock__ = threading.Lock()
+        now = clock()
+        self.__bytes_bucket__ = TokenBucket(bytes_per_second, burst, now)
+        self.__ops_bucket__ = TokenBucket(ops_per_second, burst, now)
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__} {self.bytes_per_second} bytes/s {self.ops_per_second} ops/s'
+
+    @property
+    def bytes_per_second(self) -> Optional[float]:
+        """
+        Return current bytes per second limit
+        """
+        return self.__bytes_bucket__.rate
+
+    @property
+    def ops_per_second(self) -> Optional[float]:
+        """
+        Return current operations per second limit
+        """
+        return self.__ops_bucket__.rate
+
+    def set_limits(self,
+                   bytes_per_second: Any = LIMIT_UNCHANGED,
+                   ops_per_second: Any = LIMIT_UNCHANGED) -> None:
+        """
+        Change limits at runtime. New limits apply to following consume() calls.
+
+        Limits that are not given are kept, and a limit of None removes the limit.
+        Raises FilesystemError if a limit is not a positive number or None.
+        """
+        with self.__lock__:
+            now = self.__clock__()
+            if bytes_per_second is not LIMIT_UNCHANGED:
+                self.__bytes_bucket__.configure(bytes_per_second, self.burst, now)
+            if ops_per_second is not LIMIT_UNCHANGED:
+                self.__ops_bucket__.configure(ops_per_second, self.burst, now)
+
+    def consume(self, size: int = 0, operations: int = 1) -> float:
+        """
+        Account for size bytes in operations I/O calls, waiting if limits were exceeded
+
+        Returns number of seconds waited.
+        """
+        with self.__lock__:
+            now = self.__clock__()
+            delay = max(
+                self.__bytes_bucket__.reserve(size, now),
+                self.__ops_bucket__.reserve(operations, now),
+            )
+            self.bytes += size
+            self.operations += operations
+            self.waited += delay
+        if delay > 0:
+            self.__sleep__(delay)
+        return delay
@@ -6,18 +6,16 @@
 """
 Filesystem file tree
 """
-import filecmp
-import hashlib
-import itertools
 import os
 import pathlib
+import threading
+import time
 
-from datetime import datetime
-from typing import Any, Iterator, List, Optional, Tuple, Union
-from zoneinfo import ZoneInfo
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, TextIO, Tuple, Union, TYPE_CHECKING
 
 from .exceptions import FilesystemError
 from .patterns import match_path_patterns
+from .search import TreeSearch
 from .utils import current_umask
 
 #: Files and directories never included in tree scans
@@ -37,13 +35,59 @@ SKIPPED_CHECKSUMS = (
     'shake_256',
 )
 
-# Default timezone for local filesystem timestamp parsing
-DEFAULT_TIMEZONE = ZoneInfo('UTC')
+if TYPE_CHECKING:
+    from datetime import datetime
+    from .instrumentation import WalkInstrumentation
+    from .throttle import IOGovernor
+
+#: Name of default timezone for local filesystem timestamp parsing. The timezone object is
+#: available as DEFAULT_TIMEZONE and loaded on first use.
+DEFAULT_TIMEZONE_NAME = 'UTC'
 #: Default checksum hash algorithm
 DEFAULT_CHECKSUM = 'sha256'
 #: Default block size when calculating file checksums
 DEFAULT_CHECKSUM_BLOCK_SIZE = 2**20
 
+#: Operation names counted by walk instrumentation
+OPERATION_ITERDIR = 'iterdir'
+OPERATION_LSTAT = 'lstat'
+OPERATION_STAT = 'stat'
+OPERATION_IS_DIR = 'is_dir'
+OPERATION_IS_SYMLINK = 'is_symlink'
+OPERATION_EXCLUDE_MATCH = 'exclude_match'
+OPERATION_CHECKSUM = 'checksum'
+
+
+def default_timezone() -> Any:
+    """
+    Return default timezone for filesystem timestamps, loading zoneinfo on first call
+    """
+    timezone = globals().get('DEFAULT_TIMEZONE', None)
+    if timezone is None:
+        # pylint: disable=import-outside-toplevel
+        from zoneinfo import ZoneInfo
+        timezone = ZoneInfo(DEFAULT_TIMEZONE_NAME)
+        globals()['DEFAULT_TIMEZONE'] = timezone
+    return timezone
+
+
+def timestamp_datetime(timestamp: float) -> 'datetime':
+    """
+    Return filesystem timestamp as datetime in default timezone
+    """
+    # pylint: disable=import-outside-toplevel
+    from datetime import datetime
+    return datetime.fromtimestamp(timestamp).astimezone(default_timezone())
+
+
+def __getattr__(name: str) -> Any:
+    """
+    Load module attributes that are expensive to initialize on first use
+    """
+    if name == 'DEFAULT_TIMEZONE':
+        return default_timezone()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
 
 class TreeItem(pathlib.Path):
     """
@@ -55,6 +99,20 @@ class TreeItem(pathlib.Path):
     _flavour = pathlib._windows_flavour if os.name == 'nt' else pathlib._posix_flavour
 
     __checksums__ = {}
+    __checksums_lock__ = threading.Lock()
+
+    instrumentation: Optional['WalkInstrumentation'] = None
+    """Optional instrumentation for counting filesystem operations"""
+    governor: Optional['IOGovernor'] = None
+    """Optional I/O governor throttling checksum reads"""
+
+    def lstat(self) -> os.stat_result:
+        """
+        Return lstat() for the item, counted by instrumentation if enabled
+        """
+        if self.instrumentation is not None:
+            self.instrumentation.count(OPERATION_LSTAT)
+        return super().lstat()
 
     @property
     def gid(self) -> int:
@@ -71,25 +129,25 @@ class TreeItem(pathlib.Path):
         return self.lstat().st_uid
 
     @property
-    def atime(self) -> datetime:
+    def atime(self) -> 'datetime':
         """
         Return st_atime as UTC datetime
         """
-        return datetime.fromtimestamp(self.lstat().st_atime).astimezone(DEFAULT_TIMEZONE)
+        return timestamp_datetime(self.lstat().st_atime)
 
     @property
-    def ctime(self) -> datetime:
+    def ctime(self) -> 'datetime':
         """
         Return st_ctime as UTC datetime
         """
-        return datetime.fromtimestamp(self.lstat().st_ctime).astimezone(DEFAULT_TIMEZONE)
+        return timestamp_datetime(self.lstat().st_ctime)
 
     @property
-    def mtime(self) -> datetime:
+    def mtime(self) -> 'datetime':
         """
         Return st_mtime as UTC datetime
         """
-        return datetime.fromtimestamp(self.lstat().st_mtime).astimezone(DEFAULT_TIMEZONE)
+        return timestamp_datetime(self.lstat().st_mtime)
 
     @property
     def size(self) -> int:
@@ -116,22 +174,24 @@ class TreeItem(pathlib.Path):
 
     def __get_cached_checksum__(self, algorithm: str) -> Optional[str]:
         """
-        Get cached checksum if st_mtime is not changed
+        Get cached checksum if path and st_mtime are not changed
         """
-        try:
-            cached_item = self.__checksums__[algorithm]
-            if cached_item['st_mtime'] != self.lstat().st_mtime:
-                del self.__checksums__[algorithm]
-                return None
-            return cached_item['hex_digest']
-        except KeyError:
+        with self.__checksums_lock__:
+            cached_item = self.__checksums__.get(algorithm)
+        if cached_item is None:
             return None
+        if cached_item['path'] != str(self) or cached_item['st_mtime'] != self.lstat().st_mtime:
+            return None
+        return cached_item['hex_digest']
 
     def checksum(self,
                  algorithm: str = DEFAULT_CHECKSUM,
                  block_size: int = DEFAULT_CHECKSUM_BLOCK_SIZE) -> str:
         """
         Calculate hex digest for file with specified checksum algorithm
+
+        Holes in sparse files are hashed as zeros without reading them from disk. Reads
+        are throttled by the I/O governor of the tree, if set.
         """
         if algorithm in SKIPPED_CHECKSUMS:
             raise FilesystemError(f'Calculating {algorithm} not supported')
@@ -141,27 +201,35 @@ class TreeItem(pathlib.Path):
         cached_checksum = self.__get_cached_checksum__(algorithm)
         if cached_checksum is not None:
             return cached_checksum
+        # pylint: disable=import-outside-toplevel
+        import hashlib
         try:
             hash_callback = getattr(hashlib, algorithm)()
         except AttributeError as error:
             raise FilesystemError(f'Unexpected algorithm: {algorithm}') from error
 
+        from .sparse import iter_file_blocks
         with self.open('rb') as filedescriptor:
-            while True:
-                chunk = filedescriptor.read(block_size)
-                if not chunk:
-                    break
+            size = os.fstat(filedescriptor.fileno()).st_size
+            for chunk in iter_file_blocks(filedescriptor.fileno(), size, block_size, self.governor):
                 hash_callback.update(chunk)
+                if self.instrumentation is not None:
+                    self.instrumentation.add_bytes(len(chunk))
 
+            if self.instrumentation is not None:
+                self.instrumentation.count(OPERATION_CHECKSUM)
             hex_digest = hash_callback.hexdigest()
-            self.__checksums__[algorithm] = {
+            cached_item = {
+                'path': str(self),
                 'st_mtime': self.lstat().st_mtime,
                 'hex_digest': hex_digest
             }
+            with self.__checksums_lock__:
+                self.__checksums__[algorithm] = cached_item
             return hex_digest
 
 
-class Tree(pathlib.Path):
+class Tree(pathlib.Path):  # pylint: disable=too-many-public-methods
     """
     Extend pathlib.Path to use for filesystem tree processing
     """
@@ -169,12 +237,20 @@ class Tree(pathlib.Path):
     sorted: bool
     mode: str
     excluded: List[str]
+    follow_symlinks: bool
+    one_file_system: bool
+    memory_limit: Optional[int]
 
     __directory_loader_class__: 'Tree' = None
     """Tree item loader for directories"""
     __file_loader_class__: TreeItem = None
     """Tree item loader class for files"""
 
+    instrumentation: Optional['WalkInstrumentation'] = None
+    """Optional instrumentation for tree walks, see instrument()"""
+    governor: Optional['IOGovernor'] = None
+    """Optional I/O governor for bulk file operations, see throttle()"""
+
     # pylint: disable=protected-access
     _flavour = pathlib._windows_flavour if os.name == 'nt' else pathlib._posix_flavour
 
@@ -185,16 +261,24 @@ class Tree(pathlib.Path):
                  create_missing: bool = False,
                  sorted: bool = True,
                  mode: str = None,
-                 excluded: Optional[List[str]] = None):  # noqa
+                 excluded: Optional[List[str]] = None,
+                 follow_symlinks: bool = True,
+                 one_file_system: bool = False,
+                 memory_limit: Optional[int] = None):  # noqa
         self.excluded = self.__configure_excluded__(excluded)
         self.sorted = sorted  # noqa
+        self.follow_symlinks = follow_symlinks
+        self.one_file_system = one_file_system
+        self.memory_limit = memory_limit
         if create_missing and not self.exists():
             self.create(mode)
 
+        self.__ancestors__ = None
+        self.__device__ = None
+        self.__lock__ = threading.RLock()
         self.__items__ = None
         self.__iter_items__ = None
-        self.__iter_child__ = None
-        self.__iterator__ = None
+        self.__cursor__ = None
         self.reset()
 
     def __repr__(self) -> str:
@@ -233,90 +317,287 @@ class Tree(pathlib.Path):
     def __getitem__(self, path: Union[str, pathlib.Path]) -> Any:
         """
         Get cached path item by path
-        """
-        if not self.__items__:
-            list(self)
-        if isinstance(path, pathlib.Path):
-            path = str(path)
 
-        return self.__items__[path]
+        Items in subdirectories are looked up from the cached subdirectory trees.
+        """
+        path = str(path)
+        self.__load_items__()
+        items = self.__items__ if self.__items__ is not None else {}
+        if path in items:
+            return items[path]
+        try:
+            parts = pathlib.PurePath(path).relative_to(self).parts
+        except ValueError as error:
+            raise KeyError(path) from error
+        child = items.get(str(self.joinpath(parts[0]))) if parts else None
+        if len(parts) > 1 and isinstance(child, Tree):
+            return child[path]  # pylint: disable=unsubscriptable-object
+        raise KeyError(path)
 
     def __iter__(self) -> Iterator[Any]:
-        return self
+        """
+        Return a new independent cursor for walking the tree
+        """
+        return TreeIterator(self)
 
     def __load_tree__(self, item: Union[str, pathlib.Path]) -> TreeItem:
         """
         Load sub directory
         """
         # pylint: disable=not-callable
-        return self.__directory_loader__(item, sorted=self.sorted, excluded=self.excluded)
+        tree = self.__directory_loader__(
+            item,
+            sorted=self.sorted,
+            excluded=self.excluded,
+            follow_symlinks=self.follow_symlinks,
+            one_file_system=self.one_file_system,
+            memory_limit=self.memory_limit,
+        )
+        tree.__device__ = self.__walk_device__
+        if self.instrumentation is not None:
+            tree.instrumentation = self.instrumentation
+        if self.governor is not None:
+            tree.governor = self.governor
+        return tree
 
-    def __load_file__(self, item: Union[str, pathlib.Path]) -> TreeItem:
+    @property
+    def __walk_device__(self) -> Optional[int]:
         """
-        Load file item
+        Return st_dev of the root directory of the tree walk
         """
-        # pylint: disable=not-callable
-        return self.__file_loader__(item)
+        if self.__device__ is None:
+            self.__device__ = self.stat().st_dev
+        return self.__device__
 
-    # pylint: disable=too-many-branches
-    def __next__(self):
+    def __is_directory__(self, item: pathlib.Path) -> bool:
         """
-        Walk tree items recursively, returning Tree or Path objects
+        Check if item should be loaded as a tree
 
-        Tree is walked depth first. If self.sorted is set, Tree items are sorted
-        before iterating.
+        Symbolic links to directories are loaded as files if follow_symlinks is not set.
+        """
+        if self.instrumentation is not None:
+            if not self.follow_symlinks:
+                self.instrumentation.count(OPERATION_IS_SYMLINK)
+            self.instrumentation.count(OPERATION_IS_DIR)
+        if not self.follow_symlinks and item.is_symlink():
+            return False
+        return item.is_dir()
+
+    def __can_descend__(self, tree: 'Tree') -> bool:
+        """
+        Check if walk can descend to a subdirectory tree
+
+        Directories already visited on the path from the walk root are never entered again,
+        which breaks symbolic link loops. Directories on other filesystems are not entered
+        if one_file_system is set.
+        """
+        if self.__ancestors__ is None:
+            root_stat = self.stat()
+            self.__ancestors__ = frozenset([(root_stat.st_dev, root_stat.st_ino)])
+        if self.instrumentation is not None:
+            self.instrumentation.count(OPERATION_STAT)
+        try:
+            tree_stat = tree.stat()
+        except OSError:
+            return False
+        inode = (tree_stat.st_dev, tree_stat.st_ino)
+        if inode in self.__ancestors__:
+            return False
+        if self.one_file_system and tree_stat.st_dev != self.__walk_device__:
+            return False
+        tree.__ancestors__ = self.__ancestors__ | {inode}
+        return True
+
+    def __load_file__(self, item: Union[str, pathlib.Path]) -> TreeItem:
         """
-        if not self.__items__:
-            self.__iter_child__ = None
-            self.__items__ = {}
-            if self.sorted:
+        Load file item
+        """
+        # pylint: disable=not-callable
+        item = self.__file_loader__(item)
+        if self.instrumentation is not None:
+            item.instrumentation = self.instrumentation
+        if self.governor is not None:
+            item.governor = self.governor
+        return item
+
+    def __load_item__(self, item: pathlib.Path) -> Union['Tree', TreeItem]:
+        """
+        Load a child path as a tree or file item
+        """
+        if self.__is_directory__(item):
+            return self.__load_tree__(item)
+        return self.__load_file__(item)
+
+    def __load_items__(self) -> Iterator[Union['Tree', TreeItem]]:
+        """
+        Load items in this directory, returning an iterator over the loaded items
+
+        Items are listed once and cached, guarded by the tree lock. Empty directories and
+        large directories listed within self.memory_limit are not cached, and are listed
+        again for each call instead.
+        """
+        with self.__lock__:
+            if self.__iter_items__ is not None:
+                return iter(self.__iter_items__)
+            if self.instrumentation is not None:
+                started = time.monotonic()
+                self.instrumentation.directory_enter(self)
+                self.instrumentation.count(OPERATION_ITERDIR)
+            paths, cached = self.__list_items__()
+            if cached:
+                items = {}
+                iter_items = []
                 try:
-                    items = sorted(self.iterdir())
+                    for item in paths:
+                        if self.is_excluded(item):
+                            continue
+                        item = self.__load_item__(item)
+                        items[str(item)] = item
+                        iter_items.append(item)
                 except FileNotFoundError as error:
                     raise FilesystemError(f'{error}') from error
-            else:
-                items = self.iterdir()
-            self.__iter_items__ = []
+                if iter_items:
+                    self.__items__ = items
+                    self.__iter_items__ = iter_items
+            if self.instrumentation is not None:
+                self.instrumentation.directory_listed(self, time.monotonic() - started)
+            if cached:
+                return iter(iter_items)
+            return (self.__load_item__(item) for item in paths)
+
+    def __list_items__(self) -> Tuple[Iterator[pathlib.Path], bool]:
+        """
+        List child paths of this directory, sorted if self.sorted is set
+
+        Returns the paths and a flag indicating if the items should be cached.
+        """
+        if self.memory_limit is not None:
+            return self.__load_listing__()
+        if self.sorted:
             try:
-                for item in items:
-                    if self.is_excluded(item):
-                        continue
-                    if item.is_dir():
-                        item = self.__load_tree__(item)
-                    else:
-                        item = self.__load_file__(item)
-                    self.__items__[str(item)] = item
-                    self.__iter_items__.append(item)
+                return sorted(self.iterdir()), True
             except FileNotFoundError as error:
                 raise FilesystemError(f'{error}') from error
-            self.__iterator__ = itertools.chain(self.__iter_items__)
+        return self.iterdir(), True
 
+    def __load_listing__(self) -> Tuple[Iterator[pathlib.Path], bool]:
+        """
+        List directory within memory_limit
+
+        Returns child paths as a list if the directory fits in the memory limit. Otherwise
+        returns a streaming iterator of child paths that are not excluded.
+        """
+        # pylint: disable=import-outside-toplevel
+        from .listing import DirectoryListing
+        listing = DirectoryListing(self, sorted=self.sorted, memory_limit=self.memory_limit)
         try:
-            if self.__iter_child__ is not None:
-                try:
-                    item = next(self.__iter_child__)
-                    if str(item) not in self.__items__:
-                        if item.is_dir():
-                            item = self.__load_tree__(item)
-                        else:
-                            item = self.__load_file__(item)
-                        self.__items__[str(item)] = item
-                    return item
-                except StopIteration:
-                    self.__iter_child__ = None
-
-            item = next(self.__iterator__)
-            if item.is_dir():
-                item = self.__load_tree__(item)
-                self.__iter_child__ = item
-                self.__items__[str(self.__iter_child__)] = self.__iter_child__
-            else:
-                item = self.__load_file__(item)
-            return item
-        except StopIteration as stop:
-            self.__iterator__ = itertools.chain(self.__iter_items__)
-            self.__iter_child__ = None
-            raise StopIteration from stop
+            listing.load()
+        except FileNotFoundError as error:
+            raise FilesystemError(f'{error}') from error
+        if listing.is_large:
+            return self.__iter_listing__(listing), False
+        return [self.joinpath(name) for name in listing], True
+
+    def __iter_listing__(self, listing: 'DirectoryListing') -> Iterator[pathlib.Path]:  # noqa
+        """
+        Iterate child paths of a large directory from a streaming listing
+        """
+        for name in listing:
+            item = self.joinpath(name)
+            if not self.is_excluded(item):
+                yield item
+
+    def __next__(self):
+        """
+        Walk tree items recursively with a cursor stored in the tree
+
+        Calling next() for the tree directly shares the same cursor between all callers.
+        Use iter(tree) to get independent cursors, for example in threads. The cursor is
+        reset when all items have been returned.
+        """
+        with self.__lock__:
+            if self.__cursor__ is None:
+                self.__cursor__ = TreeIterator(self)
+            try:
+                return next(self.__cursor__)
+            except StopIteration:
+                self.__cursor__ = None
+                raise
+
+    def __scan_directory__(self) -> Iterator[Union['Tree', TreeItem]]:
+        """
+        Iterate loaded items in this directory without caching them
+        """
+        # pylint: disable=import-outside-toplevel
+        from .listing import DirectoryListing, DEFAULT_LISTING_MEMORY_LIMIT
+        memory_limit = self.memory_limit if self.memory_limit is not None else DEFAULT_LISTING_MEMORY_LIMIT
+        if self.instrumentation is not None:
+            started = time.monotonic()
+            self.instrumentation.directory_enter(self)
+            self.instrumentation.count(OPERATION_ITERDIR)
+        with DirectoryListing(self, sorted=self.sorted, memory_limit=memory_limit) as listing:
+            try:
+                listing.load()
+            except FileNotFoundError as error:
+                raise FilesystemError(f'{error}') from error
+            if self.instrumentation is not None:
+                self.instrumentation.directory_listed(self, time.monotonic() - started)
+            for name in listing:
+                item = self.joinpath(name)
+                if self.is_excluded(item):
+                    continue
+                if self.__is_directory__(item):
+                    yield self.__load_tree__(item)
+                else:
+                    yield self.__load_file__(item)
+        if self.instrumentation is not None:
+            self.instrumentation.directory_exit(self)
+
+    def __can_walk_into__(self,
+                          item: Union['Tree', TreeItem],
+                          depth: int,
+                          max_depth: Optional[int],
+                          prune: Optional[Callable[['Tree'], bool]]) -> bool:
+        """
+        Check if a non-caching walk should read a subdirectory item found at depth
+        """
+        if not isinstance(item, Tree):
+            return False
+        if max_depth is not None and depth >= max_depth:
+            return False
+        if prune is not None and prune(item):
+            return False
+        return self.__can_descend__(item)
+
+    def walk(self,
+             order: str = 'dfs',
+             max_depth: Optional[int] = None,
+             prune: Optional[Callable[['Tree'], bool]] = None,
+             start_after: Optional[str] = None) -> Iterator[Union['Tree', TreeItem]]:
+        """
+        Walk tree items in depth first ('dfs') or breadth first ('bfs') order without caching
+
+        Items directly in this tree are at depth 1. If max_depth is set, items deeper than
+        max_depth are not returned and directories at max_depth are not read. Each
+        subdirectory is passed to prune before it is read: if prune returns True, the
+        directory is still returned but its contents are skipped. If start_after is a path
+        relative to this tree, a depth first walk resumes after that path.
+        """
+        # pylint: disable=import-outside-toplevel
+        from .walk import TreeWalk
+        return iter(TreeWalk(self, order=order, max_depth=max_depth, prune=prune, start_after=start_after))
+
+    def scan(self) -> Iterator[Union['Tree', TreeItem]]:
+        """
+        Walk tree items recursively in a single pass without caching them
+
+        Items are returned in the same order as when iterating the tree, but loaded items
+        are not stored in the tree and are released as soon as the caller drops them.
+        Memory use depends on the depth of the tree instead of the number of items.
+        Directory names are listed within self.memory_limit, or the default listing memory
+        limit if it is not set.
+        """
+        return self.walk()
 
     @property
     def is_empty(self) -> bool:
@@ -329,26 +610,69 @@ class Tree(pathlib.Path):
         """
         Check if item is excluded
         """
+        if self.instrumentation is not None:
+            self.instrumentation.count(OPERATION_EXCLUDE_MATCH)
         if item.name in self.excluded:
             return True
         if match_path_patterns(self.excluded, self, item.name):
             return True
         return False
 
+    def instrument(self,
+                   instrumentation: Optional['WalkInstrumentation'] = None) -> 'WalkInstrumentation':
+        """
+        Enable instrumentation for walks of this tree
+
+        Counters for filesystem operations, directory listing latencies and callback hooks
+        are collected to the WalkInstrumentation object, which is returned. Instrumentation
+        is passed to all subdirectory trees and file items loaded after this call.
+        """
+        # pylint: disable=import-outside-toplevel
+        from .instrumentation import WalkInstrumentation
+        if instrumentation is None:
+            instrumentation = WalkInstrumentation()
+        self.instrumentation = instrumentation
+        return instrumentation
+
+    def throttle(self,
+                 bytes_per_second: Optional[float] = None,
+                 ops_per_second: Optional[float] = None,
+                 governor: Optional['IOGovernor'] = None) -> 'IOGovernor':
+        """
+        Throttle checksum, diff, copy and sync I/O of this tree with an I/O governor
+
+        A new IOGovernor is created with the limits unless an existing governor is given,
+        so the same governor can be shared by many trees. Limits can be changed later with
+        IOGovernor.set_limits(). Governor is passed to items loaded after this call.
+        """
+        # pylint: disable=import-outside-toplevel
+        from .throttle import IOGovernor
+        if governor is None:
+            governor = IOGovernor(bytes_per_second=bytes_per_second, ops_per_second=ops_per_second)
+        self.governor = governor
+        return governor
+
     def reset(self) -> None:
         """
         Result cached items loaded to the tree
         """
-        self.__items__ = None
-        self.__iter_items__ = None
-        self.__iter_child__ = None
-        self.__iterator__ = None
+        with self.__lock__:
+            self.__items__ = None
+            self.__iter_items__ = None
+            self.__cursor__ = None
 
     def resolve(self, strict: bool = False) -> 'Tree':
         """
         Return correct type of tree from pathlib.Path.resolve() parent method
         """
-        return self.__class__(path=super().resolve(strict), sorted=self.sorted, excluded=self.excluded)
+        return self.__class__(
+            path=super().resolve(strict),
+            sorted=self.sorted,
+            excluded=self.excluded,
+            follow_symlinks=self.follow_symlinks,
+            one_file_system=self.one_file_system,
+            memory_limit=self.memory_limit,
+        )
 
     def create(self, mode: Optional[Union[int, str]] = None):
         """
@@ -416,84 +740,253 @@ class Tree(pathlib.Path):
 
     def diff(self, other: Union[str, 'Tree']) -> Tuple[List[TreeItem], List[TreeItem], List[TreeItem]]:
         """
-        Run simple diff using filecmp.cmp against files in other tree, returning differences in files
-        and files missing from either directory
+        Run simple diff comparing contents of files in other tree, returning differences in files
+        and files missing from either directory. Holes in sparse files are not read, and
+        reads are throttled by the I/O governor of this tree, if set.
 
         Returns three lists with:
         - list of files with differing contents
         - files missing from this tree
         - files missing from other tree
         """
+        # pylint: disable=import-outside-toplevel
+        from .diff import diff_trees
         if not isinstance(other, Tree):
-            other = Tree(str(other), sorted=self.sorted, excluded=self.excluded)
-
-        missing_self = []
-        missing_other = []
-        different = []
-        for item in self:
-            path = other.joinpath(item.relative_to(self))
-            if item.is_dir() or path.is_dir():
-                if item.is_dir() and path.is_file():
-                    missing_self.append(path)
-                if item.is_file() and path.is_dir():
-                    missing_other.append(path)
-            elif path.exists():
-                if not filecmp.cmp(str(item), str(path), shallow=False):
-                    different.append(path)
-            else:
-                missing_other.append(path)
+            other = Tree(
+                str(other),
+                sorted=self.sorted,
+                excluded=self.excluded,
+                follow_symlinks=self.follow_symlinks,
+                one_file_system=self.one_file_system,
+                memory_limit=self.memory_limit,
+            )
+        return diff_trees(self, other)
 
-        for item in other:
-            path = self.joinpath(item.relative_to(other))
-            if item.is_dir() or path.is_dir():
-                if item.is_dir() and path.is_file():
-                    missing_other.append(path)
-                if item.is_file() and path.is_dir():
-                    missing_self.append(path)
-            elif not path.exists():
-                missing_self.append(path)
+    def sync_to(self,
+                target: Union[str, pathlib.Path],
+                delete: bool = False,
+                **kwargs) -> 'SyncResult':  # noqa
+        """
+        Synchronize files in this tree to target directory
 
-        return different, missing_self, missing_other
+        Only changed files are copied. If delete is set, items in target that do not exist
+        in this tree are removed. Extra keyword arguments are passed to TreeSync.
 
+        Returns SyncResult with per file and aggregate copy statistics.
+        """
+        # pylint: disable=import-outside-toplevel
+        from .sync import TreeSync
+        return TreeSync(self, target, delete=delete, **kwargs).run()
 
-class TreeSearch(list):
-    """
-    Chainable tree search results
-    """
-    tree: Tree
+    def usage(self,
+              top: Optional[int] = None,
+              key: str = 'size') -> Union[Dict[str, 'DirectoryUsage'], List['DirectoryUsage']]:  # noqa
+        """
+        Calculate aggregated disk usage for directories in this tree in a single walk
 
-    def __init__(self, tree: Tree, items: List[TreeItem]) -> None:
-        self.tree = tree
-        super().__init__(items)
+        Returns dictionary of DirectoryUsage items with apparent size, allocated blocks and
+        file counts by directory path. If top is set, returns only the top largest
+        directories sorted by key ('size', 'allocated' or 'files') in descending order.
+        """
+        # pylint: disable=import-outside-toplevel
+        from .usage import TreeUsage
+        return TreeUsage(self, top=top, key=key).run()
 
-    def filter(self,
-               patterns: Union[str, List[str]] = None,
-               extensions: Optional[List[str]] = None) -> 'TreeSearch':  # noqa
+    def estimate(self, budget: int = 1000, **kwargs) -> 'TreeEstimate':  # noqa
+        """
+        Estimate total files, bytes and file extensions of this tree by random sampling
+
+        Random probes from the root to leaf directories read at most budget directories.
+        Returns TreeEstimate with confidence intervals. Extra keyword arguments are passed
+        to TreeEstimator.
+        """
+        # pylint: disable=import-outside-toplevel
+        from .estimate import TreeEstimator
+        return TreeEstimator(self, budget=budget, **kwargs).run()
+
+    def path_store(self, **kwargs) -> 'PathStore':  # noqa
+        """
+        Return front coded PathStore of relative paths of this tree in sorted walk order
+
+        Items are walked without caching them. Paths are always sorted by store key, because
+        walk order compares names as strings and differs from key byte order for names that
+        are not valid UTF-8. Extra keyword arguments are passed to PathStore.from_paths().
+        """
+        # pylint: disable=import-outside-toplevel
+        from .pathstore import PathStore
+        return PathStore.from_paths((str(item.relative_to(self)) for item in self.walk()), **kwargs)
+
+    def membership_filter(self, **kwargs) -> 'MembershipFilter':  # noqa
+        """
+        Return Bloom filter of relative paths of this tree, optionally with file checksums
+
+        Extra keyword arguments are passed to MembershipFilter.from_tree().
+        """
+        # pylint: disable=import-outside-toplevel
+        from .membership import MembershipFilter
+        return MembershipFilter.from_tree(self, **kwargs)
+
+    def scan_parallel(self, workers: Optional[int] = None, **kwargs) -> 'TreeShardScan':  # noqa
         """
-        Match specified patterns from matched items
+        Scan this tree on a process pool with subtrees sharded to worker processes
+
+        Returns TreeShardScan, which iterates compact (path, mode, size, mtime_ns, uid, gid)
+        records in the same order as walk() and merges shards to arrays with to_arrays().
+        Extra keyword arguments are passed to TreeShardScan.
         """
-        if isinstance(extensions, str):
-            extensions = extensions.split(',')
-        if isinstance(patterns, str):
-            patterns = [patterns]
+        # pylint: disable=import-outside-toplevel
+        from .shard import TreeShardScan
+        return TreeShardScan(self, workers=workers, **kwargs)
 
-        matches = []
-        for item in self:
-            if extensions and item.suffix in extensions:
-                matches.append(item)
-            if patterns and match_path_patterns(patterns, self.tree, item):
-                matches.append(item)
-        return self.__class__(self.tree, matches)
+    def chunk_index(self, **kwargs) -> 'ChunkIndex':  # noqa
+        """
+        Split files in this tree to content defined chunks, returning ChunkIndex
 
-    def exclude(self, patterns: Union[str, List[str]] = None) -> 'TreeSearch':
+        Appending or inserting data to a file only changes chunks near the edit, so the
+        index reports dedup ratios and changed byte ranges between versions of the tree.
+        Keyword arguments are passed to TreeChunker.
         """
-        Exclude specified patterns from matched items
+        # pylint: disable=import-outside-toplevel
+        from .chunks import TreeChunker
+        return TreeChunker(self, **kwargs).load()
+
+    def to_arrays(self, use_numpy: Optional[bool] = None, chunks: bool = False) -> 'TreeArrays':  # noqa
         """
-        if isinstance(patterns, str):
-            patterns = [patterns]
+        Return metadata of all items in this tree as columnar arrays
+
+        Columns contain path ids, parent ids, sizes, mtime_ns, uid, gid, mode and item type.
+        Columns are NumPy arrays when NumPy is installed and array.array objects otherwise.
+        Set use_numpy to False to always return array.array columns, or True to require NumPy.
+        With chunks, the ChunkIndex of files is attached to the arrays as chunk_index.
+        """
+        # pylint: disable=import-outside-toplevel
+        from .arrays import TreeArraysLoader
+        arrays = TreeArraysLoader(self, use_numpy=use_numpy).load()
+        if chunks:
+            arrays.chunk_index = self.chunk_index()
+        return arrays
+
+    def write_archive(self, fileobj: BinaryIO, compression: Optional[str] = 'gzip', **kwargs) -> int:
+        """
+        Write items of this tree to a binary file object as a tar stream in walk order
+
+        Compression is 'gzip', 'zstd' or None. Compressed streams are split to blocks that
+        are compressed in parallel. Extra keyword arguments are passed to TreeArchive.
 
-        matches = []
-        for item in self:
-            if not match_path_patterns(patterns, self.tree, item):
-                matches.append(item)
-        return self.__class__(self.tree, matches)
+        Returns number of items archived.
+        """
+        # pylint: disable=import-outside-toplevel
+        from .archive import TreeArchive
+        return TreeArchive(self, compression=compression, **kwargs).write(fileobj)
+
+    # pylint: disable=redefined-builtin
+    def write_manifest(self,
+                       filedescriptor: TextIO,
+                       format: str = 'ndjson',
+                       fields: Optional[List[str]] = None,
+                       **kwargs) -> int:
+        """
+        Write manifest of files in this tree to a text file object as a stream
+
+        Supported formats are 'ndjson', 'csv' and 'sha256sum'. Checksums are calculated in
+        parallel while records are written in tree walk order. Extra keyword arguments are
+        passed to TreeManifest. Manifests can be read back with manifest.read_manifest().
+
+        Returns number of records written.
+        """
+        # pylint: disable=import-outside-toplevel
+        from .manifest import TreeManifest
+        return TreeManifest(self, fields=fields, **kwargs).write(filedescriptor, format=format)
+
+    def verify(self,
+               manifest: Union[str, pathlib.Path, TextIO],
+               fail_fast: bool = False,
+               **kwargs) -> Iterator['VerifyResult']:  # noqa
+        """
+        Verify files in this tree against a checksum manifest, like sha256sum -c
+
+        Manifest is a path or text file object, by default in sha256sum or md5sum format.
+        Files are verified in parallel and VerifyResult items for matching, mismatched,
+        missing and extra files are yielded as they are available. If fail_fast is set,
+        iteration stops at the first failure. Extra keyword arguments are passed to TreeVerify.
+        """
+        # pylint: disable=import-outside-toplevel
+        from .verify import TreeVerify
+        return iter(TreeVerify(self, manifest, fail_fast=fail_fast, **kwargs))
+
+    def duplicates(self, **kwargs) -> Iterator['DuplicateGroup']:  # noqa
+        """
+        Iterate groups of files with identical contents in this tree
+
+        Files are compared by size, partial checksums and finally full checksums, so only
+        files with colliding sizes and partial checksums are read completely. Hard links to
+        the same inode are counted once. Keyword arguments are passed to TreeDuplicates.
+        """
+        # pylint: disable=import-outside-toplevel
+        from .duplicates import TreeDuplicates
+        return iter(TreeDuplicates(self, **kwargs))
+
+    def dedupe(self,
+               hardlink: bool = False,
+               algorithm: str = DEFAULT_CHECKSUM,
+               dry_run: bool = False) -> 'DedupeResult':  # noqa
+        """
+        Replace identical files in this tree with reflinks, or hard links if hardlink is set
+
+        Files are matched by size and checksum. Files that can not be linked, for example on
+        filesystems without reflink support, are left untouched.
+
+        Returns DedupeResult with linked and skipped files.
+        """
+        # pylint: disable=import-outside-toplevel
+        from .dedupe import TreeDedupe
+        return TreeDedupe(self, hardlink=hardlink, algorithm=algorithm, dry_run=dry_run).run()
+
+
+class TreeIterator:
+    """
+    Independent cursor for walking tree items recursively
+
+    Tree is walked depth first. If tree.sorted is set, Tree items are sorted
+    before iterating. Symbolic links to directories are followed if tree.follow_symlinks
+    is set, and other filesystems are not entered if tree.one_file_system is set.
+
+    Items of each directory are loaded and cached by the directory tree, but the iteration
+    state is kept in the cursor, so multiple cursors can walk the same tree concurrently.
+    If tree.memory_limit is set, directories with more entry names than fit in the limit
+    are streamed by the cursor without caching, using an external merge sort if sorted.
+    """
+    tree: Tree
+
+    def __init__(self, tree: Tree) -> None:
+        self.tree = tree
+        self.__items__ = None
+        self.__child__ = None
+
+    def __repr__(self) -> str:
+        return f'<{self.__class__.__name__} {self.tree}>'
+
+    def __iter__(self) -> 'TreeIterator':
+        return self
+
+    def __next__(self) -> Union[Tree, TreeItem]:
+        tree = self.tree
+        if self.__items__ is None:
+            self.__items__ = tree.__load_items__()
+        if self.__child__ is not None:
+            try:
+                return next(self.__child__)
+            except StopIteration:
+                self.__child__ = None
+
+        try:
+            item = next(self.__items__)
+        except StopIteration:
+            if tree.instrumentation is not None:
+                tree.instrumentation.directory_exit(tree)
+            raise
+        if isinstance(item, Tree) and tree.__can_descend__(item):
+            self.__child__ = TreeIterator(item)
+        if tree.instrumentation is not None:
+            tree.instrumentation.item(item)
+        return item
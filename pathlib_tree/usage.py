@@ -0,0 +1,159 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Disk usage of directories in filesystem trees
+"""
+import heapq
+import itertools
+import os
+
+from typing import Dict, List, Optional, Union
+
+from .exceptions import FilesystemError
+from .listing import scan_directory_entries
+from .sparse import STAT_BLOCK_SIZE
+
+#: Valid sort keys for largest directories
+USAGE_SORT_KEYS = ('size', 'allocated', 'files')
+
+
+class DirectoryUsage:
+    """
+    Aggregated disk usage of a directory, including all subdirectories
+    """
+    path: str
+    size: int
+    blocks: int
+    files: int
+    directories: int
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.size = 0
+        self.blocks = 0
+        self.files = 0
+        self.directories = 0
+
+    def __repr__(self) -> str:
+        return f'{self.path} {self.size} bytes {self.files} files'
+
+    @property
+    def allocated(self) -> int:
+        """
+        Return allocated disk space in bytes
+        """
+        return self.blocks * STAT_BLOCK_SIZE
+
+    def add_stat(self, item_stat: os.stat_result) -> None:
+        """
+        Add size and blocks from stat result
+        """
+        self.size += item_stat.st_size
+        self.blocks += getattr(item_stat, 'st_blocks', 0)
+
+    def add_usage(self, usage: 'DirectoryUsage') -> None:
+        """
+        Add totals of a subdirectory
+        """
+        self.size += usage.size
+        self.blocks += usage.blocks
+        self.files += usage.files
+        self.directories += usage.directories + 1
+
+
+class TreeUsage:
+    """
+    Calculate disk usage of all directories in a tree in a single bottom-up pass
+
+    Each entry is stat'ed once and hard linked files are counted only for the first path
+    seen in walk order. Symbolic links are never followed, and other filesystems are
+    skipped if one_file_system is set for the tree. If top is set, only the largest
+    directories are kept in a bounded heap.
+    """
+    tree: 'Tree'  # noqa
+    top: Optional[int]
+    key: str
+
+    def __init__(self, tree: 'Tree', top: Optional[int] = None, key: str = 'size') -> None:  # noqa
+        if key not in USAGE_SORT_KEYS:
+            raise FilesystemError(f'Unexpected usage sort key: {key}')
+        self.tree = tree
+        self.top = top
+        self.key = key
+        self.__heap__ = []
+        self.__counter__ = itertools.count()
+        self.__totals__ = {}
+
+    def __finish__(self, usage: DirectoryUsage) -> None:
+        """
+        Store totals for a completed directory
+        """
+        if self.top is None:
+            self.__totals__[usage.path] = usage
+            return
+        value = (getattr(usage, self.key), next(self.__counter__), usage)
+        if len(self.__heap__) < self.top:
+            heapq.heappush(self.__heap__, value)
+        elif value[0] > self.__heap__[0][0]:
+            heapq.heapreplace(self.__heap__, value)
+
+    def __walk__(self) -> None:
+        """
+        Walk the tree depth first, merging directory totals to parents when completed
+        """
+        inodes = set()
+        root_stat = os.lstat(self.tree)
+        root = DirectoryUsage(str(self.tree))
+        root.add_stat(root_stat)
+        stack = [(root, scan_directory_entries(str(self.tree), self.tree.sorted))]
+        try:
+            while stack:
+                usage, entries = stack[-1]
+                entry = next(entries, None)
+                if entry is None:
+                    entries.close()
+                    stack.pop()
+                    self.__finish__(usage)
+                    if stack:
+                        stack[-1][0].add_usage(usage)
+                    continue
+                if self.tree.is_excluded(entry):
+                    continue
+
+                entry_stat = entry.stat(follow_symlinks=False)
+                if entry.is_dir(follow_symlinks=False):
+                    if self.tree.one_file_system and entry_stat.st_dev != root_stat.st_dev:
+                        continue
+                    child = DirectoryUsage(entry.path)
+                    child.add_stat(entry_stat)
+                    stack.append((child, scan_directory_entries(entry.path, self.tree.sorted)))
+                    continue
+
+                if entry_stat.st_nlink > 1:
+                    inode = (entry_stat.st_dev, entry_stat.st_ino)
+                    if inode in inodes:
+                        continue
+                    inodes.add(inode)
+                usage.files += 1
+                usage.add_stat(entry_stat)
+        finally:
+            for _usage, entries in stack:
+                entries.close()
+
+    def run(self) -> Union[Dict[str, DirectoryUsage], List[DirectoryUsage]]:
+        """
+        Calculate directory usage
+
+        Returns dictionary of DirectoryUsage items by path, or list of largest directories
+        in descending order if top is set.
+        """
+        try:
+            self.__walk__()
+        except OSError as error:
+            raise FilesystemError(f'Error calculating usage for {self.tree}: {error}') from error
+        if self.top is None:
+            return self.__totals__
+        return [usage for _value, _count, usage in sorted(self.__heap__, reverse=True)]
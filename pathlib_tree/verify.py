@@ -0,0 +1,292 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Verification of filesystem trees against checksum manifests
+"""
+import os
+import pathlib
+import stat
+
+from collections import Counter
+from concurrent.futures import wait, FIRST_COMPLETED, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple, Union
+
+from .checkpoint import load_checkpoint, Checkpoint, CHECKPOINT_OPERATION_VERIFY
+from .checksum import file_checksum, validate_checksum_algorithm, DEFAULT_FILE_CHECKSUM_BLOCK_SIZE
+from .exceptions import FilesystemError
+from .manifest import read_manifest, MANIFEST_FORMAT_CHECKSUM, DEFAULT_MANIFEST_WORKERS
+
+#: Verification result states
+VERIFY_OK = 'ok'
+VERIFY_MISMATCH = 'mismatch'
+VERIFY_MISSING = 'missing'
+VERIFY_EXTRA = 'extra'
+VERIFY_ERROR = 'error'
+
+#: Checksum algorithms detected from hex digest length when manifest does not name them
+CHECKSUM_DIGEST_LENGTHS = {
+    32: 'md5',
+    40: 'sha1',
+    56: 'sha224',
+    64: 'sha256',
+    96: 'sha384',
+    128: 'sha512',
+}
+#: Number of pending file checksums per worker when verifying files
+VERIFY_QUEUE_DEPTH = 8
+
+
+# pylint: disable=too-few-public-methods
+class VerifyResult:
+    """
+    Verification result for a single file
+    """
+    path: str
+    status: str
+    expected: Optional[str]
+    actual: Optional[str]
+    error: Optional[str]
+
+    def __init__(self,
+                 path: str,
+                 status: str,
+                 expected: Optional[str] = None,
+                 actual: Optional[str] = None,
+                 error: Optional[str] = None) -> None:
+        self.path = path
+        self.status = status
+        self.expected = expected
+        self.actual = actual
+        self.error = error
+
+    def __repr__(self) -> str:
+        return f'{self.path}: {self.status}'
+
+    @property
+    def passed(self) -> bool:
+        """
+        Check if file matched the manifest
+        """
+        return self.status == VERIFY_OK
+
+
+class TreeVerify:
+    """
+    Verify files in a tree against a checksum manifest, like sha256sum -c
+
+    Manifest can be a path or a text file object in any format read by read_manifest(),
+    including GNU and BSD style checksum files. Algorithm is detected from BSD style tags or
+    the digest length unless given. Files are checksummed on a thread pool in inode order to
+    reduce seeking on rotating disks, and results are yielded as they complete. Files missing
+    from the tree are reported first, and files in the tree that are not in the manifest are
+    reported last as extra if extra is set.
+
+    If checkpoint is set, the last file in inode order for which all preceding files have
+    been verified is saved periodically, with counts of results by status for those files.
+    Verification with the same checkpoint resumes after that file, and the checkpoint is
+    removed when all results have been returned.
+    """
+    tree: 'Tree'  # noqa
+    manifest: Union[str, pathlib.Path, TextIO]
+    format: str
+    algorithm: Optional[str]
+    workers: int
+    fail_fast: bool
+    extra: bool
+    block_size: int
+    checkpoint: Optional[Checkpoint]
+
+    # pylint: disable=redefined-builtin,too-many-arguments
+    def __init__(self,
+                 tree: 'Tree',  # noqa
+                 manifest: Union[str, pathlib.Path, TextIO],
+                 format: str = MANIFEST_FORMAT_CHECKSUM,
+                 algorithm: Optional[str] = None,
+                 workers: int = DEFAULT_MANIFEST_WORKERS,
+                 fail_fast: bool = False,
+                 extra: bool = True,
+                 block_size: int = DEFAULT_FILE_CHECKSUM_BLOCK_SIZE,
+                 checkpoint: Optional[Union[str, pathlib.Path, Checkpoint]] = None) -> None:
+        if algorithm is not None:
+            validate_checksum_algorithm(algorithm)
+        self.tree = tree
+        self.manifest = manifest
+        self.format = format
+        self.algorithm = algorithm
+        self.workers = max(1, workers)
+        self.fail_fast = fail_fast
+        self.extra = extra
+        self.block_size = block_size
+        self.checkpoint = load_checkpoint(checkpoint)
+
+    def __detect_algorithm__(self, record: Dict[str, str]) -> str:
+        """
+        Return checksum algorithm for a manifest record
+        """
+        if self.algorithm is not None:
+            return self.algorithm
+        algorithm = record.get('algorithm')
+        if algorithm is None:
+            algorithm = CHECKSUM_DIGEST_LENGTHS.get(len(record['checksum']))
+        try:
+            validate_checksum_algorithm(algorithm)
+        except FilesystemError as error:
+            raise FilesystemError(f'Unexpected checksum for {record["path"]}: {record["checksum"]}') from error
+        return algorithm
+
+    def __read_records__(self) -> Iterator[Dict[str, str]]:
+        """
+        Iterate records with checksums from the manifest
+        """
+        if isinstance(self.manifest, (str, pathlib.Path)):
+            try:
+                with open(self.manifest, 'r', encoding='utf-8') as filedescriptor:
+                    yield from read_manifest(filedescriptor, format=self.format)
+            except OSError as error:
+                raise FilesystemError(f'Error reading manifest {self.manifest}: {error}') from error
+        else:
+            yield from read_manifest(self.manifest, format=self.format)
+
+    def __load_manifest__(self) -> Tuple[List[Tuple[int, int, str, str, str]], List[VerifyResult]]:
+        """
+        Load manifest records, returning files to checksum in inode order and missing files
+        """
+        files = []
+        missing = []
+        for record in self.__read_records__():
+            if not record.get('checksum'):
+                raise FilesystemError(f'No checksum for {record["path"]} in manifest')
+            algorithm = self.__detect_algorithm__(record)
+            checksum = record['checksum'].lower()
+            path = os.path.normpath(record['path'])
+            try:
+                item_stat = os.stat(os.path.join(self.tree, path))
+            except FileNotFoundError:
+                missing.append(VerifyResult(path, VERIFY_MISSING, expected=checksum))
+                continue
+            except OSError as error:
+                raise FilesystemError(f'Error reading {path} in {self.tree}: {error}') from error
+            files.append((item_stat.st_dev, item_stat.st_ino, path, checksum, algorithm))
+        files.sort()
+        return files, missing
+
+    def __verify_file__(self, path: str, expected: str, algorithm: str) -> VerifyResult:
+        """
+        Verify checksum of a single file
+        """
+        try:
+            actual = file_checksum(os.path.join(self.tree, path), algorithm, self.block_size, self.tree.governor)
+        except OSError as error:
+            return VerifyResult(path, VERIFY_ERROR, expected=expected, error=str(error))
+        status = VERIFY_OK if actual == expected else VERIFY_MISMATCH
+        return VerifyResult(path, status, expected=expected, actual=actual)
+
+    def __resume__(self, files: List[Tuple[int, int, str, str, str]]) -> Tuple[List[Tuple], Counter]:
+        """
+        Load checkpoint, returning files not verified before it and result counts by status
+        """
+        if self.checkpoint.resume(CHECKPOINT_OPERATION_VERIFY, self.tree) is None:
+            return files, Counter()
+        try:
+            key = tuple(self.checkpoint.state['key'])
+            counts = Counter(self.checkpoint.state['counts'])
+        except KeyError as error:
+            raise FilesystemError(f'Invalid verify checkpoint {self.checkpoint}: missing {error}') from error
+        return [item for item in files if item[:3] > key], counts
+
+    def __iter_completed__(self,
+                           executor: ThreadPoolExecutor,
+                           files: List[Tuple[int, int, str, str, str]]) -> Iterator[Tuple[int, VerifyResult]]:
+        """
+        Verify files on executor, yielding indexes and results as they complete
+
+        At most VERIFY_QUEUE_DEPTH files per worker are pending at a time. Pending files are
+        cancelled when the iterator is closed.
+        """
+        futures = {}
+        submitted = 0
+        try:
+            while submitted < len(files) or futures:
+                while submitted < len(files) and len(futures) < self.workers * VERIFY_QUEUE_DEPTH:
+                    _device, _inode, path, expected, algorithm = files[submitted]
+                    futures[executor.submit(self.__verify_file__, path, expected, algorithm)] = submitted
+                    submitted += 1
+                done, _pending = wait(futures, return_when=FIRST_COMPLETED)
+                for future in sorted(done, key=futures.get):
+                    yield futures.pop(future), future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def __iter_checksums__(self, files: List[Tuple[int, int, str, str, str]]) -> Iterator[VerifyResult]:
+        """
+        Verify files in parallel, yielding results as they complete and saving checkpoints
+        """
+        counts = Counter()
+        if self.checkpoint is not None:
+            files, counts = self.__resume__(files)
+        completed = {}
+        verified = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = self.__iter_completed__(executor, files)
+            try:
+                for index, result in results:
+                    yield result
+                    if self.fail_fast and not result.passed:
+                        return
+                    if self.checkpoint is None:
+                        continue
+                    completed[index] = result.status
+                    while verified in completed:
+                        counts[completed.pop(verified)] += 1
+                        verified += 1
+                    if verified and self.checkpoint.due():
+                        device, inode, path, _expected, _algorithm = files[verified - 1]
+                        self.checkpoint.save(path, {'key': [device, inode, path], 'counts': dict(counts)})
+            finally:
+                results.close()
+
+    def __iter_extra__(self, paths: set) -> Iterator[VerifyResult]:
+        """
+        Iterate regular files in tree that are not listed in the manifest
+        """
+        manifest = None
+        if isinstance(self.manifest, (str, pathlib.Path)):
+            manifest = os.path.abspath(self.manifest)
+        prefix_length = len(str(self.tree).rstrip(os.sep)) + 1
+        for item in self.tree.walk():
+            path = str(item)[prefix_length:]
+            if path in paths or os.path.abspath(item) == manifest:
+                continue
+            if stat.S_ISREG(os.lstat(item).st_mode):
+                yield VerifyResult(path, VERIFY_EXTRA)
+
+    def __iter__(self) -> Iterator[VerifyResult]:
+        """
+        Iterate verification results as they are available
+
+        Iteration stops after first failed result if fail_fast is set.
+        """
+        files, missing = self.__load_manifest__()
+        for result in missing:
+            yield result
+            if self.fail_fast:
+                return
+
+        for result in self.__iter_checksums__(files):
+            yield result
+            if self.fail_fast and not result.passed:
+                return
+
+        if self.extra:
+            paths = set(path for _device, _inode, path, _expected, _algorithm in files)
+            paths.update(result.path for result in missing)
+            for result in self.__iter_extra__(paths):
+                yield result
+                if self.fail_fast:
+                    return
+        if self.checkpoint is not None:
+            self.checkpoint.remove()
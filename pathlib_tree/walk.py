@@ -0,0 +1,112 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Non-caching depth first and breadth first walks of filesystem trees
+"""
+from collections import deque
+from pathlib import PurePath
+from typing import Callable, Iterator, Optional, Tuple, Union
+
+from .exceptions import FilesystemError
+
+#: Supported orders for Tree.walk()
+WALK_ORDER_DFS = 'dfs'
+WALK_ORDER_BFS = 'bfs'
+WALK_ORDERS = (WALK_ORDER_DFS, WALK_ORDER_BFS)
+
+
+class TreeWalk:
+    """
+    Walk tree items in depth first or breadth first order without caching them
+
+    Items directly in the tree are at depth 1. If max_depth is set, directories at
+    max_depth are not read. Each subdirectory is passed to prune before it is read, and
+    its contents are skipped if prune returns True.
+
+    If start_after is set to a path relative to the tree, a depth first walk of a sorted
+    tree returns only items after that path. Subdirectories before the path are skipped
+    without reading them, so an interrupted walk can be resumed from a checkpoint.
+    """
+    tree: 'Tree'  # noqa
+    order: str
+    max_depth: Optional[int]
+    prune: Optional[Callable[['Tree'], bool]]  # noqa
+    start_after: Optional[Tuple[str, ...]]
+
+    def __init__(self,
+                 tree: 'Tree',  # noqa
+                 order: str = WALK_ORDER_DFS,
+                 max_depth: Optional[int] = None,
+                 prune: Optional[Callable[['Tree'], bool]] = None,  # noqa
+                 start_after: Optional[str] = None) -> None:
+        if order not in WALK_ORDERS:
+            raise FilesystemError(f'Unexpected walk order: {order}')
+        if start_after is not None:
+            if order != WALK_ORDER_DFS or not tree.sorted:
+                raise FilesystemError('Walk can only start after a path in depth first walks of sorted trees')
+            parts = PurePath(start_after).parts
+            if not parts or PurePath(start_after).is_absolute() or '..' in parts:
+                raise FilesystemError(f'Invalid path to start walk after: {start_after}')
+            start_after = parts
+        self.tree = tree
+        self.order = order
+        self.max_depth = max_depth
+        self.prune = prune
+        self.start_after = start_after
+
+    def __item__(self, item: Union['Tree', 'TreeItem']) -> None:  # noqa
+        """
+        Record a walked item to tree instrumentation
+        """
+        if self.tree.instrumentation is not None:
+            self.tree.instrumentation.item(item)
+
+    def __iter_dfs__(self) -> Iterator[Union['Tree', 'TreeItem']]:  # noqa
+        """
+        Walk tree depth first
+
+        Each stack entry has the remaining parts of start_after for the directory, or None
+        if all items in the directory are returned.
+        """
+        stack = [(self.tree, self.tree.__scan_directory__(), self.start_after)]
+        try:
+            while stack:
+                parent, items, parts = stack[-1]
+                item = next(items, None)
+                if item is None:
+                    stack.pop()
+                    continue
+                if parts is not None and item.name <= parts[0]:
+                    if item.name == parts[0] and parent.__can_walk_into__(item, len(stack), self.max_depth, None):
+                        stack.append((item, item.__scan_directory__(), parts[1:] or None))
+                    continue
+                self.__item__(item)
+                yield item
+                if parent.__can_walk_into__(item, len(stack), self.max_depth, self.prune):
+                    stack.append((item, item.__scan_directory__(), None))
+        finally:
+            for _parent, items, _parts in stack:
+                items.close()
+
+    def __iter_bfs__(self) -> Iterator[Union['Tree', 'TreeItem']]:  # noqa
+        """
+        Walk tree breadth first
+        """
+        queue = deque([(self.tree, 1)])
+        while queue:
+            parent, depth = queue.popleft()
+            for item in parent.__scan_directory__():
+                self.__item__(item)
+                yield item
+                if parent.__can_walk_into__(item, depth, self.max_depth, self.prune):
+                    queue.append((item, depth + 1))
+
+    def __iter__(self) -> Iterator[Union['Tree', 'TreeItem']]:  # noqa
+        if self.max_depth is not None and self.max_depth < 1:
+            return iter(())
+        if self.order == WALK_ORDER_BFS:
+            return self.__iter_bfs__()
+        return self.__iter_dfs__()
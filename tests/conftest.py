@@ -6,12 +6,18 @@
 """
 Pytest configuration for all tests
 """
+import os
+
 from pathlib import Path
 from typing import Iterator, List
 
 import pytest
 
 MOCK_DATA = Path(__file__).parent.joinpath('mock')
+TEST_FILE_DATA = os.urandom(2**16 + 123)
+LARGE_DIRECTORY_FILE_COUNT = 200
+SPARSE_FILE_SIZE = 2**26
+SPARSE_FILE_DATA_OFFSETS = (2**20, 2**25, 2**26 - 2**17)
 
 
 @pytest.fixture(autouse=True)
@@ -20,3 +26,41 @@ def common_fixtures(cli_mock_argv) -> Iterator[List[str]]:
     Wrap cli_mock_argv to be used in all tests
     """
     yield cli_mock_argv
+
+
+@pytest.fixture
+def mock_data_file(tmpdir) -> Iterator[Path]:
+    """
+    Return file with random test data and fixed mode and timestamps
+    """
+    path = Path(tmpdir, 'source')
+    path.write_bytes(TEST_FILE_DATA)
+    path.chmod(0o640)
+    os.utime(path, ns=(1_000_000_000, 2_000_000_000))
+    yield path
+
+
+@pytest.fixture
+def large_directory(tmpdir) -> Iterator[Path]:
+    """
+    Return directory with many empty files created in non-sorted order
+    """
+    path = Path(tmpdir, 'large')
+    path.mkdir()
+    for index in range(LARGE_DIRECTORY_FILE_COUNT):
+        path.joinpath(f'file-{(index * 7919) % LARGE_DIRECTORY_FILE_COUNT:04d}').write_bytes(b'')
+    yield path
+
+
+@pytest.fixture
+def mock_sparse_file(tmpdir) -> Iterator[Path]:
+    """
+    Return sparse file with small data extents separated by large holes
+    """
+    path = Path(tmpdir, 'sparse')
+    with path.open('wb') as filedescriptor:
+        filedescriptor.truncate(SPARSE_FILE_SIZE)
+        for offset in SPARSE_FILE_DATA_OFFSETS:
+            filedescriptor.seek(offset)
+            filedescriptor.write(TEST_FILE_DATA)
+    yield path
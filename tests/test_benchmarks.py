@@ -0,0 +1,97 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for benchmark tree generators and runner
+"""
+from pathlib import Path
+
+from benchmarks.generators import generate_deep_tree, generate_exclude_patterns
+from benchmarks.importtime import loaded_lazy_modules, measure_import_time
+from benchmarks.runner import compare_results, load_results, run_benchmarks, save_results
+
+
+def test_benchmark_generators_reproducible(tmpdir) -> None:
+    """
+    Test generated trees are identical for same seed
+    """
+    first = generate_deep_tree(Path(tmpdir, 'first'))
+    second = generate_deep_tree(Path(tmpdir, 'second'))
+    first_files = sorted(path.relative_to(first) for path in first.rglob('*'))
+    second_files = sorted(path.relative_to(second) for path in second.rglob('*'))
+    assert first_files == second_files
+    for path in first_files:
+        if first.joinpath(path).is_file():
+            assert first.joinpath(path).read_bytes() == second.joinpath(path).read_bytes()
+    assert generate_exclude_patterns() == generate_exclude_patterns()
+
+
+def test_benchmark_run_and_compare(tmpdir) -> None:
+    """
+    Test running benchmarks, saving results and comparing to baseline
+    """
+    results = run_benchmarks(Path(tmpdir), scenarios=['deep'], operations=['walk', 'diff'], repeat=1,
+                             import_time=False)
+    assert sorted(results['results']) == ['deep/diff', 'deep/walk']
+    for result in results['results'].values():
+        assert result['seconds'] > 0
+        assert result['peak_memory'] > 0
+
+    filename = Path(tmpdir, 'results.json')
+    save_results(results, filename)
+    baseline = load_results(filename)
+    assert compare_results(results, baseline) == []
+
+    for result in baseline['results'].values():
+        result['seconds'] /= 2
+    regressions = compare_results(results, baseline, threshold=0.5)
+    assert sorted(regression['benchmark'] for regression in regressions) == ['deep/diff', 'deep/walk']
+
+
+def test_benchmark_compare_metrics() -> None:
+    """
+    Test comparing all metrics and skipping metrics missing or zero in baseline
+    """
+    results = {'results': {
+        'import/pathlib_tree': {'seconds': 0.1, 'peak_memory': 0},
+        'deep/walk': {'seconds': 1.0, 'peak_memory': 2000},
+        'deep/scan': {'seconds': 1.0, 'peak_memory': 1000},
+        'deep/new': {'seconds': 1.0, 'peak_memory': 1000},
+    }}
+    baseline = {'results': {
+        'import/pathlib_tree': {'seconds': 0.1, 'peak_memory': 0},
+        'deep/walk': {'seconds': 1.0, 'peak_memory': 1000},
+        'deep/scan': {'seconds': 0},
+    }}
+    regressions = compare_results(results, baseline)
+    assert [(regression['benchmark'], regression['metric']) for regression in regressions] == [
+        ('deep/walk', 'peak_memory'),
+    ]
+    assert regressions[0]['ratio'] == 2
+
+
+def test_benchmark_scan_memory(tmpdir) -> None:
+    """
+    Test single pass scan uses less memory than cached walk
+    """
+    results = run_benchmarks(Path(tmpdir), scenarios=['wide'], operations=['walk', 'scan'], repeat=1,
+                             import_time=False)
+    results = results['results']
+    assert results['wide/scan']['peak_memory'] < results['wide/walk']['peak_memory'] / 2
+
+
+def test_benchmark_import_lazy_modules() -> None:
+    """
+    Test importing pathlib_tree does not load modules that are loaded on first use
+    """
+    assert loaded_lazy_modules() == []
+
+
+def test_benchmark_import_time() -> None:
+    """
+    Test measuring pathlib_tree import time
+    """
+    result = measure_import_time(repeat=1)
+    assert result['seconds'] > 0
@@ -0,0 +1,75 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.checkpoint module
+"""
+import json
+
+from pathlib import Path
+
+import pytest
+
+from pathlib_tree.checkpoint import load_checkpoint, Checkpoint
+from pathlib_tree.exceptions import FilesystemError
+
+from .test_throttle import MockClock
+
+
+def test_checkpoint_save_and_resume(tmpdir) -> None:
+    """
+    Test saving a checkpoint and resuming from it
+    """
+    path = Path(tmpdir, 'checkpoint.json')
+    clock = MockClock()
+    checkpoint = Checkpoint(path, interval=10, clock=clock.clock)
+    assert checkpoint.resume('test', '/data') is None
+    assert not checkpoint.due()
+    clock.sleep(10)
+    assert checkpoint.due()
+    checkpoint.save('a/b', {'count': 2})
+    assert not checkpoint.due()
+    assert json.loads(path.read_text(encoding='utf-8'))['last_path'] == 'a/b'
+    assert list(Path(tmpdir).iterdir()) == [path]
+
+    resumed = Checkpoint(path)
+    assert resumed.resume('test', '/data') == 'a/b'
+    assert resumed.state == {'count': 2}
+    resumed.remove()
+    assert not path.exists()
+    assert resumed.last_path == 'a/b'
+    resumed.remove()
+    assert resumed.resume('test', '/data') is None
+
+
+def test_checkpoint_invalid(tmpdir) -> None:
+    """
+    Test resuming from checkpoints for other operations or invalid files
+    """
+    path = Path(tmpdir, 'checkpoint.json')
+    checkpoint = Checkpoint(path)
+    checkpoint.resume('test', '/data')
+    checkpoint.save('a')
+    with pytest.raises(FilesystemError):
+        Checkpoint(path).resume('other', '/data')
+    with pytest.raises(FilesystemError):
+        Checkpoint(path).resume('test', '/other')
+
+    path.write_text('{"version": 0}', encoding='utf-8')
+    with pytest.raises(FilesystemError):
+        Checkpoint(path).resume('test', '/data')
+    path.write_text('invalid', encoding='utf-8')
+    with pytest.raises(FilesystemError):
+        Checkpoint(path).resume('test', '/data')
+
+
+def test_checkpoint_load() -> None:
+    """
+    Test loading checkpoints from paths and objects
+    """
+    assert load_checkpoint(None) is None
+    checkpoint = load_checkpoint('checkpoint.json')
+    assert isinstance(checkpoint, Checkpoint)
+    assert load_checkpoint(checkpoint) is checkpoint
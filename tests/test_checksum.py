@@ -0,0 +1,37 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.checksum module
+"""
+import hashlib
+
+import pytest
+
+from pathlib_tree.checksum import file_checksum, validate_checksum_algorithm
+from pathlib_tree.exceptions import FilesystemError
+from pathlib_tree.throttle import IOGovernor
+
+from .conftest import TEST_FILE_DATA
+
+
+def test_checksum_file_checksum(mock_data_file) -> None:
+    """
+    Test calculating checksum of a file with throttled reads
+    """
+    governor = IOGovernor()
+    assert file_checksum(mock_data_file, 'sha256', block_size=1024, governor=governor) == \
+        hashlib.sha256(TEST_FILE_DATA).hexdigest()
+    assert governor.bytes == len(TEST_FILE_DATA)
+
+
+@pytest.mark.parametrize('algorithm', ('invalid', 'shake_128', 'shake_256'))
+def test_checksum_validate_algorithm_invalid(algorithm) -> None:
+    """
+    Test rejecting unknown and variable length checksum algorithms
+    """
+    with pytest.raises(FilesystemError):
+        validate_checksum_algorithm(algorithm)
+    validate_checksum_algorithm('sha256')
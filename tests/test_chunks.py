@@ -0,0 +1,145 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.chunks module
+"""
+import hashlib
+import io
+import random
+
+from pathlib import Path
+
+import pytest
+
+from pathlib_tree.chunks import ChunkIndex, FileChunker
+from pathlib_tree.exceptions import FilesystemError
+
+from .conftest import SPARSE_FILE_SIZE
+
+CHUNK_TEST_DATA_SIZE = 2**18
+
+
+def random_data(size: int, seed: int = 1) -> bytes:
+    """
+    Return reproducible random bytes
+    """
+    return random.Random(seed).randbytes(size)
+
+
+def write_file(path: Path, data: bytes) -> str:
+    """
+    Write data to a file, returning the path as string
+    """
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_chunks_file_chunker_invalid() -> None:
+    """
+    Test invalid chunker settings
+    """
+    with pytest.raises(FilesystemError):
+        FileChunker(algorithm='invalid')
+    with pytest.raises(FilesystemError):
+        FileChunker(algorithm='shake_128')
+    with pytest.raises(FilesystemError):
+        FileChunker(min_size=100, max_size=10)
+
+
+def test_chunks_file_chunker_chunks(tmp_path) -> None:
+    """
+    Test chunks cover file contents with sizes within limits
+    """
+    data = random_data(CHUNK_TEST_DATA_SIZE)
+    chunker = FileChunker(average_size=2**12, block_size=2**14, use_numpy=False)
+    chunks = chunker.file_chunks(write_file(tmp_path / 'data', data))
+    assert len(chunks) > 8
+    offset = 0
+    for chunk_offset, length, digest in chunks:
+        assert chunk_offset == offset
+        assert chunker.min_size <= length <= chunker.max_size or chunk_offset + length == len(data)
+        assert digest == hashlib.sha256(data[offset:offset + length]).hexdigest()
+        offset += length
+    assert offset == len(data)
+
+    assert chunker.file_chunks(write_file(tmp_path / 'empty', b'')) == []
+
+
+def test_chunks_file_chunker_max_size(tmp_path) -> None:
+    """
+    Test data without boundaries is split at maximum chunk size
+    """
+    chunker = FileChunker(average_size=2**12, min_size=2**10, max_size=2**13, use_numpy=False)
+    chunks = chunker.file_chunks(write_file(tmp_path / 'zeros', bytes(2**15 + 100)))
+    assert [length for _offset, length, _digest in chunks] == [2**13] * 4 + [100]
+
+
+def test_chunks_file_chunker_numpy(tmp_path) -> None:
+    """
+    Test NumPy and pure Python boundary detection return identical chunks
+    """
+    pytest.importorskip('numpy')
+    path = write_file(tmp_path / 'data', random_data(CHUNK_TEST_DATA_SIZE))
+    for block_size in (100, 2**12, 2**20):
+        chunks = FileChunker(average_size=2**11, block_size=block_size, use_numpy=False).file_chunks(path)
+        assert FileChunker(average_size=2**11, block_size=block_size, use_numpy=True).file_chunks(path) == chunks
+
+
+def test_chunks_file_chunker_sparse(mock_sparse_file) -> None:
+    """
+    Test chunking a sparse file
+    """
+    chunks = FileChunker(average_size=2**20).file_chunks(str(mock_sparse_file))
+    assert sum(length for _offset, length, _digest in chunks) == SPARSE_FILE_SIZE
+
+
+def test_chunks_index_changed_ranges(tmp_path) -> None:
+    """
+    Test changed ranges and dedup ratio after inserting and appending data to a file
+    """
+    data = random_data(CHUNK_TEST_DATA_SIZE)
+    chunker = FileChunker(average_size=2**12, use_numpy=False)
+    old = ChunkIndex(chunker.settings, {'file': chunker.file_chunks(write_file(tmp_path / 'old', data))})
+
+    changed = data[:100000] + b'inserted' + data[100000:] + b'appended line\n'
+    new = ChunkIndex(chunker.settings, {
+        'file': chunker.file_chunks(write_file(tmp_path / 'new', changed)),
+        'copy': chunker.file_chunks(write_file(tmp_path / 'copy', changed)),
+    })
+    ranges = new.changed_ranges(old, 'file')
+    assert len(ranges) == 2
+    assert ranges[0][0] <= 100000 < sum(ranges[0])
+    assert sum(ranges[-1]) == len(changed)
+    assert sum(length for _offset, length in ranges) < len(changed) // 4
+
+    assert new.diff(old) == {'file': ranges, 'copy': [(0, len(changed))]}
+    assert new.diff(new) == {}
+    new_chunks = list(new.new_chunks(old))
+    assert {path for path, _offset, _length, _digest in new_chunks} == {'file'}
+    assert sum(length for _path, _offset, length, _digest in new_chunks) == sum(length for _offset, length in ranges)
+    assert new.total_bytes == 2 * len(changed)
+    assert new.unique_bytes == len(changed)
+    assert new.dedup_ratio == 2.0
+    assert ChunkIndex(chunker.settings).dedup_ratio == 1.0
+
+    with pytest.raises(FilesystemError):
+        new.diff(ChunkIndex(FileChunker(average_size=2**13).settings, {'file': []}))
+
+
+def test_chunks_index_write_read() -> None:
+    """
+    Test writing and reading chunk indexes
+    """
+    index = ChunkIndex(FileChunker().settings, {'a': [(0, 10, 'aa'), (10, 5, 'bb')], 'b': []})
+    filedescriptor = io.StringIO()
+    index.write(filedescriptor)
+    filedescriptor.seek(0)
+    loaded = ChunkIndex.read(filedescriptor)
+    assert loaded.settings == index.settings
+    assert loaded.files == index.files
+
+    with pytest.raises(FilesystemError):
+        ChunkIndex.read(io.StringIO('{"settings": {}}\n{"invalid": true}\n'))
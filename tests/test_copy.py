@@ -0,0 +1,230 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.copy module
+"""
+import errno
+import fcntl
+import os
+import stat
+import sys
+
+from pathlib import Path
+
+import pytest
+
+from pathlib_tree.copy import (
+    clone_file,
+    copy_file,
+    is_same_file,
+    COPY_METHOD_BUFFERED,
+    COPY_METHOD_COPY_FILE_RANGE,
+    COPY_METHOD_HARDLINK,
+    COPY_METHOD_REFLINK,
+    COPY_METHOD_SENDFILE,
+    COPY_METHOD_SPARSE,
+    COPY_METHOD_SYMLINK,
+)
+from pathlib_tree.exceptions import FilesystemError
+from pathlib_tree.sparse import is_sparse
+from pathlib_tree.throttle import IOGovernor
+
+from .conftest import SPARSE_FILE_SIZE, TEST_FILE_DATA
+
+
+def unsupported_copy(*args, **kwargs):
+    """
+    Mock kernel copy call not supported for the files
+    """
+    raise OSError(errno.EXDEV, 'Invalid cross-device link')
+
+
+def validate_copy(source: Path, target: Path) -> None:
+    """
+    Validate copied file contents and metadata
+    """
+    assert target.read_bytes() == TEST_FILE_DATA
+    assert stat.S_IMODE(target.stat().st_mode) == stat.S_IMODE(source.stat().st_mode)
+    assert target.stat().st_mtime_ns == source.stat().st_mtime_ns
+
+
+def test_copy_file(mock_data_file) -> None:
+    """
+    Test copying file with default method
+    """
+    target = mock_data_file.parent.joinpath('target')
+    method = copy_file(mock_data_file, target)
+    assert method in (COPY_METHOD_COPY_FILE_RANGE, COPY_METHOD_SENDFILE, COPY_METHOD_BUFFERED)
+    validate_copy(mock_data_file, target)
+
+
+def test_copy_file_fallbacks(monkeypatch, mock_data_file) -> None:
+    """
+    Test copy fallback when kernel assisted copy calls are not supported
+    """
+    target = mock_data_file.parent.joinpath('target')
+    target.write_bytes(b'existing data that is overwritten' * 10000)
+
+    monkeypatch.setattr(os, 'copy_file_range', unsupported_copy)
+    assert copy_file(mock_data_file, target) == COPY_METHOD_SENDFILE
+    validate_copy(mock_data_file, target)
+
+    monkeypatch.setattr(os, 'sendfile', unsupported_copy)
+    assert copy_file(mock_data_file, target) == COPY_METHOD_BUFFERED
+    validate_copy(mock_data_file, target)
+
+
+def test_copy_file_sparse(mock_sparse_file) -> None:
+    """
+    Test copying sparse files preserves holes
+    """
+    if not is_sparse(mock_sparse_file.stat()):
+        pytest.skip('Filesystem does not support sparse files')
+    target = mock_sparse_file.parent.joinpath('target')
+    target.write_bytes(b'existing data that is overwritten' * 10000)
+    assert copy_file(mock_sparse_file, target) == COPY_METHOD_SPARSE
+    assert target.stat().st_size == SPARSE_FILE_SIZE
+    assert target.read_bytes() == mock_sparse_file.read_bytes()
+    assert is_sparse(target.stat())
+    assert target.stat().st_blocks <= mock_sparse_file.stat().st_blocks * 2
+
+
+def test_copy_file_symlink(mock_data_file) -> None:
+    """
+    Test copying symbolic link
+    """
+    link = mock_data_file.parent.joinpath('link')
+    link.symlink_to('source')
+    target = mock_data_file.parent.joinpath('target')
+    assert copy_file(link, target) == COPY_METHOD_SYMLINK
+    assert target.is_symlink()
+    assert os.readlink(target) == 'source'
+
+
+def test_copy_file_missing_source(tmpdir) -> None:
+    """
+    Test copying missing file
+    """
+    with pytest.raises(FilesystemError):
+        copy_file(Path(tmpdir, 'missing'), Path(tmpdir, 'target'))
+
+
+def test_copy_file_reflink_fallback(mock_data_file) -> None:
+    """
+    Test copying file when reflinks are not supported by the filesystem
+    """
+    target = mock_data_file.parent.joinpath('target')
+    try:
+        clone_file(mock_data_file, target.with_name('clone'))
+        expected = COPY_METHOD_REFLINK
+    except OSError:
+        expected = None
+    assert not target.with_name('clone').exists() or expected == COPY_METHOD_REFLINK
+
+    method = copy_file(mock_data_file, target, reflink=True)
+    if expected is not None:
+        assert method == expected
+    else:
+        assert method != COPY_METHOD_REFLINK
+    validate_copy(mock_data_file, target)
+
+
+def test_copy_file_hardlink(monkeypatch, mock_data_file) -> None:
+    """
+    Test copying file as hard link when reflinks are not available
+    """
+    monkeypatch.setattr('pathlib_tree.copy.clone_file', unsupported_copy)
+    target = mock_data_file.parent.joinpath('target')
+    target.write_bytes(b'existing')
+    assert copy_file(mock_data_file, target, hardlink=True) == COPY_METHOD_HARDLINK
+    assert is_same_file(mock_data_file.stat(), target.stat())
+
+
+def test_copy_file_replace_target(mock_data_file) -> None:
+    """
+    Test copying over an existing file replaces it without modifying its other hard links
+    """
+    target = mock_data_file.parent.joinpath('target')
+    target.write_bytes(b'existing')
+    target.chmod(0o604)
+    link = mock_data_file.parent.joinpath('link')
+    os.link(target, link)
+
+    copy_file(mock_data_file, target, preserve=False, reflink=False)
+    assert target.read_bytes() == TEST_FILE_DATA
+    assert link.read_bytes() == b'existing'
+    assert stat.S_IMODE(target.stat().st_mode) == 0o604
+    assert sorted(item.name for item in mock_data_file.parent.iterdir()) == ['link', mock_data_file.name, 'target']
+
+
+def test_copy_file_new_target_mode(mock_data_file) -> None:
+    """
+    Test new files copied without preserving metadata get default permissions with umask
+    """
+    umask = os.umask(0o022)
+    try:
+        target = mock_data_file.parent.joinpath('target')
+        copy_file(mock_data_file, target, preserve=False, reflink=False)
+    finally:
+        os.umask(umask)
+    assert stat.S_IMODE(target.stat().st_mode) == 0o644
+
+
+def test_copy_file_interrupted(monkeypatch, mock_data_file) -> None:
+    """
+    Test failed copy leaves existing target and no partial files
+    """
+    target = mock_data_file.parent.joinpath('target')
+    target.write_bytes(b'existing')
+
+    def failing_copy(*args, **kwargs):
+        raise OSError(errno.EIO, 'Input/output error')
+
+    monkeypatch.setattr('pathlib_tree.copy.copy_file_data', failing_copy)
+    with pytest.raises(FilesystemError):
+        copy_file(mock_data_file, target, reflink=False)
+    assert target.read_bytes() == b'existing'
+    assert sorted(item.name for item in mock_data_file.parent.iterdir()) == [mock_data_file.name, 'target']
+
+
+def test_clone_file_unsupported(monkeypatch, mock_data_file) -> None:
+    """
+    Test failed clone keeps existing target and is not retried between the same devices
+    """
+    if not sys.platform.startswith('linux'):
+        pytest.skip('Reflinks are only supported on Linux')
+    calls = []
+
+    def unsupported_ioctl(*args):
+        calls.append(args)
+        raise OSError(errno.ENOTTY, 'Inappropriate ioctl for device')
+
+    monkeypatch.setattr(fcntl, 'ioctl', unsupported_ioctl)
+    monkeypatch.setattr('pathlib_tree.copy.UNSUPPORTED_REFLINK_DEVICES', set())
+    target = mock_data_file.parent.joinpath('target')
+    target.write_bytes(b'existing')
+    for _attempt in range(2):
+        with pytest.raises(OSError):
+            clone_file(mock_data_file, target)
+    assert len(calls) == 1
+    assert target.read_bytes() == b'existing'
+    assert copy_file(mock_data_file, target) != COPY_METHOD_REFLINK
+    assert len(calls) == 1
+    assert sorted(item.name for item in mock_data_file.parent.iterdir()) == [mock_data_file.name, 'target']
+
+
+def test_copy_file_buffered_throttle(monkeypatch, mock_data_file) -> None:
+    """
+    Test buffered copies charge the governor only for bytes actually read
+    """
+    monkeypatch.delattr(os, 'copy_file_range', raising=False)
+    monkeypatch.delattr(os, 'sendfile', raising=False)
+    target = mock_data_file.parent.joinpath('target')
+    governor = IOGovernor()
+    assert copy_file(mock_data_file, target, reflink=False, governor=governor) == COPY_METHOD_BUFFERED
+    validate_copy(mock_data_file, target)
+    assert governor.bytes == len(TEST_FILE_DATA)
+    assert governor.operations == 1
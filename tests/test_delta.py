@@ -0,0 +1,176 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.delta module
+"""
+import os
+import random
+import zlib
+
+from pathlib import Path
+
+import pytest
+
+from pathlib_tree.delta import (
+    apply_delta,
+    block_signatures,
+    delta_copy_file,
+    DeltaScanner,
+    DELTA_MODE_INPLACE,
+    DELTA_MODE_TEMPFILE,
+)
+from pathlib_tree.exceptions import FilesystemError
+from pathlib_tree.throttle import IOGovernor
+
+DELTA_TEST_BLOCK_SIZE = 2**10
+DELTA_TEST_DATA_SIZE = 2**16
+
+
+def random_data(size: int, seed: int = 1) -> bytes:
+    """
+    Return reproducible random bytes
+    """
+    return random.Random(seed).randbytes(size)
+
+
+def file_signatures(path: Path) -> dict:
+    """
+    Return block signatures of a file
+    """
+    filedescriptor = os.open(path, os.O_RDONLY)
+    try:
+        return block_signatures(filedescriptor, path.stat().st_size, DELTA_TEST_BLOCK_SIZE)
+    finally:
+        os.close(filedescriptor)
+
+
+def test_delta_block_signatures(tmp_path) -> None:
+    """
+    Test block signatures of a file with a trailing partial block
+    """
+    data = random_data(DELTA_TEST_BLOCK_SIZE * 3 + 10)
+    path = tmp_path / 'file'
+    path.write_bytes(data)
+    signatures = file_signatures(path)
+    offsets = sorted(offset for blocks in signatures.values() for _strong, offset in blocks)
+    assert offsets == [0, DELTA_TEST_BLOCK_SIZE, DELTA_TEST_BLOCK_SIZE * 2]
+    assert zlib.adler32(data[:DELTA_TEST_BLOCK_SIZE]) in signatures
+
+
+@pytest.mark.parametrize('use_numpy', (False, True))
+def test_delta_scanner_insert(tmp_path, use_numpy) -> None:
+    """
+    Test finding shifted blocks after inserting data
+    """
+    if use_numpy:
+        pytest.importorskip('numpy')
+    data = random_data(DELTA_TEST_DATA_SIZE)
+    path = tmp_path / 'target'
+    path.write_bytes(data)
+    source = data[:5000] + b'inserted data' + data[5000:]
+
+    scanner = DeltaScanner(file_signatures(path), DELTA_TEST_BLOCK_SIZE, use_numpy=use_numpy)
+    operations = scanner.scan(source)
+    assert sum(length for _offset, length, _target in operations) == len(source)
+    literal = [(offset, length) for offset, length, target in operations if target is None]
+    assert sum(length for _offset, length in literal) < 3 * DELTA_TEST_BLOCK_SIZE
+    for offset, length, target in operations:
+        if target is not None:
+            assert source[offset:offset + length] == data[target:target + length]
+
+    inplace = DeltaScanner(file_signatures(path), DELTA_TEST_BLOCK_SIZE, inplace=True, use_numpy=use_numpy)
+    assert all(target is None or target >= offset for offset, _length, target in inplace.scan(source))
+
+
+def test_delta_scanner_numpy(tmp_path) -> None:
+    """
+    Test NumPy and pure Python rolling checksums find the same blocks
+    """
+    pytest.importorskip('numpy')
+    data = random_data(DELTA_TEST_DATA_SIZE)
+    path = tmp_path / 'target'
+    path.write_bytes(data)
+    source = random_data(777, seed=2) + data[3000:20000] + random_data(100, seed=3) + data[30000:]
+    signatures = file_signatures(path)
+    operations = DeltaScanner(signatures, DELTA_TEST_BLOCK_SIZE, search_window=5000, use_numpy=False).scan(source)
+    assert DeltaScanner(signatures, DELTA_TEST_BLOCK_SIZE, search_window=5000, use_numpy=True).scan(source) \
+        == operations
+
+
+@pytest.mark.parametrize('mode', (DELTA_MODE_INPLACE, DELTA_MODE_TEMPFILE))
+def test_delta_copy_file(tmp_path, mode) -> None:
+    """
+    Test updating a file with delta transfer
+    """
+    data = random_data(DELTA_TEST_DATA_SIZE)
+    target = tmp_path / 'target'
+    target.write_bytes(data)
+    changed = bytearray(data)
+    changed[10000:10010] = b'x' * 10
+    source = tmp_path / 'source'
+    source.write_bytes(bytes(changed) + b'appended')
+
+    governor = IOGovernor()
+    transferred = delta_copy_file(source, target, mode=mode, block_size=DELTA_TEST_BLOCK_SIZE, governor=governor)
+    assert target.read_bytes() == source.read_bytes()
+    assert target.stat().st_mtime_ns == source.stat().st_mtime_ns
+    assert governor.bytes > 0
+    assert transferred == DELTA_TEST_BLOCK_SIZE + len(b'appended')
+    assert sorted(item.name for item in tmp_path.iterdir()) == ['source', 'target']
+
+
+def test_delta_copy_file_tempfile_mode(tmp_path) -> None:
+    """
+    Test replacing target with a new file keeps target mode when metadata is not preserved
+    """
+    data = random_data(DELTA_TEST_DATA_SIZE)
+    target = tmp_path / 'target'
+    target.write_bytes(data)
+    target.chmod(0o604)
+    source = tmp_path / 'source'
+    source.write_bytes(data[:10000] + b'changed' + data[10000:])
+    source.chmod(0o640)
+    delta_copy_file(source, target, mode=DELTA_MODE_TEMPFILE, preserve=False, block_size=DELTA_TEST_BLOCK_SIZE)
+    assert target.read_bytes() == source.read_bytes()
+    assert target.stat().st_mode & 0o777 == 0o604
+
+
+def test_delta_copy_file_truncate(tmp_path) -> None:
+    """
+    Test updating a file in place to a shorter and an empty source
+    """
+    data = random_data(DELTA_TEST_DATA_SIZE)
+    target = tmp_path / 'target'
+    target.write_bytes(data)
+    source = tmp_path / 'source'
+    source.write_bytes(data[2000:20000])
+    delta_copy_file(source, target, mode=DELTA_MODE_INPLACE, block_size=DELTA_TEST_BLOCK_SIZE)
+    assert target.read_bytes() == source.read_bytes()
+
+    source.write_bytes(b'')
+    assert delta_copy_file(source, target, mode=DELTA_MODE_INPLACE, block_size=DELTA_TEST_BLOCK_SIZE) == 0
+    assert target.read_bytes() == b''
+
+
+def test_delta_apply_errors(tmp_path) -> None:
+    """
+    Test errors applying delta operations and updating files
+    """
+    path = tmp_path / 'file'
+    path.write_bytes(b'data')
+    filedescriptor = os.open(path, os.O_RDWR)
+    try:
+        with pytest.raises(FilesystemError):
+            apply_delta([(0, 10, None)], filedescriptor, filedescriptor, filedescriptor)
+    finally:
+        os.close(filedescriptor)
+
+    with pytest.raises(FilesystemError):
+        delta_copy_file(path, tmp_path / 'file', mode='invalid')
+    with pytest.raises(FilesystemError):
+        delta_copy_file(tmp_path / 'missing', path)
+    with pytest.raises(FilesystemError):
+        delta_copy_file(tmp_path, path)
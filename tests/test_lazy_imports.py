@@ -0,0 +1,39 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for lazily loaded pathlib_tree attributes
+"""
+from zoneinfo import ZoneInfo
+
+import pytest
+
+import pathlib_tree
+
+from pathlib_tree import tree
+
+
+def test_lazy_package_attributes() -> None:
+    """
+    Test lazily loaded package attributes
+    """
+    # pylint: disable=import-outside-toplevel
+    from pathlib_tree.sync import TreeSync
+    from pathlib_tree.instrumentation import WalkInstrumentation
+    assert pathlib_tree.TreeSync is TreeSync
+    assert pathlib_tree.WalkInstrumentation is WalkInstrumentation
+    assert pathlib_tree.TreeItem is tree.TreeItem
+    with pytest.raises(AttributeError):
+        pathlib_tree.UnknownAttribute  # pylint: disable=no-member,pointless-statement
+
+
+def test_lazy_default_timezone() -> None:
+    """
+    Test lazily loaded default timezone
+    """
+    assert tree.DEFAULT_TIMEZONE == ZoneInfo('UTC')
+    assert tree.default_timezone() is tree.DEFAULT_TIMEZONE
+    with pytest.raises(AttributeError):
+        tree.UNKNOWN_ATTRIBUTE  # pylint: disable=no-member,pointless-statement
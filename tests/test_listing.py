@@ -0,0 +1,66 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.listing memory bounded directory listings
+"""
+import io
+import os
+
+from pathlib_tree.listing import read_chunk_names, scan_directory_entries, DirectoryListing
+
+from .conftest import LARGE_DIRECTORY_FILE_COUNT
+
+
+def test_listing_read_chunk_names(monkeypatch) -> None:
+    """
+    Test reading names from chunk file with names split across reads
+    """
+    monkeypatch.setattr('pathlib_tree.listing.LISTING_CHUNK_READ_SIZE', 3)
+    chunk = io.BytesIO(b'a\0bbbb\0\xc3\xa4\0')
+    assert list(read_chunk_names(chunk)) == ['a', 'bbbb', '\xe4']
+
+
+def test_listing_small_directory(large_directory) -> None:
+    """
+    Test listing directory that fits in memory limit
+    """
+    listing = DirectoryListing(large_directory).load()
+    assert not listing.is_large
+    names = sorted(os.listdir(large_directory))
+    assert list(listing) == names
+    assert list(listing) == names
+
+
+def test_listing_large_directory_sorted(large_directory) -> None:
+    """
+    Test listing large directory with external merge sort
+    """
+    with DirectoryListing(large_directory, memory_limit=1024) as listing:
+        listing.load()
+        assert listing.is_large
+        names = list(listing)
+    assert names == sorted(os.listdir(large_directory))
+
+
+def test_listing_large_directory_unsorted(large_directory) -> None:
+    """
+    Test listing large directory without sorting
+    """
+    listing = DirectoryListing(large_directory, sorted=False, memory_limit=1024)
+    names = list(listing)
+    assert listing.is_large
+    assert len(names) == LARGE_DIRECTORY_FILE_COUNT
+    assert set(names) == set(os.listdir(large_directory))
+
+
+def test_listing_scan_directory_entries(large_directory) -> None:
+    """
+    Test iterating scandir entries of a directory with and without sorting
+    """
+    names = [entry.name for entry in scan_directory_entries(str(large_directory), sort=True)]
+    assert names == sorted(os.listdir(large_directory))
+    entries = list(scan_directory_entries(str(large_directory)))
+    assert set(entry.name for entry in entries) == set(names)
@@ -0,0 +1,89 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.membership module
+"""
+import pytest
+
+from pathlib_tree.exceptions import FilesystemError
+from pathlib_tree.membership import MEMBERSHIP_FILTER_MAX_HASHES, MembershipFilter
+
+TEST_FILTER_CAPACITY = 10000
+
+
+def test_membership_filter_error_rate() -> None:
+    """
+    Test filter has no false negatives and a false positive rate near the requested rate
+    """
+    membership = MembershipFilter.for_capacity(TEST_FILTER_CAPACITY, error_rate=0.01)
+    for index in range(TEST_FILTER_CAPACITY):
+        membership.add(f'dir{index % 100}/file{index}')
+    assert membership.count == TEST_FILTER_CAPACITY
+    assert all(f'dir{index % 100}/file{index}' in membership for index in range(TEST_FILTER_CAPACITY))
+    false_positives = sum(
+        membership.might_contain(f'other{index % 100}/file{index}') for index in range(TEST_FILTER_CAPACITY)
+    )
+    assert false_positives < TEST_FILTER_CAPACITY * 0.02
+    assert len(membership.to_bytes()) < TEST_FILTER_CAPACITY * 1.3
+
+
+def test_membership_filter_checksums() -> None:
+    """
+    Test filter keys with checksums match only the same path and checksum
+    """
+    membership = MembershipFilter.for_capacity(10, algorithm='sha256')
+    membership.add('file', 'abcd')
+    assert membership.might_contain('file', 'abcd')
+    assert not membership.might_contain('file', 'abce')
+    assert not membership.might_contain('file')
+
+
+def test_membership_filter_serialize(tmp_path) -> None:
+    """
+    Test serializing filters to bytes and files
+    """
+    membership = MembershipFilter.for_capacity(100, algorithm='md5')
+    for index in range(100):
+        membership.add(f'file{index}', f'{index:032x}')
+    path = tmp_path / 'paths.filter'
+    with path.open('wb') as fileobj:
+        membership.write(fileobj)
+    loaded = MembershipFilter.open(path)
+    assert (loaded.bits, loaded.hashes, loaded.count, loaded.algorithm) == \
+        (membership.bits, membership.hashes, 100, 'md5')
+    assert all(loaded.might_contain(f'file{index}', f'{index:032x}') for index in range(100))
+    assert MembershipFilter.from_bytes(MembershipFilter.for_capacity(1).to_bytes()).algorithm is None
+
+
+def test_membership_filter_max_hashes() -> None:
+    """
+    Test hash count is limited for very small error rates so filters can be serialized
+    """
+    membership = MembershipFilter.for_capacity(10, error_rate=1e-100)
+    assert membership.hashes == MEMBERSHIP_FILTER_MAX_HASHES
+    membership.add('file')
+    assert MembershipFilter.from_bytes(membership.to_bytes()).might_contain('file')
+
+
+def test_membership_filter_errors(tmp_path) -> None:
+    """
+    Test errors creating and loading filters
+    """
+    with pytest.raises(FilesystemError):
+        MembershipFilter(0, 1)
+    with pytest.raises(FilesystemError):
+        MembershipFilter(8, MEMBERSHIP_FILTER_MAX_HASHES + 1)
+    with pytest.raises(FilesystemError):
+        MembershipFilter.for_capacity(10, error_rate=1)
+    data = MembershipFilter.for_capacity(10).to_bytes()
+    with pytest.raises(FilesystemError):
+        MembershipFilter.from_bytes(b'PTMF')
+    with pytest.raises(FilesystemError):
+        MembershipFilter.from_bytes(b'XXXX' + data[4:])
+    with pytest.raises(FilesystemError):
+        MembershipFilter.from_bytes(data[:-1])
+    with pytest.raises(FilesystemError):
+        MembershipFilter.open(tmp_path / 'missing')
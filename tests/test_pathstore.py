@@ -0,0 +1,118 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.pathstore module
+"""
+import os
+
+import pytest
+
+from pathlib_tree.exceptions import FilesystemError
+from pathlib_tree.pathstore import path_key, PathStore
+
+TEST_PATHS = [
+    os.path.join('project', f'module{module:02d}', f'file{index:03d}.py')
+    for module in range(10)
+    for index in range(30)
+] + ['project', 'project-old', 'project.txt', 'ääkköset', 'a' * 200]
+
+
+def test_pathstore_path_key() -> None:
+    """
+    Test sort keys order directory contents right after the directory
+    """
+    paths = sorted(['a-b', 'a.txt', os.path.join('a', 'b'), 'a'], key=path_key)
+    assert paths == ['a', os.path.join('a', 'b'), 'a-b', 'a.txt']
+
+
+@pytest.mark.parametrize('block_size', (1, 3, 16, 1000))
+def test_pathstore_lookup(block_size) -> None:
+    """
+    Test iterating, indexing and searching paths in a store
+    """
+    store = PathStore.from_paths(TEST_PATHS, block_size=block_size)
+    expected = sorted(TEST_PATHS, key=path_key)
+    assert len(store) == len(TEST_PATHS)
+    assert list(store) == expected
+    assert store[0] == expected[0]
+    assert store[-1] == expected[-1]
+    for index, path in enumerate(expected):
+        assert store[index] == path
+        assert store.index(path) == index
+        assert path in store
+    for path in ('', 'project0', os.path.join('project', 'module05'), 'zzz', 'a' * 201):
+        assert path not in store
+    with pytest.raises(IndexError):
+        store[len(TEST_PATHS)]  # pylint: disable=expression-not-assigned
+    with pytest.raises(ValueError):
+        store.index('missing')
+
+    module = os.path.join('project', 'module03')
+    assert list(store.iter_prefix(module)) == [path for path in expected if path.startswith(module + os.sep)]
+    assert len(list(store.iter_prefix('project'))) == 300 + 1
+    assert not list(store.iter_prefix('missing'))
+
+
+def test_pathstore_compression() -> None:
+    """
+    Test front coding stores shared path prefixes once per block
+    """
+    store = PathStore.from_paths(TEST_PATHS)
+    assert store.nbytes < sum(len(path.encode()) for path in TEST_PATHS) / 2
+    assert str(store).startswith('PathStore 305 paths')
+
+
+def test_pathstore_empty() -> None:
+    """
+    Test store without paths
+    """
+    store = PathStore.from_paths([])
+    assert not list(store)
+    assert 'missing' not in store
+    assert not list(store.iter_prefix(''))
+    assert not list(PathStore.from_buffer(store.to_bytes()))
+
+
+def test_pathstore_serialize(tmp_path) -> None:
+    """
+    Test serializing a store and opening it as a memory mapped file
+    """
+    store = PathStore.from_paths(TEST_PATHS, block_size=8)
+    loaded = PathStore.from_buffer(store.to_bytes())
+    assert list(loaded) == list(store)
+    assert loaded.block_size == 8
+
+    path = tmp_path / 'paths.store'
+    with path.open('wb') as fileobj:
+        store.write(fileobj)
+    mapped = PathStore.open(path)
+    try:
+        assert list(mapped) == list(store)
+        assert mapped.index(TEST_PATHS[100]) == store.index(TEST_PATHS[100])
+    finally:
+        mapped.close()
+    mapped.close()
+
+
+def test_pathstore_errors(tmp_path) -> None:
+    """
+    Test errors building and loading stores
+    """
+    with pytest.raises(FilesystemError):
+        PathStore.from_paths(['b', 'a'], sort=False)
+    with pytest.raises(FilesystemError):
+        PathStore.from_paths(['b', 'c', 'a', 'd'], block_size=2, sort=False)
+    with pytest.raises(FilesystemError):
+        PathStore.from_paths(['a'], block_size=0)
+    data = PathStore.from_paths(TEST_PATHS).to_bytes()
+    with pytest.raises(FilesystemError):
+        PathStore.from_buffer(b'PTPS')
+    with pytest.raises(FilesystemError):
+        PathStore.from_buffer(b'XXXX' + data[4:])
+    with pytest.raises(FilesystemError):
+        PathStore.from_buffer(data[:-1])
+    with pytest.raises(FilesystemError):
+        PathStore.open(tmp_path / 'missing')
@@ -0,0 +1,129 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.sparse module
+"""
+import errno
+import hashlib
+import os
+import shutil
+
+from pathlib import Path
+
+import pytest
+
+from pathlib_tree.sparse import files_equal, is_sparse, iter_data_extents, iter_file_blocks
+
+from .conftest import SPARSE_FILE_DATA_OFFSETS, SPARSE_FILE_SIZE, TEST_FILE_DATA
+
+
+def require_sparse(path: Path) -> None:
+    """
+    Skip test if the filesystem did not create a sparse file
+    """
+    if not is_sparse(path.stat()):
+        pytest.skip('Filesystem does not support sparse files')
+
+
+def test_sparse_is_sparse(mock_data_file) -> None:
+    """
+    Test detecting sparse files from stat results
+    """
+    assert not is_sparse(mock_data_file.stat())
+
+
+def test_sparse_data_extents(mock_sparse_file) -> None:
+    """
+    Test finding data extents of a sparse file
+    """
+    require_sparse(mock_sparse_file)
+    filedescriptor = os.open(mock_sparse_file, os.O_RDONLY)
+    try:
+        extents = list(iter_data_extents(filedescriptor, SPARSE_FILE_SIZE))
+    finally:
+        os.close(filedescriptor)
+    assert 1 <= len(extents) <= len(SPARSE_FILE_DATA_OFFSETS)
+    for offset in SPARSE_FILE_DATA_OFFSETS:
+        assert any(start <= offset and offset + len(TEST_FILE_DATA) <= start + length for start, length in extents)
+    assert sum(length for _start, length in extents) < SPARSE_FILE_SIZE // 8
+
+
+def test_sparse_data_extents_unsupported(monkeypatch, mock_sparse_file) -> None:
+    """
+    Test whole file is a single extent when SEEK_DATA is not supported
+    """
+    def unsupported_seek(*args, **kwargs):
+        raise OSError(errno.EINVAL, 'Invalid argument')
+
+    monkeypatch.setattr(os, 'lseek', unsupported_seek)
+    filedescriptor = os.open(mock_sparse_file, os.O_RDONLY)
+    try:
+        assert list(iter_data_extents(filedescriptor, SPARSE_FILE_SIZE)) == [(0, SPARSE_FILE_SIZE)]
+    finally:
+        os.close(filedescriptor)
+
+
+def test_sparse_file_blocks(monkeypatch, mock_sparse_file) -> None:
+    """
+    Test file blocks match file contents while reading only data extents from disk
+    """
+    require_sparse(mock_sparse_file)
+    expected = hashlib.sha256(mock_sparse_file.read_bytes()).hexdigest()
+
+    pread = os.pread
+    read_bytes = []
+
+    def counting_pread(filedescriptor, count, offset):
+        data = pread(filedescriptor, count, offset)
+        read_bytes.append(len(data))
+        return data
+
+    monkeypatch.setattr(os, 'pread', counting_pread)
+    checksum = hashlib.sha256()
+    filedescriptor = os.open(mock_sparse_file, os.O_RDONLY)
+    try:
+        for block in iter_file_blocks(filedescriptor, SPARSE_FILE_SIZE):
+            checksum.update(block)
+    finally:
+        os.close(filedescriptor)
+    assert checksum.hexdigest() == expected
+    assert sum(read_bytes) < SPARSE_FILE_SIZE // 8
+
+
+def test_sparse_file_blocks_not_sparse(monkeypatch, mock_data_file) -> None:
+    """
+    Test reading blocks of a file that is not sparse without looking up data extents
+    """
+    def unexpected_seek(*args, **kwargs):
+        raise AssertionError('Unexpected lseek call')
+
+    monkeypatch.setattr(os, 'lseek', unexpected_seek)
+    filedescriptor = os.open(mock_data_file, os.O_RDONLY)
+    try:
+        blocks = list(iter_file_blocks(filedescriptor, len(TEST_FILE_DATA), block_size=1000))
+    finally:
+        os.close(filedescriptor)
+    assert b''.join(blocks) == TEST_FILE_DATA
+    assert max(len(block) for block in blocks) == 1000
+
+
+def test_sparse_files_equal(mock_sparse_file) -> None:
+    """
+    Test comparing sparse files
+    """
+    copy = mock_sparse_file.parent.joinpath('copy')
+    shutil.copyfile(mock_sparse_file, copy)
+    assert files_equal(mock_sparse_file, copy)
+
+    with copy.open('r+b') as filedescriptor:
+        filedescriptor.seek(SPARSE_FILE_SIZE // 2)
+        filedescriptor.write(b'\1')
+    assert not files_equal(mock_sparse_file, copy)
+    assert not files_equal(copy, mock_sparse_file)
+
+    with copy.open('r+b') as filedescriptor:
+        filedescriptor.truncate(SPARSE_FILE_SIZE + 1)
+    assert not files_equal(mock_sparse_file, copy)
@@ -0,0 +1,119 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.throttle I/O governor
+"""
+from typing import List
+
+import pytest
+
+from pathlib_tree.exceptions import FilesystemError
+from pathlib_tree.throttle import IOGovernor
+
+
+class MockClock:
+    """
+    Mock monotonic clock advanced by sleep calls
+    """
+    now: float
+    sleeps: List[float]
+
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self) -> float:
+        """
+        Return current mock time
+        """
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        """
+        Advance mock time
+        """
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def mock_governor(**kwargs) -> IOGovernor:
+    """
+    Return governor using a mock clock
+    """
+    clock = MockClock()
+    return IOGovernor(clock=clock.clock, sleep=clock.sleep, **kwargs)
+
+
+def test_throttle_unlimited() -> None:
+    """
+    Test governor without limits never waits but counts I/O
+    """
+    governor = mock_governor()
+    assert governor.bytes_per_second is None
+    assert governor.ops_per_second is None
+    for _index in range(100):
+        assert governor.consume(2**30) == 0
+    assert governor.bytes == 100 * 2**30
+    assert governor.operations == 100
+    assert governor.waited == 0
+
+
+def test_throttle_bytes_per_second() -> None:
+    """
+    Test bytes per second limit with burst
+    """
+    governor = mock_governor(bytes_per_second=1000, burst=1.0)
+    assert governor.consume(1000) == 0
+    assert governor.consume(500) == pytest.approx(0.5)
+    assert governor.consume(500) == pytest.approx(0.5)
+    assert governor.consume(2000) == pytest.approx(2.0)
+    assert governor.waited == pytest.approx(3.0)
+    assert governor.bytes == 4000
+
+
+def test_throttle_ops_per_second() -> None:
+    """
+    Test operations per second limit
+    """
+    governor = mock_governor(ops_per_second=10, burst=0.1)
+    assert governor.consume(2**20) == 0
+    assert governor.consume(2**20) == pytest.approx(0.1)
+    assert governor.consume(0, operations=5) == pytest.approx(0.5)
+    assert governor.operations == 7
+
+
+def test_throttle_set_limits() -> None:
+    """
+    Test changing limits at runtime
+    """
+    governor = mock_governor(bytes_per_second=100, burst=0)
+    assert governor.consume(100) == pytest.approx(1.0)
+    governor.set_limits(bytes_per_second=1000)
+    assert governor.bytes_per_second == 1000
+    assert governor.consume(100) == pytest.approx(0.1)
+    governor.set_limits(ops_per_second=1)
+    assert governor.bytes_per_second == 1000
+    assert governor.ops_per_second == 1
+    governor.set_limits(bytes_per_second=None)
+    assert governor.bytes_per_second is None
+    assert governor.ops_per_second == 1
+    assert governor.consume(2**30) == pytest.approx(1.0)
+    assert governor.consume(0) == pytest.approx(1.0)
+    governor.set_limits()
+    assert governor.ops_per_second == 1
+    governor.set_limits(ops_per_second=None)
+    assert governor.consume(2**30, operations=100) == 0
+
+
+def test_throttle_invalid_limits() -> None:
+    """
+    Test invalid limits raise FilesystemError
+    """
+    with pytest.raises(FilesystemError):
+        IOGovernor(bytes_per_second=0)
+    governor = IOGovernor()
+    with pytest.raises(FilesystemError):
+        governor.set_limits(ops_per_second=-1)
@@ -0,0 +1,157 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.tree.Tree write_archive() method
+"""
+import gzip
+import io
+import os
+import shutil
+import subprocess
+import tarfile
+
+import pytest
+
+from sys_toolkit.tests.mock import MockException
+
+from pathlib_tree.archive import BlockCompressor, get_compressor
+from pathlib_tree.exceptions import FilesystemError
+from pathlib_tree.tree import Tree
+
+
+def archive_names(data: bytes, mode: str = 'r:gz') -> list:
+    """
+    Return names of members in an archive
+    """
+    with tarfile.open(fileobj=io.BytesIO(data), mode=mode) as archive:
+        return archive.getnames()
+
+
+def walked_paths(tree: Tree) -> list:
+    """
+    Return paths relative to tree in walk order
+    """
+    return [str(item.relative_to(tree)) for item in tree.walk()]
+
+
+def test_tree_write_archive_gzip(mock_test_tree) -> None:
+    """
+    Test writing a tree to a gzip compressed archive in parallel blocks
+    """
+    tree = Tree(mock_test_tree)
+    fileobj = io.BytesIO()
+    assert tree.write_archive(fileobj, block_size=1024, workers=2) == 12
+    data = fileobj.getvalue()
+    assert data.count(b'\x1f\x8b\x08') > 1
+    assert archive_names(data) == walked_paths(tree)
+    with tarfile.open(fileobj=io.BytesIO(data), mode='r:gz') as archive:
+        member = archive.getmember('foo/a')
+        assert archive.extractfile(member).read() == b'\n'
+        assert int(member.mtime) == int(mock_test_tree.joinpath('foo/a').stat().st_mtime)
+
+
+def test_tree_write_archive_tar_command(mock_test_tree, tmpdir) -> None:
+    """
+    Test archives with many gzip members can be read by the tar command
+    """
+    if shutil.which('tar') is None:
+        pytest.skip('tar command not available')
+    path = tmpdir.join('tree.tar.gz')
+    with open(path, 'wb') as fileobj:
+        Tree(mock_test_tree).write_archive(fileobj, block_size=512, workers=3)
+    output = subprocess.check_output(['tar', '-tzf', str(path)], encoding='utf-8')
+    assert [line.rstrip('/') for line in output.splitlines()] == walked_paths(Tree(mock_test_tree))
+
+
+def test_tree_write_archive_uncompressed(mock_test_tree) -> None:
+    """
+    Test writing uncompressed archive honours tree exclusions
+    """
+    tree = Tree(mock_test_tree, excluded=['*.txt'])
+    fileobj = io.BytesIO()
+    assert tree.write_archive(fileobj, compression=None) == 9
+    assert archive_names(fileobj.getvalue(), mode='r:') == walked_paths(tree)
+
+
+def test_tree_write_archive_governor(mock_test_tree) -> None:
+    """
+    Test archiving walks the tree without caching items and throttles file reads
+    """
+    tree = Tree(mock_test_tree)
+    governor = tree.throttle()
+    assert tree.write_archive(io.BytesIO(), compression=None) == 12
+    assert governor.bytes == 9
+    assert tree.__items__ is None
+
+
+def test_tree_write_archive_symlinked_directory(tmpdir) -> None:
+    """
+    Test followed symbolic links to directories are archived as extractable directories
+    """
+    source = tmpdir.mkdir('source')
+    source.mkdir('data').join('file').write('data\n')
+    os.symlink('data', source.join('link'))
+    fileobj = io.BytesIO()
+    Tree(str(source)).write_archive(fileobj, compression=None)
+    target = tmpdir.mkdir('target')
+    with tarfile.open(fileobj=io.BytesIO(fileobj.getvalue()), mode='r:') as archive:
+        assert archive.getmember('link').isdir()
+        archive.extractall(str(target))
+    assert target.join('link', 'file').read() == 'data\n'
+
+    fileobj = io.BytesIO()
+    Tree(str(source), follow_symlinks=False).write_archive(fileobj, compression=None)
+    with tarfile.open(fileobj=io.BytesIO(fileobj.getvalue()), mode='r:') as archive:
+        assert archive.getmember('link').issym()
+
+
+def test_tree_write_archive_search(mock_test_tree) -> None:
+    """
+    Test writing archive of filtered tree items
+    """
+    fileobj = io.BytesIO()
+    assert Tree(mock_test_tree).filter(extensions=['.tst']).write_archive(fileobj) == 3
+    assert archive_names(fileobj.getvalue()) == ['bar/aa.tst', 'bar/bb.tst', 'bar/cc.tst']
+
+
+def test_tree_write_archive_zstd(mock_test_tree) -> None:
+    """
+    Test writing zstd compressed archive
+    """
+    zstandard = pytest.importorskip('zstandard')
+    fileobj = io.BytesIO()
+    Tree(mock_test_tree).write_archive(fileobj, compression='zstd', block_size=1024)
+    reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(fileobj.getvalue()), read_across_frames=True)
+    assert archive_names(reader.read(), mode='r:') == walked_paths(Tree(mock_test_tree))
+
+
+def test_tree_write_archive_errors(monkeypatch, mock_test_tree) -> None:
+    """
+    Test errors writing archives
+    """
+    with pytest.raises(FilesystemError):
+        get_compressor('invalid')
+    with pytest.raises(FilesystemError):
+        Tree(mock_test_tree).write_archive(io.BytesIO(), compression='invalid')
+
+    monkeypatch.setattr(tarfile.TarFile, 'addfile', MockException(OSError))
+    with pytest.raises(FilesystemError):
+        Tree(mock_test_tree).write_archive(io.BytesIO())
+
+
+def test_tree_block_compressor() -> None:
+    """
+    Test block compressor writes blocks in order with bounded pending blocks
+    """
+    fileobj = io.BytesIO()
+    compressor = BlockCompressor(fileobj, get_compressor('gzip', 1), block_size=100, workers=2)
+    data = bytes(range(256)) * 20
+    for offset in range(0, len(data), 77):
+        compressor.write(data[offset:offset + 77])
+    compressor.close()
+    assert gzip.decompress(fileobj.getvalue()) == data
+    assert compressor.bytes_in == len(data)
+    assert compressor.bytes_out == len(fileobj.getvalue())
@@ -0,0 +1,107 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.tree.Tree to_arrays() method
+"""
+import array
+import os
+import sys
+
+import pytest
+
+from pathlib_tree.arrays import TreeArrays, ITEM_TYPE_DIRECTORY, ITEM_TYPE_FILE, ITEM_TYPE_SYMLINK
+from pathlib_tree.exceptions import FilesystemError
+from pathlib_tree.tree import Tree
+
+
+def validate_arrays(path, arrays: TreeArrays) -> None:
+    """
+    Validate tree arrays against items in tree
+    """
+    items = list(Tree(path))
+    assert arrays.paths == [str(item.relative_to(path)) for item in items]
+    assert len(arrays) == len(items)
+    for index, item in enumerate(items):
+        item_stat = os.lstat(item)
+        assert arrays.path_id[index] == index
+        assert arrays.size[index] == item_stat.st_size
+        assert arrays.mtime_ns[index] == item_stat.st_mtime_ns
+        assert arrays.mode[index] == item_stat.st_mode
+        assert arrays.uid[index] == item_stat.st_uid
+        assert arrays.gid[index] == item_stat.st_gid
+        expected_type = ITEM_TYPE_DIRECTORY if item.is_dir() else ITEM_TYPE_FILE
+        assert arrays.type[index] == expected_type
+        parent = str(item.parent.relative_to(path))
+        if parent == '.':
+            assert arrays.parent_id[index] == -1
+        else:
+            assert arrays.paths[arrays.parent_id[index]] == parent
+
+
+def test_tree_to_arrays_array_module(mock_test_tree) -> None:
+    """
+    Test exporting tree metadata as array.array columns
+    """
+    arrays = Tree(mock_test_tree).to_arrays(use_numpy=False)
+    assert isinstance(arrays.size, array.array)
+    validate_arrays(mock_test_tree, arrays)
+    with pytest.raises(AttributeError):
+        arrays.unknown  # pylint: disable=pointless-statement
+
+
+def test_tree_to_arrays_numpy(mock_test_tree) -> None:
+    """
+    Test exporting tree metadata as NumPy columns
+    """
+    numpy = pytest.importorskip('numpy')
+    arrays = Tree(mock_test_tree).to_arrays()
+    assert isinstance(arrays.size, numpy.ndarray)
+    validate_arrays(mock_test_tree, arrays)
+    assert int(arrays.size[arrays.type == ITEM_TYPE_FILE].sum()) == 9
+
+
+def test_tree_to_arrays_empty_and_symlinks(mock_test_tree, tmpdir) -> None:
+    """
+    Test exporting empty tree and tree with symbolic links
+    """
+    empty = Tree(tmpdir.mkdir('empty'))
+    assert len(empty.to_arrays(use_numpy=False)) == 0
+
+    mock_test_tree.joinpath('link').symlink_to('bar')
+    tree = Tree(mock_test_tree, excluded=['foo'], follow_symlinks=False)
+    arrays = tree.to_arrays(use_numpy=False)
+    assert arrays.paths == [str(item.relative_to(tree)) for item in tree.walk()]
+    assert arrays.paths[-1] == 'link'
+    assert arrays.type[-1] == ITEM_TYPE_SYMLINK
+    assert not any(path.startswith('foo') for path in arrays.paths)
+
+    tree = Tree(mock_test_tree, excluded=['foo'])
+    arrays = tree.to_arrays(use_numpy=False)
+    assert arrays.paths == [str(item.relative_to(tree)) for item in tree.walk()]
+    assert os.path.join('link', 'baz', 'd.txt') in arrays.paths
+    assert arrays.type[arrays.paths.index('link')] == ITEM_TYPE_SYMLINK
+
+    mock_test_tree.joinpath('bar', 'loop').symlink_to('..')
+    arrays = tree.to_arrays(use_numpy=False)
+    assert arrays.paths == [str(item.relative_to(tree)) for item in tree.walk()]
+
+
+def test_tree_to_arrays_numpy_empty(tmpdir) -> None:
+    """
+    Test exporting empty tree as NumPy columns
+    """
+    pytest.importorskip('numpy')
+    assert len(Tree(tmpdir.mkdir('empty')).to_arrays()) == 0
+
+
+def test_tree_to_arrays_numpy_missing(monkeypatch, mock_test_tree) -> None:
+    """
+    Test exporting tree metadata when NumPy is not available
+    """
+    monkeypatch.setitem(sys.modules, 'numpy', None)
+    assert isinstance(Tree(mock_test_tree).to_arrays().size, array.array)
+    with pytest.raises(FilesystemError):
+        Tree(mock_test_tree).to_arrays(use_numpy=True)
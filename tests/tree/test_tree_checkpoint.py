@@ -0,0 +1,160 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for resuming pathlib_tree.tree.Tree operations from checkpoints
+"""
+import io
+import itertools
+import os
+
+from pathlib import Path
+from typing import TextIO
+
+import pytest
+
+from pathlib_tree import sync
+from pathlib_tree.checkpoint import Checkpoint
+from pathlib_tree.exceptions import FilesystemError
+from pathlib_tree.tree import Tree
+
+MOCK_TREE_FILE_COUNT = 9
+
+
+class FailingWriter:
+    """
+    Text file wrapper failing after a number of writes
+    """
+    def __init__(self, filedescriptor: TextIO, writes: int) -> None:
+        self.filedescriptor = filedescriptor
+        self.writes = writes
+
+    def write(self, data: str) -> int:
+        """
+        Write data or fail if write limit is reached
+        """
+        if self.writes == 0:
+            raise OSError('Mock write error')
+        self.writes -= 1
+        return self.filedescriptor.write(data)
+
+    def flush(self) -> None:
+        """
+        Flush wrapped file
+        """
+        self.filedescriptor.flush()
+
+    def tell(self) -> int:
+        """
+        Return position in wrapped file
+        """
+        return self.filedescriptor.tell()
+
+
+@pytest.mark.parametrize('format', ('ndjson', 'csv', 'sha256sum'))
+# pylint: disable=redefined-builtin
+def test_tree_checkpoint_manifest(mock_test_tree, tmpdir, format) -> None:
+    """
+    Test resuming an interrupted manifest write from a checkpoint
+    """
+    expected = io.StringIO()
+    Tree(mock_test_tree).write_manifest(expected, format=format)
+
+    path = Path(tmpdir, 'manifest')
+    checkpoint = Checkpoint(Path(tmpdir, 'checkpoint.json'), interval=0)
+    with path.open('w', encoding='utf-8') as filedescriptor:
+        with pytest.raises(FilesystemError):
+            Tree(mock_test_tree).write_manifest(
+                FailingWriter(filedescriptor, 5),
+                format=format,
+                checkpoint=checkpoint,
+            )
+        filedescriptor.write('partial record')
+    assert checkpoint.path.is_file()
+    assert checkpoint.state['records'] < MOCK_TREE_FILE_COUNT
+
+    with path.open('r+', encoding='utf-8') as filedescriptor:
+        count = Tree(mock_test_tree).write_manifest(filedescriptor, format=format, checkpoint=checkpoint.path)
+    assert count == MOCK_TREE_FILE_COUNT
+    assert path.read_text(encoding='utf-8') == expected.getvalue()
+    assert not checkpoint.path.exists()
+
+
+def test_tree_checkpoint_verify(mock_test_tree, tmpdir) -> None:
+    """
+    Test resuming an interrupted verification from a checkpoint
+    """
+    manifest = io.StringIO()
+    Tree(mock_test_tree).write_manifest(manifest, format='sha256sum')
+    checkpoint = Checkpoint(Path(tmpdir, 'checkpoint.json'), interval=0)
+
+    manifest.seek(0)
+    results = Tree(mock_test_tree).verify(manifest, workers=1, extra=False, checkpoint=checkpoint)
+    first = [result.path for result in itertools.islice(results, 4)]
+    results.close()
+    assert checkpoint.state['counts'] == {'ok': 3}
+    assert checkpoint.last_path == first[2]
+
+    manifest.seek(0)
+    results = list(Tree(mock_test_tree).verify(manifest, workers=1, extra=False, checkpoint=checkpoint.path))
+    assert len(results) == MOCK_TREE_FILE_COUNT - 3
+    assert all(result.passed for result in results)
+    assert sorted(set(first) | set(result.path for result in results)) == sorted(
+        str(item.relative_to(mock_test_tree)) for item in Tree(mock_test_tree) if item.is_file()
+    )
+    assert not checkpoint.path.exists()
+
+
+def test_tree_checkpoint_sync(monkeypatch, mock_test_tree, tmpdir) -> None:
+    """
+    Test resuming an interrupted synchronization from a checkpoint
+    """
+    target = Path(tmpdir, 'target')
+    checkpoint = Checkpoint(Path(tmpdir, 'checkpoint.json'), interval=0)
+    copy_file = sync.copy_file
+    calls = itertools.count()
+
+    def failing_copy_file(source, *args, **kwargs):
+        if next(calls) == 4:
+            raise FilesystemError(f'Mock copy error for {source}')
+        return copy_file(source, *args, **kwargs)
+
+    monkeypatch.setattr(sync, 'copy_file', failing_copy_file)
+    with pytest.raises(FilesystemError):
+        Tree(mock_test_tree).sync_to(target, workers=1, batch_size=1, checkpoint=checkpoint)
+    assert checkpoint.state == {'files': 4, 'bytes': 4}
+    assert checkpoint.last_path == 'bar/baz/ddd.txt'
+    monkeypatch.undo()
+
+    result = Tree(mock_test_tree).sync_to(target, workers=1, checkpoint=checkpoint.path)
+    assert len(result.copied) + result.unchanged == 5
+    assert Tree(mock_test_tree).diff(target) == ([], [], [])
+    assert not checkpoint.path.exists()
+
+
+def test_tree_checkpoint_sync_directory_metadata(monkeypatch, mock_test_tree, tmpdir) -> None:
+    """
+    Test directories finished before an interrupted synchronization get source metadata
+    """
+    directory = mock_test_tree.joinpath('bar', 'baz')
+    os.utime(directory, ns=(1_000_000_000, 1_000_000_000))
+    target = Path(tmpdir, 'target')
+    checkpoint = Checkpoint(Path(tmpdir, 'checkpoint.json'), interval=0)
+    copy_file = sync.copy_file
+    calls = itertools.count()
+
+    def failing_copy_file(source, *args, **kwargs):
+        if next(calls) == 5:
+            raise FilesystemError(f'Mock copy error for {source}')
+        return copy_file(source, *args, **kwargs)
+
+    monkeypatch.setattr(sync, 'copy_file', failing_copy_file)
+    with pytest.raises(FilesystemError):
+        Tree(mock_test_tree).sync_to(target, workers=1, batch_size=1, checkpoint=checkpoint)
+    assert checkpoint.last_path == 'bar/bb.tst'
+    monkeypatch.undo()
+
+    Tree(mock_test_tree).sync_to(target, workers=1, checkpoint=checkpoint.path)
+    assert target.joinpath('bar', 'baz').stat().st_mtime_ns == 1_000_000_000
@@ -0,0 +1,76 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.tree.Tree chunk_index() method
+"""
+import pytest
+
+from sys_toolkit.tests.mock import MockException
+
+from pathlib_tree.chunks import ChunkIndex, FileChunker
+from pathlib_tree.exceptions import FilesystemError
+from pathlib_tree.throttle import IOGovernor
+from pathlib_tree.tree import Tree
+
+
+def test_tree_chunk_index(mock_test_tree) -> None:
+    """
+    Test chunking files in a tree
+    """
+    tree = Tree(mock_test_tree)
+    index = tree.chunk_index(workers=2)
+    assert isinstance(index, ChunkIndex)
+    assert list(index.files) == [
+        str(item.relative_to(tree)) for item in tree.walk() if item.is_file()
+    ]
+    assert all(len(chunks) == 1 for chunks in index.files.values())
+    assert index.total_bytes == 9
+    assert index.unique_bytes == 1
+    assert index.dedup_ratio == 9.0
+    assert tree.__items__ is None
+
+
+def test_tree_chunk_index_changes(mock_test_tree) -> None:
+    """
+    Test changed ranges between chunk indexes of two versions of a tree
+    """
+    tree = Tree(mock_test_tree, excluded=['bar'])
+    old = tree.chunk_index(average_size=16, min_size=4, max_size=64)
+    mock_test_tree.joinpath('foo/b').write_text('\n' + 'appended data ' * 10, encoding='utf-8')
+    new = tree.chunk_index(average_size=16, min_size=4, max_size=64)
+    assert list(new.diff(old)) == ['foo/b']
+    ranges = new.changed_ranges(old, 'foo/b')
+    assert ranges and sum(ranges[-1]) == 141
+
+
+def test_tree_chunk_index_governor(mock_test_tree) -> None:
+    """
+    Test chunking files is throttled by the tree I/O governor
+    """
+    governor = IOGovernor()
+    tree = Tree(mock_test_tree)
+    tree.throttle(governor=governor)
+    tree.chunk_index()
+    assert governor.bytes == 9
+
+
+def test_tree_chunk_index_arrays(mock_test_tree) -> None:
+    """
+    Test attaching chunk index to tree arrays
+    """
+    tree = Tree(mock_test_tree)
+    assert tree.to_arrays().chunk_index is None
+    arrays = tree.to_arrays(chunks=True)
+    assert set(arrays.chunk_index.files).issubset(arrays.paths)
+
+
+def test_tree_chunk_index_errors(monkeypatch, mock_test_tree) -> None:
+    """
+    Test errors reading files when chunking a tree
+    """
+    monkeypatch.setattr(FileChunker, 'iter_chunks', MockException(OSError))
+    with pytest.raises(FilesystemError):
+        Tree(mock_test_tree).chunk_index()
@@ -0,0 +1,110 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.tree.Tree dedupe() method
+"""
+import errno
+import shutil
+
+from pathlib import Path
+
+from pathlib_tree.copy import COPY_METHOD_HARDLINK, COPY_METHOD_REFLINK, is_same_file
+from pathlib_tree.dedupe import DedupeResult
+from pathlib_tree.tree import Tree
+
+
+def unsupported_clone(*args, **kwargs):
+    """
+    Mock filesystem without reflink support
+    """
+    raise OSError(errno.EOPNOTSUPP, 'Operation not supported')
+
+
+def create_duplicates(path: Path) -> None:
+    """
+    Create duplicate files with different contents from test tree files
+    """
+    path.joinpath('foo/a').write_text('duplicate contents\n', encoding='utf-8')
+    path.joinpath('bar/baz/d.txt').write_text('duplicate contents\n', encoding='utf-8')
+    path.joinpath('bar/aa.tst').write_text('duplicate contents\n', encoding='utf-8')
+    path.joinpath('foo/b').write_text('different contents\n', encoding='utf-8')
+
+
+def test_tree_dedupe_dry_run(monkeypatch, mock_test_tree) -> None:
+    """
+    Test detecting duplicates without modifying files
+    """
+    monkeypatch.setattr('pathlib_tree.dedupe.clone_file', unsupported_clone)
+    create_duplicates(mock_test_tree)
+    result = Tree(mock_test_tree).dedupe(dry_run=True)
+    assert isinstance(result, DedupeResult)
+    # Single newline files from the test tree are duplicates as well
+    assert len(result.linked) == 6
+    assert result.skipped == []
+    assert not is_same_file(
+        mock_test_tree.joinpath('foo/a').stat(),
+        mock_test_tree.joinpath('bar/aa.tst').stat()
+    )
+
+
+def test_tree_dedupe_unsupported(monkeypatch, mock_test_tree) -> None:
+    """
+    Test deduplication falls back gracefully when reflinks are not supported
+    """
+    monkeypatch.setattr('pathlib_tree.dedupe.clone_file', unsupported_clone)
+    create_duplicates(mock_test_tree)
+    result = Tree(mock_test_tree).dedupe()
+    assert result.linked == []
+    assert len(result.skipped) == 6
+    assert result.bytes_saved == 0
+    assert mock_test_tree.joinpath('foo/a').read_text(encoding='utf-8') == 'duplicate contents\n'
+    assert list(mock_test_tree.glob('**/.*.dedupe')) == []
+
+
+def test_tree_dedupe_existing_temporary_name(monkeypatch, mock_test_tree) -> None:
+    """
+    Test deduplication does not modify user files named like temporary files
+    """
+    monkeypatch.setattr('pathlib_tree.dedupe.clone_file', unsupported_clone)
+    create_duplicates(mock_test_tree)
+    for name in ('foo/.a.dedupe', 'bar/.aa.tst.dedupe', 'bar/baz/.d.txt.dedupe'):
+        mock_test_tree.joinpath(name).write_text('user data\n', encoding='utf-8')
+    Tree(mock_test_tree, excluded=['.*.dedupe']).dedupe(hardlink=True)
+    for name in ('foo/.a.dedupe', 'bar/.aa.tst.dedupe', 'bar/baz/.d.txt.dedupe'):
+        assert mock_test_tree.joinpath(name).read_text(encoding='utf-8') == 'user data\n'
+
+
+def test_tree_dedupe_hardlink(monkeypatch, mock_test_tree) -> None:
+    """
+    Test deduplication with hard links
+    """
+    monkeypatch.setattr('pathlib_tree.dedupe.clone_file', unsupported_clone)
+    create_duplicates(mock_test_tree)
+    result = Tree(mock_test_tree).dedupe(hardlink=True)
+    assert len(result.linked) == 6
+    assert {method for _original, _duplicate, method in result.linked} == {COPY_METHOD_HARDLINK}
+    assert is_same_file(
+        mock_test_tree.joinpath('bar/aa.tst').stat(),
+        mock_test_tree.joinpath('foo/a').stat()
+    )
+    assert not is_same_file(
+        mock_test_tree.joinpath('foo/a').stat(),
+        mock_test_tree.joinpath('foo/b').stat()
+    )
+    assert Tree(mock_test_tree).dedupe(hardlink=True).linked == []
+
+
+def test_tree_dedupe_reflink(monkeypatch, mock_test_tree) -> None:
+    """
+    Test deduplication with mocked reflink clones
+    """
+    monkeypatch.setattr('pathlib_tree.dedupe.clone_file', shutil.copyfile)
+    create_duplicates(mock_test_tree)
+    result = Tree(mock_test_tree).dedupe()
+    assert len(result.linked) == 6
+    assert {method for _original, _duplicate, method in result.linked} == {COPY_METHOD_REFLINK}
+    assert result.bytes_saved == 2 * len('duplicate contents\n') + 4
+    assert mock_test_tree.joinpath('foo/a').read_text(encoding='utf-8') == 'duplicate contents\n'
@@ -0,0 +1,86 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.tree.Tree duplicates() method
+"""
+import os
+
+import pytest
+
+from pathlib_tree.duplicates import DuplicateGroup, TreeDuplicates
+from pathlib_tree.exceptions import FilesystemError
+from pathlib_tree.tree import Tree
+
+PARTIAL_SIZE = 1024
+
+
+def create_large_files(path) -> None:
+    """
+    Create large files where first and last partial blocks match but contents differ
+    """
+    data = os.urandom(PARTIAL_SIZE * 4)
+    path.joinpath('large').mkdir()
+    path.joinpath('large/a.bin').write_bytes(data)
+    path.joinpath('large/b.bin').write_bytes(data)
+    path.joinpath('large/c.bin').write_bytes(
+        data[:PARTIAL_SIZE * 2] + b'x' + data[PARTIAL_SIZE * 2 + 1:]
+    )
+    os.link(path.joinpath('large/a.bin'), path.joinpath('large/hardlink.bin'))
+
+
+def test_tree_duplicates_small_files(mock_test_tree) -> None:
+    """
+    Test finding duplicates for small files in test tree
+    """
+    groups = list(Tree(mock_test_tree).duplicates())
+    assert len(groups) == 1
+    group = groups[0]
+    assert isinstance(group, DuplicateGroup)
+    assert group.size == 1
+    assert len(group) == 9
+    assert group.wasted_bytes == 8
+
+
+def test_tree_duplicates_large_files(monkeypatch, mock_test_tree) -> None:
+    """
+    Test finding duplicates with partial and full checksums and hard links
+    """
+    create_large_files(mock_test_tree)
+    calls = []
+
+    def file_checksum(self, item):
+        calls.append(item.name)
+        return original_file_checksum(self, item)
+
+    original_file_checksum = TreeDuplicates.__file_checksum__
+    monkeypatch.setattr(TreeDuplicates, '__file_checksum__', file_checksum)
+
+    groups = list(Tree(mock_test_tree).duplicates(partial_size=PARTIAL_SIZE, workers=2))
+    assert len(groups) == 2
+    large = [group for group in groups if group.size == PARTIAL_SIZE * 4]
+    assert len(large) == 1
+    assert sorted(item.name for item in large[0]) == ['a.bin', 'b.bin']
+    assert sorted(calls) == ['a.bin', 'b.bin', 'c.bin']
+
+
+def test_tree_duplicates_partial_size_mismatch(mock_test_tree) -> None:
+    """
+    Test files with differing partial checksums are never fully hashed
+    """
+    mock_test_tree.joinpath('foo/a').write_bytes(b'a' * 4096)
+    mock_test_tree.joinpath('foo/b').write_bytes(b'b' * 4096)
+    groups = list(Tree(mock_test_tree).duplicates(partial_size=PARTIAL_SIZE))
+    assert [group.size for group in groups] == [1]
+
+
+def test_tree_duplicates_invalid_algorithm(mock_test_tree) -> None:
+    """
+    Test finding duplicates with invalid checksum algorithm
+    """
+    with pytest.raises(FilesystemError):
+        Tree(mock_test_tree).duplicates(algorithm='rot13')
+    with pytest.raises(FilesystemError):
+        Tree(mock_test_tree).duplicates(algorithm='shake_128')
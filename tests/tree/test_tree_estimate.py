@@ -0,0 +1,105 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.tree.Tree estimate() method
+"""
+import stat
+
+from pathlib import Path
+
+import pytest
+
+from pathlib_tree.estimate import Estimate, TreeEstimate
+from pathlib_tree.exceptions import FilesystemError
+from pathlib_tree.tree import Tree
+
+
+def create_uniform_tree(path: Path) -> Path:
+    """
+    Create tree with 5 directories of 4 subdirectories, each with 3 files of 10 bytes
+    """
+    for directory in range(5):
+        for subdirectory in range(4):
+            parent = path.joinpath(f'dir{directory}', f'sub{subdirectory}')
+            parent.mkdir(parents=True)
+            for name in ('a.txt', 'b.txt', 'c.log'):
+                parent.joinpath(name).write_bytes(b'x' * 10)
+    return path
+
+
+def walk_totals(tree: Tree) -> tuple:
+    """
+    Return file count, bytes and directory count of a full walk
+    """
+    items = [item.lstat() for item in tree.walk()]
+    files = [item for item in items if not stat.S_ISDIR(item.st_mode)]
+    return len(files), sum(item.st_size for item in files), len(items) - len(files)
+
+
+def test_tree_estimate_uniform(tmpdir) -> None:
+    """
+    Test estimating a uniform tree within a small budget returns exact values
+    """
+    tree = Tree(create_uniform_tree(Path(tmpdir)))
+    estimate = tree.estimate(budget=7, seed=1)
+    assert isinstance(estimate, TreeEstimate)
+    assert estimate.directories_read <= 7
+    assert estimate.probes >= 2
+    assert isinstance(estimate.files, Estimate)
+    assert (estimate.files.value, estimate.bytes.value, estimate.directories.value) == walk_totals(tree)
+    assert estimate.files.low == estimate.files.high == 60
+    assert {extension: value.value for extension, value in estimate.extensions.items()} == {'.log': 20, '.txt': 40}
+
+
+def test_tree_estimate_exclusions(tmpdir) -> None:
+    """
+    Test estimates honour tree exclusions
+    """
+    tree = Tree(create_uniform_tree(Path(tmpdir)), excluded=['*.log', 'dir4'])
+    estimate = tree.estimate(budget=10, seed=1)
+    assert (estimate.files.value, estimate.bytes.value, estimate.directories.value) == walk_totals(tree)
+    assert list(estimate.extensions) == ['.txt']
+
+
+def test_tree_estimate_exact(mock_test_tree) -> None:
+    """
+    Test estimating a tree read completely within the budget
+    """
+    tree = Tree(mock_test_tree)
+    estimate = tree.estimate(budget=100)
+    assert estimate.directories_read == 4
+    assert (estimate.files.value, estimate.bytes.value, estimate.directories.value) == walk_totals(tree)
+    assert estimate.bytes.stderr == 0
+    assert estimate.extensions['.tst'].value == 3
+
+
+def test_tree_estimate_interval(tmpdir) -> None:
+    """
+    Test estimates of an irregular tree have confidence intervals
+    """
+    root = Path(tmpdir)
+    for index in range(30):
+        directory = root.joinpath(f'dir{index}', *(['nested'] * (index % 4)))
+        directory.mkdir(parents=True)
+        for name in range(index % 7):
+            directory.joinpath(f'file{name}').write_bytes(b'x' * index)
+    tree = Tree(root)
+    estimate = tree.estimate(budget=20, seed=2)
+    assert estimate.directories_read <= 20
+    assert estimate.probes > 1
+    assert estimate.files.low < estimate.files.value < estimate.files.high
+    assert estimate.files.stderr > 0
+    assert 'files' in repr(estimate)
+
+
+def test_tree_estimate_errors(tmpdir) -> None:
+    """
+    Test errors estimating trees
+    """
+    with pytest.raises(FilesystemError):
+        Tree(Path(tmpdir, 'missing')).estimate()
+    with pytest.raises(FilesystemError):
+        Tree(tmpdir).estimate(confidence=1.5)
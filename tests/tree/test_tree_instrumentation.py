@@ -0,0 +1,85 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.tree.Tree walk instrumentation
+"""
+import json
+
+from pathlib_tree.instrumentation import WalkInstrumentation
+from pathlib_tree.tree import (
+    Tree,
+    TreeItem,
+    OPERATION_CHECKSUM,
+    OPERATION_EXCLUDE_MATCH,
+    OPERATION_ITERDIR,
+    OPERATION_IS_DIR,
+    OPERATION_LSTAT,
+)
+
+
+def test_tree_instrumentation_disabled(mock_test_tree) -> None:
+    """
+    Test tree items have no instrumentation by default
+    """
+    tree = Tree(mock_test_tree)
+    for item in tree:
+        assert item.instrumentation is None
+
+
+def test_tree_instrumentation_counters(mock_test_tree) -> None:
+    """
+    Test counting operations in a tree walk
+    """
+    tree = Tree(mock_test_tree)
+    instrumentation = tree.instrument()
+    assert isinstance(instrumentation, WalkInstrumentation)
+
+    items = list(tree)
+    assert instrumentation.entries == len(items) == 12
+    assert instrumentation.directories == 4
+    assert instrumentation.counters[OPERATION_ITERDIR] == 4
+    assert instrumentation.counters[OPERATION_EXCLUDE_MATCH] == 12
+    assert instrumentation.counters[OPERATION_IS_DIR] >= 12
+    assert sum(instrumentation.histogram) == 4
+    assert len(instrumentation.slowest_listings) == 4
+
+    for item in items:
+        if isinstance(item, TreeItem):
+            assert item.instrumentation is instrumentation
+            item.checksum()
+            assert item.size == 1
+    assert instrumentation.counters[OPERATION_CHECKSUM] == 9
+    assert instrumentation.counters[OPERATION_LSTAT] >= 9
+    assert instrumentation.bytes == 9
+    assert instrumentation.entries_per_second > 0
+
+    summary = json.loads(json.dumps(tree.instrumentation.summary()))
+    assert summary['entries'] == 12
+    assert summary['operations'][OPERATION_ITERDIR] == 4
+    assert sum(summary['directory_latency'].values()) == 4
+
+
+def test_tree_instrumentation_hooks(mock_test_tree) -> None:
+    """
+    Test instrumentation callback hooks
+    """
+    entered = []
+    exited = []
+    items = []
+    tree = Tree(mock_test_tree)
+    tree.instrument(WalkInstrumentation(
+        on_dir_enter=lambda directory: entered.append(directory.name),
+        on_dir_exit=lambda directory, elapsed: exited.append(directory.name),
+        on_item=lambda item: items.append(item.name),
+    ))
+    list(tree)
+    assert entered == ['mock-test-directory', 'bar', 'baz', 'foo']
+    assert exited == ['baz', 'bar', 'foo', 'mock-test-directory']
+    assert len(items) == 12
+
+    tree.instrumentation.reset()
+    assert tree.instrumentation.entries == 0
+    assert tree.instrumentation.summary()['operations'] == {}
@@ -0,0 +1,141 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.tree.Tree write_manifest() method
+"""
+import hashlib
+import io
+import json
+import os
+
+import pytest
+
+from pathlib_tree.exceptions import FilesystemError
+from pathlib_tree.manifest import (
+    escape_checksum_path,
+    parse_checksum_line,
+    read_manifest,
+    unescape_checksum_path,
+    TreeManifest,
+)
+from pathlib_tree.tree import Tree
+
+NEWLINE_MD5 = hashlib.md5(b'\n').hexdigest()
+NEWLINE_SHA256 = hashlib.sha256(b'\n').hexdigest()
+TEST_FILES = [
+    'bar/aa.tst',
+    'bar/baz/d.txt',
+    'bar/baz/dd.txt',
+    'bar/baz/ddd.txt',
+    'bar/bb.tst',
+    'bar/cc.tst',
+    'foo/a',
+    'foo/b',
+    'foo/c',
+]
+
+
+def test_tree_manifest_invalid_arguments(mock_test_tree) -> None:
+    """
+    Test manifest with invalid fields, algorithm and format
+    """
+    tree = Tree(mock_test_tree)
+    with pytest.raises(FilesystemError):
+        TreeManifest(tree, fields=['path', 'unknown'])
+    with pytest.raises(FilesystemError):
+        TreeManifest(tree, algorithm='invalid')
+    with pytest.raises(FilesystemError):
+        TreeManifest(tree, algorithm='shake_256')
+    with pytest.raises(FilesystemError):
+        tree.write_manifest(io.StringIO(), format='invalid')
+    with pytest.raises(FilesystemError):
+        list(read_manifest(io.StringIO(), format='invalid'))
+
+
+def test_tree_manifest_ndjson(mock_test_tree) -> None:
+    """
+    Test writing and reading manifest in NDJSON format
+    """
+    output = io.StringIO()
+    tree = Tree(mock_test_tree)
+    assert tree.write_manifest(output, workers=2) == len(TEST_FILES)
+    assert tree.__items__ is None
+    lines = output.getvalue().splitlines()
+    assert len(lines) == len(TEST_FILES)
+    assert json.loads(lines[0]) == {
+        'path': 'bar/aa.tst',
+        'size': 1,
+        'mtime': os.stat(mock_test_tree.joinpath('bar/aa.tst')).st_mtime,
+        'checksum': NEWLINE_SHA256,
+    }
+
+    output.seek(0)
+    records = list(read_manifest(output))
+    assert [record['path'] for record in records] == TEST_FILES
+    assert all(record['checksum'] == NEWLINE_SHA256 for record in records)
+
+
+def test_tree_manifest_csv(mock_test_tree) -> None:
+    """
+    Test writing and reading manifest in CSV format without checksums
+    """
+    output = io.StringIO()
+    Tree(mock_test_tree).write_manifest(output, format='csv', fields=['path', 'size', 'mtime_ns', 'mode'])
+    assert output.getvalue().splitlines()[0] == 'path,size,mtime_ns,mode'
+
+    output.seek(0)
+    records = list(read_manifest(output, format='csv'))
+    assert [record['path'] for record in records] == TEST_FILES
+    item_stat = os.stat(mock_test_tree.joinpath(TEST_FILES[0]))
+    assert records[0] == {
+        'path': TEST_FILES[0],
+        'size': 1,
+        'mtime_ns': item_stat.st_mtime_ns,
+        'mode': item_stat.st_mode,
+    }
+
+
+def test_tree_manifest_checksums(mock_test_tree) -> None:
+    """
+    Test writing and reading manifest in sha256sum format with escaped file names
+    """
+    mock_test_tree.joinpath('foo/new\nline').write_text('\n', encoding='utf-8')
+    mock_test_tree.joinpath('foo/link').symlink_to('a')
+    output = io.StringIO()
+    assert Tree(mock_test_tree).write_manifest(output, format='sha256sum', workers=1) == len(TEST_FILES) + 1
+    lines = output.getvalue().splitlines()
+    assert lines[0] == f'{NEWLINE_SHA256}  bar/aa.tst'
+    assert f'\\{NEWLINE_SHA256}  foo/new\\nline' in lines
+
+    output.seek(0)
+    paths = [record['path'] for record in read_manifest(output, format='sha256sum')]
+    assert paths == TEST_FILES + ['foo/new\nline']
+
+
+def test_tree_manifest_md5(mock_test_tree) -> None:
+    """
+    Test writing checksum manifest with other algorithm
+    """
+    output = io.StringIO()
+    Tree(mock_test_tree).write_manifest(output, format='sha256sum', algorithm='md5')
+    assert output.getvalue().splitlines()[0] == f'{NEWLINE_MD5}  bar/aa.tst'
+
+
+def test_manifest_checksum_lines() -> None:
+    """
+    Test parsing and escaping checksum file lines
+    """
+    assert escape_checksum_path('foo/bar') == ('', 'foo/bar')
+    assert escape_checksum_path('foo\\bar\n') == ('\\', 'foo\\\\bar\\n')
+    assert unescape_checksum_path('foo\\\\bar\\n') == 'foo\\bar\n'
+    assert parse_checksum_line('\n') is None
+    assert parse_checksum_line(f'{NEWLINE_MD5.upper()} *foo bar\n') == {'path': 'foo bar', 'checksum': NEWLINE_MD5}
+    with pytest.raises(FilesystemError):
+        parse_checksum_line('invalid')
+    with pytest.raises(FilesystemError):
+        parse_checksum_line(f'{NEWLINE_MD5} foo')
+    with pytest.raises(FilesystemError):
+        list(read_manifest(io.StringIO('{invalid\n')))
@@ -0,0 +1,78 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.tree.Tree membership_filter() method
+"""
+import os
+import shutil
+
+from pathlib import Path
+
+from pathlib_tree.membership import MembershipFilter
+from pathlib_tree.tree import Tree
+
+
+def test_tree_membership_filter(mock_test_tree) -> None:
+    """
+    Test filter of a tree contains relative paths of all items
+    """
+    tree = Tree(mock_test_tree)
+    membership = tree.membership_filter()
+    assert isinstance(membership, MembershipFilter)
+    assert membership.count == 12
+    assert tree.__items__ is None
+    assert Tree(mock_test_tree).membership_filter(capacity=100).bits > membership.bits
+    assert all(membership.might_contain(str(item.relative_to(tree))) for item in tree)
+    assert membership.diff(tree).missing == []
+
+
+def test_tree_membership_filter_diff(mock_test_tree, tmpdir) -> None:
+    """
+    Test comparing a changed copy of a tree to the filter of the original tree
+    """
+    original = Tree(mock_test_tree)
+    membership = MembershipFilter.from_bytes(original.membership_filter(algorithm='sha256').to_bytes())
+    copy = Path(tmpdir, 'copy')
+    shutil.copytree(mock_test_tree, copy)
+    copy.joinpath('foo', 'new').write_text('new\n', encoding='utf-8')
+    copy.joinpath('foo', 'a').write_text('changed\n', encoding='utf-8')
+
+    confirmed = []
+
+    def confirm(paths):
+        confirmed.extend(paths)
+        return [path for path in paths if original.joinpath(path).exists()]
+
+    result = membership.diff(Tree(copy), confirm=confirm)
+    missing = sorted(str(item.relative_to(copy)) for item in result.missing)
+    assert missing == [os.path.join('foo', 'a'), os.path.join('foo', 'new')]
+    assert len(result.present) == 11
+    assert result.candidates == len(confirmed) == 11
+
+
+def test_tree_membership_filter_false_positive(mock_test_tree) -> None:
+    """
+    Test confirmation rejects candidates matching the filter by chance
+    """
+    tree = Tree(mock_test_tree)
+    membership = MembershipFilter(1, 1)
+    membership.add('anything')
+    result = membership.diff(tree, confirm=lambda paths: [])
+    assert result.candidates == 12
+    assert len(result.missing) == 12
+    assert not result.present
+
+
+def test_tree_membership_filter_dangling_symlink(mock_test_tree) -> None:
+    """
+    Test items that are not regular files are keyed by path only in filters with checksums
+    """
+    os.symlink('missing', mock_test_tree.joinpath('foo', 'link'))
+    tree = Tree(mock_test_tree)
+    membership = tree.membership_filter(algorithm='sha256')
+    assert membership.count == 13
+    assert membership.might_contain(os.path.join('foo', 'link'))
+    assert membership.diff(tree).missing == []
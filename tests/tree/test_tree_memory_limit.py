@@ -0,0 +1,56 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.tree.Tree walks with memory_limit
+"""
+from pathlib_tree.tree import Tree
+
+TEST_FILE_COUNT = 100
+MEMORY_LIMIT = 512
+
+
+def create_large_directory(path) -> None:
+    """
+    Create a large directory with files and a subdirectory to the test tree
+    """
+    large = path.joinpath('large')
+    large.mkdir()
+    for index in range(TEST_FILE_COUNT):
+        large.joinpath(f'file-{(index * 37) % TEST_FILE_COUNT:03d}').write_text('')
+    large.joinpath('subdir').mkdir()
+    large.joinpath('subdir/file').write_text('')
+
+
+def test_tree_memory_limit_sorted(mock_test_tree) -> None:
+    """
+    Test sorted walk of tree with a directory larger than memory limit
+    """
+    create_large_directory(mock_test_tree)
+    expected = list(Tree(mock_test_tree))
+    tree = Tree(mock_test_tree, memory_limit=MEMORY_LIMIT, excluded=['file-050'])
+    items = list(tree)
+    assert len(items) == len(expected) - 1
+    assert items == [item for item in expected if item.name != 'file-050']
+    assert list(tree) == items
+
+    large = tree[tree.joinpath('large')]
+    assert large.memory_limit == MEMORY_LIMIT
+    assert not large.__items__
+    assert str(large.joinpath('subdir/file')) not in tree.__items__
+    assert str(tree.joinpath('bar/baz/d.txt')) not in tree.__items__
+
+
+def test_tree_memory_limit_unsorted(mock_test_tree) -> None:
+    """
+    Test unsorted walk of tree with a directory larger than memory limit
+    """
+    create_large_directory(mock_test_tree)
+    tree = Tree(mock_test_tree.joinpath('large'), sorted=False, memory_limit=MEMORY_LIMIT)
+    items = list(tree)
+    assert len(items) == TEST_FILE_COUNT + 2
+    assert not tree.__items__
+    tree.reset()
+    assert len(list(tree)) == TEST_FILE_COUNT + 2
@@ -0,0 +1,54 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.tree.Tree path_store() method
+"""
+import os
+
+from pathlib_tree.pathstore import PathStore
+from pathlib_tree.tree import Tree
+
+
+def test_tree_path_store(mock_test_tree) -> None:
+    """
+    Test path store of a tree contains relative paths in sorted walk order
+    """
+    tree = Tree(mock_test_tree, sorted=True)
+    store = tree.path_store(block_size=4)
+    assert isinstance(store, PathStore)
+    assert tree.__items__ is None
+    assert list(store) == [str(item.relative_to(tree)) for item in tree]
+    assert len(store) == 12
+    assert os.path.join('bar', 'baz', 'dd.txt') in store
+    assert list(store.iter_prefix(os.path.join('bar', 'baz'))) == [
+        os.path.join('bar', 'baz'),
+        os.path.join('bar', 'baz', 'd.txt'),
+        os.path.join('bar', 'baz', 'dd.txt'),
+        os.path.join('bar', 'baz', 'ddd.txt'),
+    ]
+
+
+def test_tree_path_store_exclusions(mock_test_tree) -> None:
+    """
+    Test path store honours tree exclusions
+    """
+    store = Tree(mock_test_tree, excluded=['*.tst']).path_store()
+    assert len(store) == 9
+    assert os.path.join('bar', 'aa.tst') not in store
+
+
+def test_tree_path_store_non_utf8_names(tmpdir) -> None:
+    """
+    Test path store of a sorted tree with names where walk order differs from key order
+    """
+    path = str(tmpdir.mkdir('tree'))
+    os.mkdir(os.path.join(os.fsencode(path), b'\xf0'))
+    os.mkdir(os.path.join(path, '\uff21'))
+    tree = Tree(path, sorted=True)
+    store = tree.path_store(block_size=1)
+    assert len(store) == 2
+    assert list(store) == ['\uff21', os.fsdecode(b'\xf0')]
+    assert os.fsdecode(b'\xf0') in store
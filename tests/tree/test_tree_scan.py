@@ -0,0 +1,58 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.tree.Tree scan() method
+"""
+import pytest
+
+from pathlib_tree.exceptions import FilesystemError
+from pathlib_tree.tree import Tree, TreeItem
+
+
+def test_tree_scan_items(mock_test_tree) -> None:
+    """
+    Test scan returns same items as iterating tree without caching them
+    """
+    tree = Tree(mock_test_tree)
+    items = list(tree.scan())
+    assert len(items) == 12
+    assert tree.__items__ is None
+    assert items == list(Tree(mock_test_tree))
+    for item in items:
+        assert isinstance(item, (Tree, TreeItem))
+        if isinstance(item, Tree):
+            assert item.__items__ is None
+
+
+def test_tree_scan_options(mock_test_tree) -> None:
+    """
+    Test scan with exclusions, unsorted listing, memory limit and symbolic link loops
+    """
+    mock_test_tree.joinpath('bar/baz/loop').symlink_to('../../bar')
+    tree = Tree(mock_test_tree, excluded=['foo'], sorted=False, memory_limit=64)
+    paths = sorted(str(item.relative_to(mock_test_tree)) for item in tree.scan())
+    assert paths == sorted(str(item.relative_to(mock_test_tree)) for item in Tree(mock_test_tree, excluded=['foo']))
+    assert 'bar/baz/loop' in paths
+    assert not any(path.startswith('foo') for path in paths)
+
+
+def test_tree_scan_instrumentation(mock_test_tree) -> None:
+    """
+    Test scan with instrumentation enabled
+    """
+    tree = Tree(mock_test_tree)
+    instrumentation = tree.instrument()
+    assert len(list(tree.scan())) == 12
+    assert instrumentation.entries == 12
+    assert instrumentation.directories == 4
+
+
+def test_tree_scan_missing_directory(tmpdir) -> None:
+    """
+    Test scan of a missing directory
+    """
+    with pytest.raises(FilesystemError):
+        list(Tree(tmpdir.join('missing')).scan())
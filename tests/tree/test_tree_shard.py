@@ -0,0 +1,82 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.tree.Tree scan_parallel() method
+"""
+import pickle
+
+import pytest
+
+from pathlib_tree.exceptions import FilesystemError
+from pathlib_tree.shard import scan_shard, TreeShardScan
+from pathlib_tree.tree import Tree
+
+from .test_tree_subclass import SubdirectoryPath, TestTree
+
+
+def walked_paths(tree: Tree) -> list:
+    """
+    Return paths relative to tree in walk order
+    """
+    return [str(item.relative_to(tree)) for item in tree.walk()]
+
+
+@pytest.mark.parametrize('split_entries', (1, 3, 1000))
+def test_tree_scan_parallel_order(mock_test_tree, split_entries) -> None:
+    """
+    Test sharded scans return records in walk order
+    """
+    tree = Tree(mock_test_tree)
+    scan = tree.scan_parallel(workers=2, split_entries=split_entries)
+    assert isinstance(scan, TreeShardScan)
+    records = list(scan)
+    assert [record[0] for record in records] == walked_paths(tree)
+    for path, mode, size, mtime_ns, _uid, _gid in records:
+        item_stat = mock_test_tree.joinpath(path).lstat()
+        assert (mode, size, mtime_ns) == (item_stat.st_mode, item_stat.st_size, item_stat.st_mtime_ns)
+
+
+def test_tree_scan_parallel_shards(mock_test_tree) -> None:
+    """
+    Test scanning a shard returns compact picklable records and split subtrees
+    """
+    task = TreeShardScan(Tree(mock_test_tree, excluded=['foo']), split_entries=2).__root_task__()
+    records, splits = scan_shard(task)
+    assert [record[0] for record in records] == ['bar', 'bar/aa.tst', 'bar/baz', 'bar/bb.tst', 'bar/cc.tst']
+    assert [(index, split[4]) for index, split in splits] == [(2, 'bar/baz')]
+    assert pickle.loads(pickle.dumps((records, splits))) == (records, splits)
+
+    records, splits = scan_shard(splits[0][1])
+    assert [record[0] for record in records] == ['bar/baz/d.txt', 'bar/baz/dd.txt', 'bar/baz/ddd.txt']
+    assert splits == []
+
+
+def test_tree_scan_parallel_options(mock_test_tree) -> None:
+    """
+    Test sharded scans use tree options and subclass loaders
+    """
+    tree = TestTree(mock_test_tree, excluded=['*.tst'])
+    task = TreeShardScan(tree, split_entries=1).__root_task__()
+    _records, splits = scan_shard(task)
+    assert {split[0] for _index, split in splits} == {SubdirectoryPath}
+    paths = [record[0] for record in tree.scan_parallel(workers=2, split_entries=1)]
+    assert paths == walked_paths(tree)
+    assert not any(path.endswith('.tst') for path in paths)
+
+    with pytest.raises(FilesystemError):
+        list(Tree(mock_test_tree.joinpath('foo/a')).scan_parallel())
+
+
+def test_tree_scan_parallel_arrays(mock_test_tree) -> None:
+    """
+    Test merging sharded scans to arrays
+    """
+    tree = Tree(mock_test_tree)
+    expected = tree.to_arrays(use_numpy=False)
+    arrays = tree.scan_parallel(workers=2, split_entries=2).to_arrays(use_numpy=False)
+    assert arrays.paths == expected.paths
+    for name in ('parent_id', 'size', 'mode', 'type'):
+        assert list(getattr(arrays, name)) == list(getattr(expected, name))
@@ -0,0 +1,136 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.tree.Tree sync_to() method
+"""
+import os
+
+from pathlib import Path
+
+import pytest
+
+from pathlib_tree.exceptions import FilesystemError
+from pathlib_tree.sync import SyncResult
+from pathlib_tree.tree import Tree
+
+
+def test_tree_sync_to_empty_directory(mock_test_tree, tmpdir) -> None:
+    """
+    Test synchronizing tree to new directory
+    """
+    target = Path(tmpdir, 'target')
+    result = Tree(mock_test_tree).sync_to(target, workers=2, batch_size=2)
+    assert isinstance(result, SyncResult)
+    assert len(result.copied) == 9
+    assert result.bytes_copied == 9
+    assert result.bytes_per_second >= 0
+    different, missing_self, missing_other = Tree(mock_test_tree).diff(target)
+    assert different == []
+    assert missing_self == []
+    assert missing_other == []
+    for item in Tree(mock_test_tree):
+        copied = target.joinpath(item.relative_to(mock_test_tree))
+        assert copied.stat().st_mtime_ns == item.stat().st_mtime_ns
+        assert copied.stat().st_mode == item.stat().st_mode
+
+
+def test_tree_sync_to_changed_files(mock_test_tree, tmpdir) -> None:
+    """
+    Test synchronizing only changed files and deleting extraneous items
+    """
+    target = Path(tmpdir, 'target')
+    tree = Tree(mock_test_tree)
+    tree.sync_to(target)
+
+    result = Tree(mock_test_tree).sync_to(target)
+    assert result.copied == []
+    assert result.unchanged == 9
+
+    changed = Path(mock_test_tree, 'foo/a')
+    changed.write_text('changed contents\n', encoding='utf-8')
+    extra_file = target.joinpath('bar/extra.txt')
+    extra_file.write_text('extra\n', encoding='utf-8')
+    extra_directory = target.joinpath('extra/nested')
+    extra_directory.mkdir(parents=True)
+    extra_directory.joinpath('file').touch()
+
+    result = Tree(mock_test_tree).sync_to(target)
+    assert [item.path for item in result.copied] == [target.joinpath('foo/a')]
+    assert result.deleted == []
+    assert extra_file.exists()
+
+    result = Tree(mock_test_tree).sync_to(target, delete=True)
+    assert result.copied == []
+    assert sorted(str(item) for item in result.deleted) == [
+        str(extra_file),
+        str(target.joinpath('extra')),
+    ]
+    assert not extra_directory.exists()
+
+
+def test_tree_sync_to_checksum(mock_test_tree, tmpdir) -> None:
+    """
+    Test synchronizing with content comparison detects changes with same mtime
+    """
+    target = Path(tmpdir, 'target')
+    Tree(mock_test_tree).sync_to(target)
+    changed = target.joinpath('foo/a')
+    mtime = changed.stat().st_mtime_ns
+    changed.write_text('x', encoding='utf-8')
+    os.utime(changed, ns=(mtime, mtime))
+
+    assert Tree(mock_test_tree).sync_to(target).copied == []
+    result = Tree(mock_test_tree).sync_to(target, checksum=True)
+    assert len(result.copied) == 1
+    assert changed.read_text(encoding='utf-8') == '\n'
+
+
+def test_tree_sync_to_symlinks(mock_test_tree, tmpdir) -> None:
+    """
+    Test synchronizing tree with symbolic links to directories
+    """
+    Path(mock_test_tree, 'link').symlink_to('bar')
+    target = Path(tmpdir, 'target')
+    Tree(mock_test_tree).sync_to(target)
+    assert target.joinpath('link').is_symlink()
+    assert os.readlink(target.joinpath('link')) == 'bar'
+
+
+def test_tree_sync_to_missing_source(tmpdir) -> None:
+    """
+    Test synchronizing missing source tree
+    """
+    with pytest.raises(FilesystemError):
+        Tree(Path(tmpdir, 'missing')).sync_to(Path(tmpdir, 'target'))
+
+
+@pytest.mark.parametrize('delta', ('inplace', 'tempfile'))
+def test_tree_sync_to_delta(mock_test_tree, tmpdir, delta) -> None:
+    """
+    Test synchronizing changed large files with delta transfer
+    """
+    large_file = Path(mock_test_tree, 'foo/large')
+    large_file.write_bytes(bytes(range(256)) * 64)
+    target = Path(tmpdir, 'target')
+    Tree(mock_test_tree).sync_to(target)
+
+    data = bytearray(large_file.read_bytes())
+    data[5000:5004] = b'edit'
+    large_file.write_bytes(bytes(data))
+    result = Tree(mock_test_tree).sync_to(target, delta=delta, delta_block_size=1024)
+    assert [(item.path, item.method) for item in result.copied] == [(target.joinpath('foo/large'), 'delta')]
+    assert result.bytes_copied == len(data)
+    assert result.bytes_transferred == 1024
+    assert target.joinpath('foo/large').read_bytes() == bytes(data)
+    assert Tree(mock_test_tree).diff(target) == ([], [], [])
+
+
+def test_tree_sync_to_delta_invalid(mock_test_tree, tmpdir) -> None:
+    """
+    Test synchronizing with invalid delta mode
+    """
+    with pytest.raises(FilesystemError):
+        Tree(mock_test_tree).sync_to(Path(tmpdir, 'target'), delta='invalid')
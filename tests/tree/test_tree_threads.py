@@ -0,0 +1,81 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Concurrency stress tests for sharing pathlib_tree.tree.Tree objects between threads
+"""
+import hashlib
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from pathlib_tree.tree import Tree, TreeItem, TreeIterator
+
+THREAD_COUNT = 8
+ITERATIONS = 50
+DIRECTORY_COUNT = 10
+FILE_COUNT = 10
+
+
+def create_stress_tree(path) -> None:
+    """
+    Create directories with files with unique contents
+    """
+    for directory in range(DIRECTORY_COUNT):
+        directory_path = Path(path).joinpath(f'dir-{directory}', 'nested')
+        directory_path.mkdir(parents=True)
+        for index in range(FILE_COUNT):
+            directory_path.joinpath(f'file-{index}').write_text(f'{directory}/{index}', encoding='utf-8')
+
+
+def test_tree_iter_returns_cursor(mock_test_tree) -> None:
+    """
+    Test iter() returns independent cursors for the tree
+    """
+    tree = Tree(mock_test_tree)
+    first = iter(tree)
+    second = iter(tree)
+    assert isinstance(first, TreeIterator)
+    assert first is not second
+    assert repr(first) == f'<TreeIterator {tree}>'
+    assert next(first) == next(second)
+    assert len(list(first)) == len(list(second)) == 11
+    assert len(list(tree)) == 12
+    assert next(tree) == next(iter(tree))
+
+
+def test_tree_concurrent_iteration(tmpdir) -> None:
+    """
+    Test iterating the same tree concurrently from many threads
+    """
+    create_stress_tree(tmpdir)
+    tree = Tree(tmpdir)
+    expected = [str(item) for item in Tree(tmpdir)]
+    assert len(expected) == DIRECTORY_COUNT * (FILE_COUNT + 2)
+
+    def walk(index):
+        if index % 10 == 0:
+            tree.reset()
+        return [str(item) for item in tree]
+
+    with ThreadPoolExecutor(max_workers=THREAD_COUNT) as executor:
+        for result in executor.map(walk, range(THREAD_COUNT * ITERATIONS)):
+            assert result == expected
+    assert isinstance(tree[expected[-1]], TreeItem)
+
+
+def test_tree_concurrent_checksums(tmpdir) -> None:
+    """
+    Test calculating checksums concurrently for different files
+    """
+    create_stress_tree(tmpdir)
+    files = [item for item in Tree(tmpdir) if isinstance(item, TreeItem)]
+
+    def checksum(item):
+        return item.checksum(), item
+
+    with ThreadPoolExecutor(max_workers=THREAD_COUNT) as executor:
+        for digest, item in executor.map(checksum, files * (ITERATIONS // 10)):
+            assert digest == hashlib.sha256(item.read_bytes()).hexdigest()
@@ -0,0 +1,105 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.tree.Tree throttle() method
+"""
+import io
+
+from pathlib import Path
+
+import pytest
+
+from pathlib_tree.throttle import IOGovernor
+from pathlib_tree.tree import Tree, TreeItem
+
+from ..test_throttle import MockClock
+
+MOCK_TREE_FILE_COUNT = 9
+
+
+def test_tree_throttle_items(mock_test_tree) -> None:
+    """
+    Test governor is passed to items loaded in the tree
+    """
+    tree = Tree(mock_test_tree)
+    governor = tree.throttle(bytes_per_second=2**20, ops_per_second=100)
+    assert isinstance(governor, IOGovernor)
+    assert governor.bytes_per_second == 2**20
+    assert governor.ops_per_second == 100
+    items = list(tree)
+    assert len(items) == 12
+    for item in items:
+        assert item.governor is governor
+    assert Tree(mock_test_tree).governor is None
+
+
+def test_tree_throttle_checksum(mock_test_tree) -> None:
+    """
+    Test file checksums are throttled by the tree governor
+    """
+    clock = MockClock()
+    governor = IOGovernor(bytes_per_second=4, burst=1.0, clock=clock.clock, sleep=clock.sleep)
+    tree = Tree(mock_test_tree)
+    assert tree.throttle(governor=governor) is governor
+    for item in tree:
+        if isinstance(item, TreeItem):
+            item.checksum(algorithm='sha224')
+    assert governor.bytes == MOCK_TREE_FILE_COUNT
+    assert governor.operations == MOCK_TREE_FILE_COUNT
+    assert governor.waited == pytest.approx((MOCK_TREE_FILE_COUNT - 4) / 4)
+    assert sum(clock.sleeps) == pytest.approx(governor.waited)
+
+
+def test_tree_throttle_shared(mock_test_tree) -> None:
+    """
+    Test a governor shared by trees and adjusted at runtime
+    """
+    governor = Tree(mock_test_tree).throttle()
+    first = Tree(mock_test_tree.joinpath('foo'))
+    second = Tree(mock_test_tree.joinpath('bar'))
+    first.throttle(governor=governor)
+    second.throttle(governor=governor)
+    governor.set_limits(bytes_per_second=2**30)
+    output = io.StringIO()
+    first.write_manifest(output, format='sha256sum')
+    second.write_manifest(output, format='sha256sum')
+    assert governor.bytes == MOCK_TREE_FILE_COUNT
+
+
+def test_tree_throttle_verify(mock_test_tree) -> None:
+    """
+    Test manifest verification and duplicate detection are throttled
+    """
+    output = io.StringIO()
+    Tree(mock_test_tree).write_manifest(output, format='sha256sum')
+    output.seek(0)
+    tree = Tree(mock_test_tree)
+    governor = tree.throttle()
+    assert all(result.passed for result in tree.verify(output))
+    assert governor.bytes == MOCK_TREE_FILE_COUNT
+
+    tree = Tree(mock_test_tree)
+    governor = tree.throttle()
+    assert len(list(tree.duplicates())) == 1
+    assert governor.bytes > 0
+
+
+def test_tree_throttle_diff(mock_test_tree, tmpdir) -> None:
+    """
+    Test diff and sync are throttled by the source tree governor
+    """
+    target = Path(tmpdir, 'target')
+    tree = Tree(mock_test_tree)
+    governor = tree.throttle()
+    result = tree.sync_to(target, reflink=False)
+    assert len(result.copied) == MOCK_TREE_FILE_COUNT
+    assert governor.bytes == MOCK_TREE_FILE_COUNT
+
+    tree = Tree(mock_test_tree)
+    governor = tree.throttle()
+    assert tree.diff(target) == ([], [], [])
+    assert governor.bytes == 2 * MOCK_TREE_FILE_COUNT
+    assert governor.operations == 2 * MOCK_TREE_FILE_COUNT
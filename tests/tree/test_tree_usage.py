@@ -0,0 +1,81 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.tree.Tree usage() method
+"""
+import os
+
+import pytest
+
+from pathlib_tree.exceptions import FilesystemError
+from pathlib_tree.tree import Tree
+from pathlib_tree.usage import DirectoryUsage
+
+
+def test_tree_usage_totals(mock_test_tree) -> None:
+    """
+    Test calculating usage for all directories in test tree
+    """
+    totals = Tree(mock_test_tree).usage()
+    assert list(totals) == [
+        str(mock_test_tree.joinpath('bar/baz')),
+        str(mock_test_tree.joinpath('bar')),
+        str(mock_test_tree.joinpath('foo')),
+        str(mock_test_tree),
+    ]
+    subdirectory = totals[str(mock_test_tree.joinpath('bar/baz'))]
+    assert isinstance(subdirectory, DirectoryUsage)
+    assert subdirectory.files == 3
+    assert subdirectory.directories == 0
+    assert subdirectory.size == 3 + os.lstat(mock_test_tree.joinpath('bar/baz')).st_size
+
+    root = totals[str(mock_test_tree)]
+    assert root.files == 9
+    assert root.directories == 3
+    assert root.allocated == root.blocks * 512
+    assert root.size == sum(os.lstat(item).st_size for item in Tree(mock_test_tree)) + \
+        os.lstat(mock_test_tree).st_size
+
+
+def test_tree_usage_hardlinks_and_excluded(mock_test_tree) -> None:
+    """
+    Test hard linked files are counted once and excluded items are skipped
+    """
+    data = mock_test_tree.joinpath('foo/data')
+    data.write_bytes(b'x' * 10000)
+    os.link(data, mock_test_tree.joinpath('bar/data'))
+    mock_test_tree.joinpath('foo/skipped').write_bytes(b'x' * 10000)
+
+    totals = Tree(mock_test_tree, excluded=['skipped']).usage()
+    root = totals[str(mock_test_tree)]
+    assert root.files == 10
+    # Hard linked file is counted for the directory walked first
+    assert totals[str(mock_test_tree.joinpath('bar'))].files == 7
+    assert totals[str(mock_test_tree.joinpath('foo'))].files == 3
+
+
+def test_tree_usage_top(mock_test_tree) -> None:
+    """
+    Test returning only largest directories
+    """
+    mock_test_tree.joinpath('foo/data').write_bytes(b'x' * 100000)
+    largest = Tree(mock_test_tree).usage(top=2)
+    assert [usage.path for usage in largest] == [
+        str(mock_test_tree),
+        str(mock_test_tree.joinpath('foo')),
+    ]
+    largest = Tree(mock_test_tree).usage(top=1, key='files')
+    assert [usage.path for usage in largest] == [str(mock_test_tree)]
+
+
+def test_tree_usage_errors(mock_test_tree, tmpdir) -> None:
+    """
+    Test usage with invalid sort key and missing directory
+    """
+    with pytest.raises(FilesystemError):
+        Tree(mock_test_tree).usage(key='invalid')
+    with pytest.raises(FilesystemError):
+        Tree(tmpdir.join('missing')).usage()
@@ -0,0 +1,172 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.tree.Tree verify() method
+"""
+import hashlib
+import io
+
+from concurrent.futures import wait
+
+import pytest
+
+from sys_toolkit.tests.mock import MockException
+
+from pathlib_tree.exceptions import FilesystemError
+from pathlib_tree.tree import Tree
+from pathlib_tree.verify import (
+    TreeVerify,
+    VERIFY_ERROR,
+    VERIFY_EXTRA,
+    VERIFY_MISMATCH,
+    VERIFY_MISSING,
+    VERIFY_OK,
+)
+
+NEWLINE_MD5 = hashlib.md5(b'\n').hexdigest()
+NEWLINE_SHA256 = hashlib.sha256(b'\n').hexdigest()
+
+
+def verify_statuses(results) -> dict:
+    """
+    Return verification results as dictionary of statuses by path
+    """
+    return {result.path: result.status for result in results}
+
+
+def test_tree_verify_manifest_file(mock_test_tree) -> None:
+    """
+    Test verifying tree against a manifest file written to the tree
+    """
+    tree = Tree(mock_test_tree)
+    output = io.StringIO()
+    tree.write_manifest(output, format='sha256sum')
+    manifest = mock_test_tree.joinpath('SHA256SUMS')
+    manifest.write_text(output.getvalue(), encoding='utf-8')
+    tree.reset()
+
+    results = list(tree.verify(manifest, workers=2))
+    assert len(results) == 9
+    assert all(result.passed for result in results)
+    assert repr(results[0]) == f'{results[0].path}: {VERIFY_OK}'
+
+
+def test_tree_verify_queue_depth(monkeypatch, mock_test_tree) -> None:
+    """
+    Test verifying files with a bounded number of pending checksums
+    """
+    output = io.StringIO()
+    Tree(mock_test_tree).write_manifest(output, format='sha256sum')
+    pending = []
+
+    def counting_wait(futures, **kwargs):
+        pending.append(len(futures))
+        return wait(futures, **kwargs)
+
+    monkeypatch.setattr('pathlib_tree.verify.VERIFY_QUEUE_DEPTH', 1)
+    monkeypatch.setattr('pathlib_tree.verify.wait', counting_wait)
+    output.seek(0)
+    results = list(Tree(mock_test_tree).verify(output, workers=2, extra=False))
+    assert len(results) == 9
+    assert all(result.passed for result in results)
+    assert max(pending) == 2
+
+
+def test_tree_verify_failures(mock_test_tree) -> None:
+    """
+    Test verifying tree with missing, mismatched and extra files
+    """
+    manifest = io.StringIO(
+        f'{NEWLINE_SHA256}  ./foo/a\n'
+        f'{NEWLINE_MD5} *foo/b\n'
+        f'MD5 (foo/c) = {NEWLINE_SHA256[:32]}\n'
+        f'{NEWLINE_SHA256}  foo/missing\n'
+    )
+    statuses = verify_statuses(Tree(mock_test_tree).verify(manifest))
+    assert statuses['foo/a'] == VERIFY_OK
+    assert statuses['foo/b'] == VERIFY_OK
+    assert statuses['foo/c'] == VERIFY_MISMATCH
+    assert statuses['foo/missing'] == VERIFY_MISSING
+    assert statuses['bar/aa.tst'] == VERIFY_EXTRA
+    assert len(statuses) == 10
+
+
+def test_tree_verify_fail_fast(mock_test_tree) -> None:
+    """
+    Test verification stops at first failure with fail_fast
+    """
+    manifest = io.StringIO(f'{NEWLINE_SHA256}  foo/a\n{NEWLINE_SHA256}  foo/missing\n')
+    results = list(Tree(mock_test_tree).verify(manifest, fail_fast=True))
+    assert len(results) == 1
+    assert results[0].status == VERIFY_MISSING
+
+    manifest = io.StringIO(f'{NEWLINE_SHA256}  foo/a\n')
+    results = list(TreeVerify(Tree(mock_test_tree), manifest, fail_fast=True))
+    assert [result.status for result in results] == [VERIFY_OK, VERIFY_EXTRA]
+
+
+def test_tree_verify_ndjson_manifest(mock_test_tree) -> None:
+    """
+    Test verifying tree against NDJSON manifest with explicit algorithm
+    """
+    tree = Tree(mock_test_tree)
+    manifest = io.StringIO()
+    tree.write_manifest(manifest, algorithm='md5')
+    manifest.seek(0)
+    results = list(tree.verify(manifest, format='ndjson', algorithm='md5', extra=False))
+    assert len(results) == 9
+    assert all(result.passed for result in results)
+
+
+def test_tree_verify_uppercase_checksums(mock_test_tree) -> None:
+    """
+    Test verifying tree against manifests with uppercase hex digests
+    """
+    tree = Tree(mock_test_tree)
+    manifest = io.StringIO(
+        f'{{"path": "foo/a", "checksum": "{NEWLINE_SHA256.upper()}"}}\n'
+        f'{{"path": "foo/b", "checksum": "{NEWLINE_MD5.upper()}"}}\n'
+    )
+    results = list(tree.verify(manifest, format='ndjson'))
+    assert verify_statuses(results)['foo/a'] == VERIFY_OK
+    assert verify_statuses(results)['foo/b'] == VERIFY_OK
+    assert tree.__items__ is None
+
+
+def test_tree_verify_read_error(monkeypatch, mock_test_tree) -> None:
+    """
+    Test verification reports files that can not be read
+    """
+    def mock_checksum(*args, **kwargs):
+        raise PermissionError('Permission denied')
+    monkeypatch.setattr('pathlib_tree.verify.file_checksum', mock_checksum)
+    results = list(Tree(mock_test_tree).verify(io.StringIO(f'{NEWLINE_SHA256}  foo/a\n'), extra=False))
+    assert results[0].status == VERIFY_ERROR
+    assert results[0].error == 'Permission denied'
+
+
+def test_tree_verify_stat_error(monkeypatch, mock_test_tree) -> None:
+    """
+    Test verification wraps errors checking manifest files
+    """
+    monkeypatch.setattr('pathlib_tree.verify.os.stat', MockException(PermissionError))
+    with pytest.raises(FilesystemError):
+        list(Tree(mock_test_tree).verify(io.StringIO(f'{NEWLINE_SHA256}  foo/a\n'), extra=False))
+
+
+def test_tree_verify_invalid_manifest(mock_test_tree) -> None:
+    """
+    Test verifying tree against invalid manifests
+    """
+    tree = Tree(mock_test_tree)
+    with pytest.raises(FilesystemError):
+        TreeVerify(tree, io.StringIO(), algorithm='invalid')
+    with pytest.raises(FilesystemError):
+        list(tree.verify(mock_test_tree.joinpath('missing')))
+    with pytest.raises(FilesystemError):
+        list(tree.verify(io.StringIO('1234  foo/a\n')))
+    with pytest.raises(FilesystemError):
+        list(tree.verify(io.StringIO('{"path": "foo/a"}\n'), format='ndjson'))
@@ -0,0 +1,146 @@
+#
+# Copyright (C) 2020-2023 by Ilkka Tuohela <hile@iki.fi>
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+"""
+Unit tests for pathlib_tree.tree.Tree walk options
+"""
+import pytest
+
+from pathlib_tree.exceptions import FilesystemError
+from pathlib_tree.tree import Tree, TreeItem
+
+
+def relative_paths(tree: Tree) -> list:
+    """
+    Return relative paths of tree items as strings
+    """
+    return [str(item.relative_to(tree)) for item in tree]
+
+
+def test_tree_walk_symlink_loop(mock_test_tree) -> None:
+    """
+    Test walking tree with symbolic link loop to a parent directory
+    """
+    mock_test_tree.joinpath('bar/baz/loop').symlink_to('../..')
+    tree = Tree(mock_test_tree)
+    paths = relative_paths(tree)
+    assert 'bar/baz/loop' in paths
+    assert not any(path.startswith('bar/baz/loop/') for path in paths)
+    assert isinstance(tree[str(mock_test_tree.joinpath('bar/baz/loop'))], Tree)
+    assert relative_paths(tree) == paths
+
+
+def test_tree_walk_follow_symlinks(mock_test_tree) -> None:
+    """
+    Test walking tree with symbolic links to directories followed or not
+    """
+    mock_test_tree.joinpath('link').symlink_to('bar/baz')
+    assert 'link/d.txt' in relative_paths(Tree(mock_test_tree))
+
+    tree = Tree(mock_test_tree, follow_symlinks=False)
+    paths = relative_paths(tree)
+    assert 'link' in paths
+    assert 'link/d.txt' not in paths
+    item = tree[str(mock_test_tree.joinpath('link'))]
+    assert isinstance(item, TreeItem)
+    assert not isinstance(item, Tree)
+
+
+def test_tree_walk_one_file_system(mock_test_tree) -> None:
+    """
+    Test walking tree with other filesystems skipped
+    """
+    tree = Tree(mock_test_tree, one_file_system=True)
+    assert len(relative_paths(tree)) == 12
+
+    tree = Tree(mock_test_tree, one_file_system=True)
+    # Mock walk root device differing from all subdirectories
+    tree.__device__ = -1
+    assert relative_paths(tree) == ['bar', 'foo']
+    tree = Tree(mock_test_tree, one_file_system=False)
+    tree.__device__ = -1
+    assert len(relative_paths(tree)) == 12
+
+
+def walked_paths(path, items) -> list:
+    """
+    Return items as paths relative to path
+    """
+    return [str(item.relative_to(path)) for item in items]
+
+
+def test_tree_walk_orders(mock_test_tree) -> None:
+    """
+    Test walking tree in depth first and breadth first order
+    """
+    tree = Tree(mock_test_tree)
+    paths = walked_paths(mock_test_tree, tree.walk())
+    assert tree.__items__ is None
+    assert paths == relative_paths(tree)
+    paths = walked_paths(mock_test_tree, tree.walk(order='bfs'))
+    assert paths == [
+        'bar', 'foo',
+        'bar/aa.tst', 'bar/baz', 'bar/bb.tst', 'bar/cc.tst', 'foo/a', 'foo/b', 'foo/c',
+        'bar/baz/d.txt', 'bar/baz/dd.txt', 'bar/baz/ddd.txt',
+    ]
+    with pytest.raises(FilesystemError):
+        tree.walk(order='invalid')
+
+
+def test_tree_walk_max_depth(mock_test_tree) -> None:
+    """
+    Test walking tree with maximum depth
+    """
+    tree = Tree(mock_test_tree)
+    assert list(tree.walk(max_depth=0)) == []
+    assert walked_paths(mock_test_tree, tree.walk(max_depth=1)) == ['bar', 'foo']
+    for order in ('dfs', 'bfs'):
+        paths = walked_paths(mock_test_tree, tree.walk(order=order, max_depth=2))
+        assert len(paths) == 9
+        assert 'bar/baz' in paths
+        assert not any(path.startswith('bar/baz/') for path in paths)
+
+
+def test_tree_walk_prune(mock_test_tree) -> None:
+    """
+    Test pruning directories before they are read
+    """
+    pruned = []
+
+    def prune(directory) -> bool:
+        pruned.append(directory.name)
+        return directory.name == 'bar'
+
+    tree = Tree(mock_test_tree)
+    instrumentation = tree.instrument()
+    for order in ('dfs', 'bfs'):
+        paths = walked_paths(mock_test_tree, tree.walk(order=order, prune=prune))
+        assert sorted(paths) == ['bar', 'foo', 'foo/a', 'foo/b', 'foo/c']
+    assert pruned == ['bar', 'foo', 'bar', 'foo']
+    assert instrumentation.directories == 4
+
+
+def test_tree_walk_start_after(mock_test_tree) -> None:
+    """
+    Test resuming a depth first walk after a path
+    """
+    tree = Tree(mock_test_tree)
+    paths = walked_paths(mock_test_tree, tree.walk())
+    for index, path in enumerate(paths):
+        assert walked_paths(mock_test_tree, tree.walk(start_after=path)) == paths[index + 1:]
+
+    instrumentation = tree.instrument()
+    assert walked_paths(mock_test_tree, tree.walk(start_after='bar/cc.tst')) == ['foo', 'foo/a', 'foo/b', 'foo/c']
+    assert instrumentation.directories == 3
+    assert walked_paths(mock_test_tree, tree.walk(start_after='bar/missing')) == paths[paths.index('foo'):]
+    assert walked_paths(mock_test_tree, tree.walk(start_after='bar/bat')) == paths[paths.index('bar/baz'):]
+
+    for kwargs in ({'order': 'bfs'}, {}):
+        with pytest.raises(FilesystemError):
+            tree.walk(start_after='/bar', **kwargs)
+    with pytest.raises(FilesystemError):
+        tree.walk(order='bfs', start_after='bar')
+    with pytest.raises(FilesystemError):
+        Tree(mock_test_tree, sorted=False).walk(start_after='bar')